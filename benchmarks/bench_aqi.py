@@ -0,0 +1,174 @@
+""" Air quality index cost and correctness
+
+Run from the repository root:
+
+    python -m benchmarks.bench_aqi [--pushes N]
+
+Compares the bisect breakpoint lookups against the plain if-chains they
+replace over a concentration sweep (same indexes, time per lookup), then
+checks the incremental NowCast against one recomputed from every sample
+of the last 12 hours, over a day of pushes with a gap. Finally times the
+index pass of a 4 channel push and checks that air quality entities
+created by the real pipeline report an AQI.
+"""
+
+import argparse
+import asyncio
+import time
+from math import floor
+
+from custom_components.gw1000 import DOMAIN_SCHEMA, async_handle_webook, async_setup
+from custom_components.gw1000.air_quality import PLATFORM_SCHEMA, async_setup_platform
+from custom_components.gw1000.aqi import (
+    CAQI_HOURLY_INDEX,
+    EPA_INDEX,
+    NOWCAST_MIN_WEIGHT,
+    AirQualityIndexes,
+    NowCast,
+)
+from custom_components.gw1000.const import CONF_QUEUE_SIZE, DOMAIN
+from custom_components.gw1000.payload import parse_payload
+
+from .payload import station_payloads
+from .stand_in import StandInHass, StandInRequest, stub_writes
+
+def _epa_chain(concentration):
+    """ the if-chain lookup, for reference """
+    c = floor(max(concentration, 0) * 10) / 10
+    if c <= 9.0:
+        return int(round(50 / 9.0 * c))
+    if c <= 35.4:
+        return int(round(51 + 49 / 26.3 * (c - 9.1)))
+    if c <= 55.4:
+        return int(round(101 + 49 / 19.9 * (c - 35.5)))
+    if c <= 125.4:
+        return int(round(151 + 49 / 69.9 * (c - 55.5)))
+    if c <= 225.4:
+        return int(round(201 + 99 / 99.9 * (c - 125.5)))
+    if c <= 325.4:
+        return int(round(301 + 199 / 99.9 * (c - 225.5)))
+    return 500
+
+def _caqi_chain(c):
+    if c <= 15:
+        return int(round(25 / 15 * c))
+    if c <= 30:
+        return int(round(25 + 25 / 15 * (c - 15)))
+    if c <= 55:
+        return int(round(50 + 25 / 25 * (c - 30)))
+    return int(round(75 + 25 / 55 * (c - 55)))
+
+def _check_lookups(failures):
+    sweep = [i / 20 for i in range(0, 9000)]
+    for name, table, chain in (("epa", EPA_INDEX, _epa_chain), ("caqi", CAQI_HOURLY_INDEX, _caqi_chain)):
+        wrong = [c for c in sweep if table.index(c) != chain(c)]
+        if wrong:
+            failures.append((name, "lookup differs", wrong[:5]))
+
+    timings = {}
+    for name, lookup in (("bisect", EPA_INDEX.index), ("chain", _epa_chain)):
+        start = time.perf_counter()
+        for c in sweep:
+            lookup(c)
+        timings[name] = (time.perf_counter() - start) / len(sweep)
+    return timings
+
+def _reference_nowcast(samples, now):
+    """ NowCast recomputed from every sample """
+    hour = int(now // 3600)
+    buckets = {}
+    for timestamp, value in samples:
+        ago = hour - int(timestamp // 3600)
+        if 0 <= ago < 12:
+            buckets.setdefault(ago, []).append(value)
+    means = {ago: sum(values) / len(values) for ago, values in buckets.items()}
+    if sum(ago in means for ago in range(3)) < 2:
+        return None
+    high, low = max(means.values()), min(means.values())
+    weight = max(1 - (high - low) / high if high > 0 else 1.0, NOWCAST_MIN_WEIGHT)
+    total = sum(weight ** ago * mean for ago, mean in means.items())
+    norm = sum(weight ** ago for ago in means)
+    return floor(total / norm * 10) / 10
+
+def _check_nowcast(failures):
+    nowcast = NowCast()
+    samples = []
+    now = 1590000000
+    value = 20.0
+    checked = 0
+    for i in range(86400 // 16):
+        now += 16
+        # the sensor drops out for three hours in the afternoon
+        if 43200 <= i * 16 < 54000:
+            continue
+        value = max(0.0, value + ((i * 7919) % 13 - 6) / 4)
+        samples.append((now, value))
+        nowcast.add(now, value)
+        if i % 25 == 0:
+            checked += 1
+            expected = _reference_nowcast(samples, now)
+            actual = nowcast.value()
+            if expected != actual and (expected is None or actual is None or abs(expected - actual) > 0.1):
+                failures.append(("nowcast", now, expected, actual))
+    return checked
+
+async def _check_entities(failures):
+    loop = asyncio.get_event_loop()
+    hass = StandInHass(loop)
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({CONF_QUEUE_SIZE: 0})})
+    entities = []
+
+    def add_entities(new, update_before_add=False):
+        for entity in new:
+            entity.hass = hass
+            entities.append(stub_writes(entity))
+            loop.create_task(entity.async_added_to_hass())
+
+    await async_setup_platform(hass, PLATFORM_SCHEMA({"platform": DOMAIN, "webhook_id": "aqi"}), add_entities)
+    generator = station_payloads(1, seed=3, pm25_channels=4)[0]
+    for _ in range(3):
+        await async_handle_webook(hass, "aqi", StandInRequest(generator.body()))
+        await asyncio.sleep(0)
+    if len(entities) != 4:
+        failures.append(("entities", len(entities)))
+    for entity in entities:
+        if entity.air_quality_index is None or "caqi" not in entity.state_attributes:
+            failures.append(("no index", entity.entity_id, entity.state_attributes))
+    return len(entities)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pushes", type=int, default=20000)
+    args = parser.parse_args()
+
+    failures = []
+    timings = _check_lookups(failures)
+    print("epa lookup: bisect {:.0f}ns, if-chain {:.0f}ns".format(
+        timings["bisect"] * 1e9, timings["chain"] * 1e9
+    ))
+    print("nowcast: {} checks against a full recompute".format(_check_nowcast(failures)))
+
+    generator = station_payloads(1, seed=4, pm25_channels=4)[0]
+    readings = [parse_payload(dict(generator.fields())) for _ in range(args.pushes)]
+    indexes = AirQualityIndexes()
+    start = time.perf_counter()
+    for reading in readings:
+        indexes.update(reading)
+    print("index pass: {:.2f}us per 4 channel push".format(
+        (time.perf_counter() - start) / len(readings) * 1e6
+    ))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    print("pipeline: {} air quality entities with an index".format(
+        loop.run_until_complete(_check_entities(failures))
+    ))
+    loop.close()
+
+    for failure in failures[:20]:
+        print("FAILED", failure)
+    if not failures:
+        print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+""" Dispatch cost per push: coroutine fan-out vs single-pass dispatch
+
+Run from the repository root:
+
+    python -m benchmarks.bench_dispatch
+"""
+
+import asyncio
+import time
+
+from custom_components.gw1000 import async_dispatch, async_register
+
+from .stand_in import StandInHass
+
+ENTITY_COUNTS = (20, 200, 2000)
+PUSHES = 200
+
+RESULTS = {
+    "outdoor": {"units": "°F", "temperature": 50.0, "humidity": 60},
+}
+
+class StandInEntity(object):
+
+    """ does the same per-push work as GW1000Sensor """
+
+    def __init__(self):
+        self.state = None
+
+    def handle(self, hass, webhook_id, entity_id, results):
+        self.state = results.get("outdoor", {}).get("temperature")
+
+    async def async_handle(self, hass, webhook_id, entity_id, results):
+        self.handle(hass, webhook_id, entity_id, results)
+
+def _handlers(hass, count):
+    webhook_id = "bench{}".format(count)
+    entities = [StandInEntity() for _ in range(count)]
+    for i, entity in enumerate(entities):
+        async_register(hass, "sensor", "bench", webhook_id, "sensor.bench_{}".format(i), entity.handle)
+    return webhook_id, entities, hass.data["gw1000"][webhook_id][None]
+
+async def _fan_out(hass, webhook_id, entities):
+    """ the previous one task per entity approach """
+    await asyncio.wait([
+        asyncio.ensure_future(entity.async_handle(hass, webhook_id, None, RESULTS))
+        for entity in entities
+    ])
+
+async def _bench(loop):
+    hass = StandInHass(loop)
+    for count in ENTITY_COUNTS:
+        webhook_id, entities, handlers = _handlers(hass, count)
+
+        start = time.perf_counter()
+        for _ in range(PUSHES):
+            await _fan_out(hass, webhook_id, entities)
+        fan_out = (time.perf_counter() - start) / PUSHES
+
+        start = time.perf_counter()
+        for _ in range(PUSHES):
+            async_dispatch(hass, webhook_id, handlers, RESULTS)
+        dispatch = (time.perf_counter() - start) / PUSHES
+
+        print("{:>5} entities: fan-out {:9.1f}us  dispatch {:9.1f}us  ({:.1f}x)".format(
+            count, fan_out * 1e6, dispatch * 1e6, fan_out / dispatch
+        ))
+
+def main():
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(_bench(loop))
+    finally:
+        loop.close()
+
+if __name__ == "__main__":
+    main()
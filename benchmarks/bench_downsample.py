@@ -0,0 +1,87 @@
+""" State writes with and without downsampling
+
+Run from the repository root:
+
+    python -m benchmarks.bench_downsample [--stations N] [--hours H] [--window S]
+
+Feeds H hours of 16 second pushes from N stations to the high frequency
+sensors, once writing every push and once downsampled to S second
+windows, on a simulated clock. Prints the state writes of each and checks
+that every window mean lies within its min and max.
+"""
+
+import argparse
+import asyncio
+
+import custom_components.gw1000.publish as publish
+from custom_components.gw1000.payload import parse_payload
+from custom_components.gw1000.publish import WindowAggregate
+from custom_components.gw1000.sensor import VECTOR_SENSOR_TYPES, GW1000Sensor
+
+from .payload import station_payloads
+from .stand_in import StandInHass, StandInRequest, stub_writes
+
+SENSOR_TYPES = ("windspeed", "windgust", "winddir", "solarradiation")
+
+class _Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def _sensors(hass, stations, window):
+    sensors = []
+    for station in range(stations):
+        for sensor_type in SENSOR_TYPES:
+            aggregate = None
+            if window:
+                aggregate = WindowAggregate(window, sensor_type in VECTOR_SENSOR_TYPES)
+            sensor = stub_writes(GW1000Sensor(
+                hass, "bench{}".format(station), "bench", sensor_type, window=aggregate
+            ))
+            sensor.hass = hass
+            sensors.append((station, sensor))
+    return sensors
+
+async def _run(stations, hours, window):
+    hass = StandInHass(asyncio.get_event_loop())
+    clock = publish.monotonic = _Clock()
+    generators = station_payloads(stations, seed=0)
+    sensors = _sensors(hass, stations, window)
+
+    bad = []
+    for _ in range(int(hours * 3600 / 16)):
+        clock.now += 16
+        readings = []
+        for generator in generators:
+            readings.append(parse_payload(await StandInRequest(generator.body()).post()))
+        for station, sensor in sensors:
+            sensor._async_handle_data(hass, "bench", sensor.entity_id, readings[station])
+            last = sensor._window.last if sensor._window is not None else None
+            if last is not None and "min" in last and not last["min"] <= last["mean"] <= last["max"]:
+                bad.append((sensor.entity_id, last))
+    return sum(sensor.writes for _, sensor in sensors), bad
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--stations", type=int, default=20)
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--window", type=int, default=300)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    raw, _ = loop.run_until_complete(_run(args.stations, args.hours, 0))
+    downsampled, bad = loop.run_until_complete(_run(args.stations, args.hours, args.window))
+    loop.close()
+
+    print("{} stations, {}h: {} writes raw, {} downsampled to {}s ({:.1f}x fewer)".format(
+        args.stations, args.hours, raw, downsampled, args.window, raw / max(downsampled, 1)
+    ))
+    for failure in bad[:10]:
+        print("MEAN OUTSIDE RANGE", failure)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+""" Ingestion queue behavior under overload
+
+Run from the repository root:
+
+    python -m benchmarks.bench_overload [--stations N] [--burst B] [--cost MS]
+
+Every station pushes a burst while processing a push costs MS
+milliseconds, so arrivals outpace the worker. Under each policy the
+backlog must stay within size pushes per station, the newest push of
+every station must be processed and the request latency must stay flat.
+"""
+
+import argparse
+import asyncio
+import time
+
+from custom_components.gw1000.ingest import POLICIES, IngestQueue
+
+async def _flood(policy, stations, burst, cost, size):
+    processed = {}
+
+    def process(station, sequence):
+        end = time.perf_counter() + cost
+        while time.perf_counter() < end:
+            pass
+        processed.setdefault(station, []).append(sequence)
+
+    loop = asyncio.get_event_loop()
+    queue = IngestQueue(process, size, policy)
+    queue._task = loop.create_task(queue._async_run())
+
+    acks = []
+    for sequence in range(burst):
+        for station in range(stations):
+            start = time.perf_counter()
+            queue.async_put(station, station, sequence)
+            acks.append(time.perf_counter() - start)
+        # a few pushes are processed between request bursts
+        await asyncio.sleep(0)
+
+    while queue.depth:
+        await asyncio.sleep(0)
+    await queue.async_stop()
+
+    newest = all(processed.get(station, [None])[-1] == burst - 1 for station in range(stations))
+    return queue.counters, max(acks), newest
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--stations", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=40)
+    parser.add_argument("--cost", type=float, default=1.0, help="ms per push")
+    parser.add_argument("--size", type=int, default=8)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    for policy in POLICIES:
+        counters, max_ack, newest = loop.run_until_complete(
+            _flood(policy, args.stations, args.burst, args.cost / 1000, args.size)
+        )
+        print("{:<12} enqueued {enqueued:6} processed {processed:6} dropped {dropped:6} "
+              "max depth {max_queue_depth:5} max wait {max_wait:8.3f}s".format(policy, **counters))
+        print("{:<12} max ack {:.1f}us newest processed: {}".format("", max_ack * 1e6, newest))
+    loop.close()
+
+if __name__ == "__main__":
+    main()
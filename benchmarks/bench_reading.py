@@ -0,0 +1,80 @@
+""" Memory and access cost of StationReading against nested dicts
+
+Run from the repository root:
+
+    python -m benchmarks.bench_reading [--pushes N]
+
+Parses N pushes (8 temperature and 4 PM2.5 channels) and keeps them all,
+measuring the bytes retained per push with tracemalloc, once as readings
+and once as their nested dict form (what parse_payload built before).
+Then times every sensor type's lookup: walking the nested dicts by key,
+against indexing values at an offset bound up front.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from custom_components.gw1000.payload import parse_payload
+from custom_components.gw1000.reading import LAYOUT
+from custom_components.gw1000.sensor import SENSOR_TYPES
+
+from .payload import PayloadGenerator
+
+def _retained(build, posts):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(post) for post in posts]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(kept), kept
+
+def _nested(post):
+    return parse_payload(post).as_dict()
+
+def _lookup_nested(readings, targets):
+    for results in readings:
+        for key, part, _ in targets:
+            block = results.get(key)
+            if block is not None:
+                block.get(part)
+
+def _lookup_bound(readings, targets):
+    for reading in readings:
+        values = reading.values
+        for _, _, offset in targets:
+            values[offset]
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pushes", type=int, default=2000)
+    args = parser.parse_args()
+
+    generator = PayloadGenerator(temp_channels=8, pm25_channels=4)
+    posts = [dict(generator.fields()) for _ in range(args.pushes)]
+
+    reading_bytes, readings = _retained(parse_payload, posts)
+    nested_bytes, nested = _retained(_nested, posts)
+    print("retained per push: reading {:.0f} bytes, nested dicts {:.0f} bytes ({:+.1f}%)".format(
+        reading_bytes, nested_bytes, (reading_bytes - nested_bytes) / nested_bytes * 100
+    ))
+
+    targets = [
+        (key, part, LAYOUT.offset(key, part))
+        for _, _, _, _, key, part in SENSOR_TYPES.values()
+        if LAYOUT.offset(key, part) is not None
+    ]
+    lookups = len(readings) * len(targets)
+    nested_time = min(_timed(_lookup_nested, nested, targets) for _ in range(5))
+    bound_time = min(_timed(_lookup_bound, readings, targets) for _ in range(5))
+    print("per lookup: nested {:.1f}ns, bound offset {:.1f}ns".format(
+        nested_time / lookups * 1e9, bound_time / lookups * 1e9
+    ))
+
+if __name__ == "__main__":
+    main()
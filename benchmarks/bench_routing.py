@@ -0,0 +1,79 @@
+""" Multi-station routing on a shared webhook: 500 stations x 20 entities
+
+Run from the repository root:
+
+    python -m benchmarks.bench_routing
+"""
+
+import asyncio
+import time
+
+from custom_components.gw1000 import (
+    async_register_many,
+    async_route,
+    async_unregister_many,
+)
+
+from .stand_in import StandInHass
+
+STATIONS = 500
+ENTITIES = 20
+PUSHES = 2000
+WEBHOOK_ID = "shared"
+
+class CountingEntity(object):
+
+    """ counts the pushes it receives """
+
+    def __init__(self):
+        self.pushes = 0
+
+    def handle(self, hass, webhook_id, entity_id, results):
+        self.pushes += 1
+
+def _station(i):
+    return "PASSKEY{:04d}".format(i)
+
+def main():
+    hass = StandInHass(asyncio.new_event_loop())
+    stations = {}
+
+    start = time.perf_counter()
+    for i in range(STATIONS):
+        entities = {"sensor.s{}_{}".format(i, j): CountingEntity() for j in range(ENTITIES)}
+        stations[_station(i)] = entities
+        async_register_many(
+            hass, WEBHOOK_ID,
+            [("sensor", "bench", entity_id, entity.handle) for entity_id, entity in entities.items()],
+            station=_station(i),
+        )
+    register = time.perf_counter() - start
+
+    routes = hass.data["gw1000"][WEBHOOK_ID]
+    pushes = [{"key": _station(i % STATIONS)} for i in range(PUSHES)]
+
+    start = time.perf_counter()
+    for results in pushes:
+        async_route(hass, WEBHOOK_ID, routes, results)
+    route = (time.perf_counter() - start) / PUSHES
+
+    expected = PUSHES // STATIONS
+    for key, entities in stations.items():
+        for entity in entities.values():
+            assert entity.pushes == expected, (key, entity.pushes)
+
+    start = time.perf_counter()
+    for key, entities in stations.items():
+        async_unregister_many(hass, WEBHOOK_ID, list(entities), key)
+    unregister = time.perf_counter() - start
+
+    assert WEBHOOK_ID not in hass.data["gw1000"]
+    hass.loop.close()
+
+    print("{} stations x {} entities".format(STATIONS, ENTITIES))
+    print("register:   {:9.1f}ms".format(register * 1e3))
+    print("push:       {:9.1f}us (each reaches {} entities)".format(route * 1e6, ENTITIES))
+    print("unregister: {:9.1f}ms".format(unregister * 1e3))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+""" Staleness watchdog cost and behavior
+
+Run from the repository root:
+
+    python -m benchmarks.bench_watchdog [--stations N] [--pushes P]
+
+Times async_seen per push and async_check per tick for N stations with
+10 and then 100 listeners each, on a simulated clock: neither may grow
+with the listener count. One station then falls silent and must flip
+stale (all its listeners in one check, nobody else's) and flip back on
+its next push. The timer wheel, advanced in steps shorter than its
+resolution, must fire every deadline within one resolution of it, also
+deadlines more than one rotation out. Finally discovered sensors go unavailable through the
+real pipeline and come back on a push.
+"""
+
+import argparse
+import asyncio
+import time
+from time import monotonic
+
+from custom_components.gw1000 import DOMAIN_SCHEMA, async_handle_webook, async_setup
+from custom_components.gw1000.const import CONF_QUEUE_SIZE, CONF_STALE_AFTER, DATA_WATCHDOG, DOMAIN
+from custom_components.gw1000.sensor import PLATFORM_SCHEMA, async_setup_platform
+from custom_components.gw1000.watchdog import TICK_RESOLUTION, WHEEL_SLOTS, StalenessWatchdog, TimerWheel
+
+from .payload import station_payloads
+from .stand_in import StandInHass, StandInRequest, stub_writes
+
+INTERVAL = 16
+
+def _time_watchdog(hass, stations, listeners, pushes, failures):
+    watchdog = StalenessWatchdog(hass, 3)
+    flips = {}
+
+    def listener(station):
+        def _changed(stale):
+            flips.setdefault(station, []).append(stale)
+        return _changed
+
+    names = ["station{}".format(i) for i in range(stations)]
+    for name in names:
+        for _ in range(listeners):
+            watchdog.async_listen(name, listener(name))
+
+    now = monotonic()
+    seen = check = 0.0
+    for _ in range(pushes):
+        now += INTERVAL
+        start = time.perf_counter()
+        for name in names:
+            watchdog.async_seen(name, now)
+        seen += time.perf_counter() - start
+        start = time.perf_counter()
+        watchdog.async_check(now)
+        check += time.perf_counter() - start
+    if flips:
+        failures.append(("flipped while pushing", listeners, len(flips)))
+
+    # names[0] falls silent, the deadline is 3 learned intervals out
+    silent = names[0]
+    checks = []
+    for _ in range(6):
+        now += INTERVAL
+        for name in names[1:]:
+            watchdog.async_seen(name, now)
+        flips.clear()
+        watchdog.async_check(now)
+        if flips:
+            checks.append(dict(flips))
+    if len(checks) != 1 or list(checks[0]) != [silent] or checks[0][silent] != [True] * listeners:
+        failures.append(("silent station flips", listeners, [list(flipped) for flipped in checks]))
+
+    flips.clear()
+    watchdog.async_seen(silent, now + 1)
+    if flips.get(silent) != [False] * listeners:
+        failures.append(("live again", listeners, flips.get(silent)))
+
+    return seen / (pushes * stations), check / pushes
+
+def _check_wheel(failures):
+    start = 1000
+    rotation = TICK_RESOLUTION * WHEEL_SLOTS
+    deadlines = [1000, 1000.5, 1003, 1004.99, 1005, 1013, 1099.9, start + rotation + 7, start + 3 * rotation + 2]
+    for step in (0.5, 1, 3):
+        wheel = TimerWheel(now=start)
+        for deadline in deadlines:
+            wheel.schedule(deadline, deadline)
+        now = start
+        fired = {}
+        while len(wheel) and now < deadlines[-1] + 2 * TICK_RESOLUTION:
+            now += step
+            for deadline in wheel.advance(now):
+                fired[deadline] = now
+        for deadline in deadlines:
+            late = fired.get(deadline, float("inf")) - max(deadline, start)
+            if not 0 <= late <= TICK_RESOLUTION + step:
+                failures.append(("wheel deadline", step, deadline, fired.get(deadline)))
+
+async def _check_sensors(failures):
+    loop = asyncio.get_event_loop()
+    hass = StandInHass(loop)
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({CONF_QUEUE_SIZE: 0, CONF_STALE_AFTER: 3})})
+    sensors = []
+
+    def add_entities(entities, update_before_add=False):
+        for entity in entities:
+            entity.hass = hass
+            sensors.append(stub_writes(entity))
+            loop.create_task(entity.async_added_to_hass())
+
+    await async_setup_platform(hass, PLATFORM_SCHEMA({"platform": DOMAIN, "webhook_id": "watch"}), add_entities)
+    generators = station_payloads(2, seed=0)
+    for generator in generators:
+        await async_handle_webook(hass, "watch", StandInRequest(generator.body()))
+        await asyncio.sleep(0)
+
+    watchdog = hass.data[DATA_WATCHDOG]
+    # the first station keeps pushing, the second does not
+    later = monotonic() + 1000
+    watchdog.async_seen(generators[0].passkey, later)
+    watchdog.async_check(later)
+    stale = [sensor for sensor in sensors if not sensor.available]
+    if not stale or any(sensor._station != generators[1].passkey for sensor in stale):
+        failures.append(("pipeline stale", len(stale)))
+
+    await async_handle_webook(hass, "watch", StandInRequest(generators[1].body()))
+    if not all(sensor.available for sensor in sensors):
+        failures.append("pipeline live again")
+    return len(sensors), len(stale)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--stations", type=int, default=200)
+    parser.add_argument("--pushes", type=int, default=200)
+    args = parser.parse_args()
+
+    failures = []
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    hass = StandInHass(loop)
+    for listeners in (10, 100):
+        seen, check = _time_watchdog(hass, args.stations, listeners, args.pushes, failures)
+        print("{} stations x {:3} listeners: seen {:.2f}us per push, check {:.2f}us per tick".format(
+            args.stations, listeners, seen * 1e6, check * 1e6
+        ))
+    _check_wheel(failures)
+    sensors, stale = loop.run_until_complete(_check_sensors(failures))
+    print("pipeline: {} of {} sensors went stale with their station".format(stale, sensors))
+    loop.close()
+
+    for failure in failures:
+        print("FAILED", failure)
+    if not failures:
+        print("OK")
+
+if __name__ == "__main__":
+    main()
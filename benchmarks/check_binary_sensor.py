@@ -0,0 +1,110 @@
+""" Check the edge-triggered binary sensors
+
+Run from the repository root:
+
+    python -m benchmarks.check_binary_sensor [--pushes N] [--stations S]
+
+Pushes stations with temperature, PM2.5 and leak channels and a WH57
+lightning sensor through async_handle_webook with the binary_sensor
+platform set up. Every entity must be written once when it is created
+and then only when it flips, each flip must match the pushed flag, and
+the gw1000_lightning events must add up to the strikes counted by each
+station after its first push.
+"""
+
+import argparse
+import asyncio
+import time
+
+from custom_components.gw1000 import DOMAIN_SCHEMA, async_handle_webook, async_setup
+from custom_components.gw1000.binary_sensor import PLATFORM_SCHEMA, async_setup_platform
+from custom_components.gw1000.const import CONF_QUEUE_SIZE, DOMAIN, EVENT_LIGHTNING
+
+from .payload import station_payloads
+from .stand_in import StandInHass, StandInRequest, stub_writes
+
+WEBHOOK_ID = "flags"
+
+async def _check(pushes, stations, failures):
+    loop = asyncio.get_event_loop()
+    hass = StandInHass(loop)
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({CONF_QUEUE_SIZE: 0})})
+    entities = []
+
+    def add_entities(new, update_before_add=False):
+        for entity in new:
+            entity.hass = hass
+            entities.append(stub_writes(entity))
+            loop.create_task(entity.async_added_to_hass())
+
+    await async_setup_platform(
+        hass, PLATFORM_SCHEMA({"platform": DOMAIN, "webhook_id": WEBHOOK_ID}), add_entities
+    )
+    generators = station_payloads(
+        stations, seed=0, temp_channels=4, pm25_channels=2, leak_channels=4, lightning=True
+    )
+
+    baselines = {}
+    elapsed = 0.0
+    for _ in range(pushes):
+        for generator in generators:
+            body = generator.body()
+            baselines.setdefault(generator.passkey, generator.strikes)
+            start = time.perf_counter()
+            await async_handle_webook(hass, WEBHOOK_ID, StandInRequest(body))
+            elapsed += time.perf_counter() - start
+        await asyncio.sleep(0)
+
+    writes = sum(entity.writes for entity in entities)
+    transitions = sum(entity.transitions for entity in entities)
+    # created entities are written by add_entities, not by us
+    if writes != transitions:
+        failures.append(("writes beyond transitions", writes, transitions))
+
+    by_station = {generator.passkey: generator for generator in generators}
+    for entity in entities:
+        generator = by_station[entity._station]
+        if entity._sensor_type == "leak_ch":
+            if entity.is_on != bool(generator.leaks[int(entity._channel) - 1]):
+                failures.append(("leak state", entity.entity_id, entity.is_on))
+        elif entity._sensor_type == "battery_ch" and entity.is_on:
+            failures.append(("battery flag", entity.entity_id))
+
+    strikes = {}
+    for event_type, data in hass.bus.events:
+        if event_type == EVENT_LIGHTNING:
+            strikes[data["station"]] = strikes.get(data["station"], 0) + data["strikes"]
+    for generator in generators:
+        expected = generator.strikes - baselines[generator.passkey]
+        if strikes.get(generator.passkey, 0) != expected:
+            failures.append(("strikes", generator.passkey[:6], expected, strikes.get(generator.passkey)))
+
+    return {
+        "entities": len(entities),
+        "pushes": pushes * stations,
+        "writes": writes,
+        "events": sum(1 for event_type, _ in hass.bus.events if event_type == EVENT_LIGHTNING),
+        "push_us": elapsed / (pushes * stations) * 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pushes", type=int, default=500)
+    parser.add_argument("--stations", type=int, default=10)
+    args = parser.parse_args()
+
+    failures = []
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    report = loop.run_until_complete(_check(args.pushes, args.stations, failures))
+    loop.close()
+
+    print("{entities} binary sensors, {pushes} pushes: {writes} state writes, "
+          "{events} lightning events, {push_us:.1f}us per push".format(**report))
+    for failure in failures[:20]:
+        print("FAILED", failure)
+    if not failures:
+        print("OK")
+
+if __name__ == "__main__":
+    main()
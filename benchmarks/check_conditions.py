@@ -0,0 +1,168 @@
+""" Check the local weather condition and Zambretti forecast
+
+Run from the repository root:
+
+    python -m benchmarks.check_conditions
+
+Checks the sun position against the solstice noon elevation, the
+Zambretti lookup against hand-worked cases and the pressure trend
+against a steady fall, then runs a simulated day of 16s pushes at
+Amsterdam through LocalConditions: clear sky, overcast, a downpour and
+a falling barometer must each show in the condition or forecast. Finally a local GW1000Weather is driven through the pipeline
+and must report a condition and a forecast without tracking any entity,
+after a restored reading that must not reach the pressure trend.
+"""
+
+import asyncio
+import time
+from calendar import timegm
+
+from custom_components.gw1000 import DOMAIN_SCHEMA, async_handle_webook, async_setup
+from custom_components.gw1000.conditions import (
+    LocalConditions,
+    PressureTrend,
+    ZAMBRETTI_FORECASTS,
+    clear_sky_irradiance,
+    solar_elevation,
+    zambretti,
+)
+from custom_components.gw1000.const import CONF_QUEUE_SIZE, DOMAIN
+from custom_components.gw1000.payload import parse_payload
+from custom_components.gw1000.weather import GW1000Weather
+
+from .payload import PayloadGenerator
+from .stand_in import StandInHass, StandInRequest, stub_writes
+
+LATITUDE, LONGITUDE = 52.37, 4.89
+INHG = 33.86389
+
+def _check_sun(failures):
+    noon = timegm((2020, 6, 21, 11, 42, 0))
+    elevation = solar_elevation(LATITUDE, LONGITUDE, noon)
+    if abs(elevation - (90 - LATITUDE + 23.44)) > 0.5:
+        failures.append(("solstice noon elevation", elevation))
+    if solar_elevation(LATITUDE, LONGITUDE, noon + 12 * 3600) > -10:
+        failures.append("midnight sun")
+    return elevation, clear_sky_irradiance(elevation)
+
+def _check_zambretti(failures):
+    cases = (
+        ((1030, 0.0), "Settled fine"),
+        ((1030, 2.0), "Settled fine"),
+        ((1000, 0.0), "Showery, bright intervals"),
+        ((990, -2.0), "Rain, very unsettled"),
+        ((970, -2.0), "Stormy, much rain"),
+    )
+    for (pressure, trend), expected in cases:
+        forecast = ZAMBRETTI_FORECASTS[zambretti(pressure, trend)]
+        if forecast != expected:
+            failures.append(("zambretti", pressure, trend, forecast, expected))
+
+def _check_trend(failures):
+    # -1 hPa an hour reads -3 per 3h from the first hour on
+    trend = PressureTrend()
+    for seconds in range(0, 4 * 3600 + 1, 16):
+        pressure = 1020.0 - seconds / 3600
+        trend.add(seconds, pressure)
+        change = trend.change(seconds, pressure)
+        if seconds >= 3600 and (change is None or abs(change + 3.0) > 0.05):
+            failures.append(("pressure trend", seconds, change))
+            break
+
+def _day(overrides):
+    """ a day of (timestamp, reading) with fields overridden per hour """
+
+    generator = PayloadGenerator(seed=5, start=PayloadGenerator(seed=5).time.replace(hour=0, month=6, day=21))
+    for _ in range(86400 // generator.interval):
+        fields = dict(generator.fields())
+        timestamp = timegm(generator.time.timetuple())
+        fields.update(overrides(timestamp, generator.time.hour))
+        yield timestamp, parse_payload(fields)
+
+def _scenario(overrides):
+    conditions = LocalConditions(LATITUDE, LONGITUDE)
+    seen = {}
+    forecasts = set()
+    elapsed = 0.0
+    count = 0
+    for timestamp, reading in _day(overrides):
+        start = time.perf_counter()
+        conditions.update(timestamp, reading)
+        elapsed += time.perf_counter() - start
+        hour = (timestamp // 3600) % 24
+        seen.setdefault(hour, set()).add(conditions.condition)
+        forecasts.add(conditions.attributes["zambretti"])
+        count += 1
+    return seen, forecasts, elapsed / count
+
+def _calm(timestamp, hour, clearness=0.9, rain=0.0, pressure=1020.0):
+    clear = clear_sky_irradiance(solar_elevation(LATITUDE, LONGITUDE, timestamp))
+    return {
+        "solarradiation": "{:.1f}".format(clear * clearness),
+        "rainratein": "{:.3f}".format(rain),
+        "windspeedmph": "5.0",
+        "windgustmph": "8.0",
+        "baromrelin": "{:.3f}".format(pressure / INHG),
+    }
+
+def _check_day(failures):
+    seen, _, per_push = _scenario(_calm)
+    if seen[12] != {"sunny"} or seen[0] != {"clear-night"}:
+        failures.append(("clear day", seen[12], seen[0]))
+
+    seen, _, _ = _scenario(lambda timestamp, hour: _calm(timestamp, hour, clearness=0.2))
+    if seen[12] != {"cloudy"}:
+        failures.append(("overcast day", seen[12]))
+
+    seen, _, _ = _scenario(lambda timestamp, hour: _calm(timestamp, hour, rain=0.6 if hour == 15 else 0.0))
+    if seen[15] != {"pouring"} or seen[17] != {"sunny"}:
+        failures.append(("downpour", seen[15], seen[17]))
+
+    # 1.5 hPa an hour down from noon
+    seen, forecasts, _ = _scenario(lambda timestamp, hour: _calm(
+        timestamp, hour, pressure=1020.0 - max(0, timestamp % 86400 - 43200) / 3600 * 1.5
+    ))
+    if "Settled fine" not in forecasts or not any("unsettled" in forecast.lower() for forecast in forecasts if forecast):
+        failures.append(("falling barometer", sorted(filter(None, forecasts))))
+    if seen[23] != {"cloudy"}:
+        failures.append(("falling night", seen[23]))
+    return per_push
+
+async def _check_entity(failures):
+    loop = asyncio.get_event_loop()
+    hass = StandInHass(loop)
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({CONF_QUEUE_SIZE: 0})})
+    generator = PayloadGenerator(seed=6)
+    weather = stub_writes(GW1000Weather("local", "conditions", None, station=generator.passkey, local=True))
+    weather.hass = hass
+    weather.entity_id = "weather.local"
+    await weather.async_added_to_hass()
+    # a reading from the snapshot sets the values only
+    if not weather._async_update(parse_payload(dict(generator.fields())), True) or weather._conditions._trend._samples:
+        failures.append(("restored reading in the pressure trend", list(weather._conditions._trend._samples)))
+    for _ in range(100):
+        await async_handle_webook(hass, "conditions", StandInRequest(generator.body()))
+    if weather.condition is None or not weather.forecast or "zambretti" not in weather.device_state_attributes:
+        failures.append(("local weather", weather.condition, weather.forecast))
+    return weather.condition, weather.forecast[0]["detailed_description"] if weather.forecast else None
+
+def main():
+    failures = []
+    elevation, clear = _check_sun(failures)
+    print("solstice noon: elevation {:.2f}°, clear sky {:.0f} W/m²".format(elevation, clear))
+    _check_zambretti(failures)
+    _check_trend(failures)
+    print("day of pushes: {:.1f}us per push".format(_check_day(failures) * 1e6))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    print("local weather: {} / {}".format(*loop.run_until_complete(_check_entity(failures))))
+    loop.close()
+
+    for failure in failures:
+        print("FAILED", failure)
+    if not failures:
+        print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+""" Check sensor discovery and retirement
+
+Run from the repository root:
+
+    python -m benchmarks.check_discovery [--retire-after S]
+
+Pushes one station through async_handle_webook with sensor discovery on,
+on a simulated clock. A PM2.5 channel that starts reporting must be
+added in one batch with only its own sensors; a temperature channel that
+stops reporting must have its sensors removed once retire_after has
+passed, and no other; when it reports again its sensors must be created
+anew.
+"""
+
+import argparse
+import asyncio
+
+import custom_components.gw1000 as gw1000
+from custom_components.gw1000 import DOMAIN_SCHEMA, RETIRE_CHECK_INTERVAL, async_handle_webook, async_setup
+from custom_components.gw1000.const import CONF_QUEUE_SIZE, CONF_RETIRE_AFTER, DOMAIN
+from custom_components.gw1000.sensor import PLATFORM_SCHEMA, async_setup_platform
+
+from .payload import PayloadGenerator
+from .stand_in import StandInHass, StandInRequest, stub_writes
+
+WEBHOOK_ID = "discovery"
+INTERVAL = 16
+
+class _Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+async def _check(retire_after, failures):
+    loop = asyncio.get_event_loop()
+    hass = StandInHass(loop)
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({CONF_QUEUE_SIZE: 0})})
+    clock = gw1000.monotonic = _Clock()
+    batches = []
+    removed = []
+
+    def add_entities(entities, update_before_add=False):
+        batches.append([entity.unique_id for entity in entities])
+        for entity in entities:
+            entity.hass = hass
+            stub_writes(entity)
+            entity.async_remove = _remover(entity)
+
+    def _remover(entity):
+        async def _remove():
+            removed.append(entity.unique_id)
+        return _remove
+
+    await async_setup_platform(
+        hass,
+        PLATFORM_SCHEMA({"platform": DOMAIN, "webhook_id": WEBHOOK_ID, CONF_RETIRE_AFTER: retire_after}),
+        add_entities,
+    )
+    generator = PayloadGenerator(seed=0, temp_channels=2)
+    station = generator.passkey
+
+    async def push(count):
+        for _ in range(count):
+            clock.now += INTERVAL
+            await async_handle_webook(hass, WEBHOOK_ID, StandInRequest(generator.body()))
+            await asyncio.sleep(0)
+
+    await push(10)
+    if len(batches) != 1:
+        failures.append(("first push not one batch", len(batches)))
+    initial = set(batches[0]) if batches else set()
+
+    # channel 2 goes quiet, a PM2.5 sensor joins
+    generator.temp_channels = 1
+    generator.pm25_channels = 1
+    await push(1)
+    added = set(batches[-1]) if len(batches) == 2 else set()
+    expected = {"{}_{}1".format(station, sensor_type) for sensor_type in ("pm25_ch", "pm25_avg_24h_ch", "pm25_battery_ch")}
+    if len(batches) != 2 or added != expected:
+        failures.append(("new group", batches[1:], sorted(expected)))
+
+    await push((retire_after + RETIRE_CHECK_INTERVAL) // INTERVAL + 2)
+    retired = {"{}_{}2".format(station, sensor_type) for sensor_type in ("temp_ch", "humidity_ch")}
+    if set(removed) != retired or len(removed) != len(retired):
+        failures.append(("retired", sorted(removed), sorted(retired)))
+    if len(batches) != 2:
+        failures.append(("discovered while retiring", batches[2:]))
+
+    # the channel comes back
+    generator.temp_channels = 2
+    await push(1)
+    if len(batches) != 3 or set(batches[-1]) != retired:
+        failures.append(("rediscovered", batches[2:], sorted(retired)))
+
+    return {
+        "initial": len(initial),
+        "added": len(added),
+        "retired": len(removed),
+        "rediscovered": len(batches[2]) if len(batches) > 2 else 0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--retire-after", type=int, default=600)
+    args = parser.parse_args()
+
+    failures = []
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    report = loop.run_until_complete(_check(args.retire_after, failures))
+    loop.close()
+
+    print("{initial} sensors discovered, {added} added with a new group, "
+          "{retired} retired, {rediscovered} rediscovered".format(**report))
+    for failure in failures:
+        print("FAILED", failure)
+    if not failures:
+        print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+""" Check the export sinks against local stand-in servers
+
+Run from the repository root:
+
+    python -m benchmarks.check_export [--pushes N] [--stations S]
+
+Starts a stand-in InfluxDB /write endpoint (HTTP/1.1, keep-alive) and
+pushes through async_handle_webook with the InfluxDB export enabled:
+while the endpoint is healthy, while it answers 503 (batches spool and
+are resent in order once it recovers) and while it stalls (the webhook
+must not wait). Every push must arrive exactly once, over a reused
+connection. Then checks the spool bound and the MQTT sink through a
+stand-in MQTT integration.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+import aiohttp
+from homeassistant.helpers.aiohttp_client import DATA_CLIENTSESSION
+
+from custom_components.gw1000 import DOMAIN_SCHEMA, async_handle_webook, async_register, async_setup
+from custom_components.gw1000.const import (
+    CONF_BATCH_SIZE,
+    CONF_EXPORT,
+    CONF_INFLUXDB,
+    CONF_QUEUE_SIZE,
+    DATA_EXPORTERS,
+    DOMAIN,
+)
+from custom_components.gw1000.export import InfluxExporter, MqttExporter
+from custom_components.gw1000.payload import parse_payload
+
+from .payload import station_payloads
+from .stand_in import StandInHass, StandInRequest
+
+WEBHOOK_ID = "export"
+
+class StandInInflux(object):
+
+    """ /write endpoint keeping the lines it accepts """
+
+    def __init__(self):
+        self.lines = []
+        self.requests = 0
+        self.connections = 0
+        self.fail = 0
+        self.delay = 0
+        self._server = None
+        self._writers = set()
+
+    async def async_start(self):
+        self._server = await asyncio.start_server(self._async_serve, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def async_stop(self):
+        self._server.close()
+        for writer in self._writers:
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _async_serve(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    break
+                length = 0
+                while True:
+                    line = (await reader.readline()).strip()
+                    if not line:
+                        break
+                    name, value = line.decode().split(":", 1)
+                    if name.lower() == "content-length":
+                        length = int(value)
+                body = await reader.readexactly(length)
+                self.requests += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                if self.fail:
+                    self.fail -= 1
+                    writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 4\r\n\r\nbusy")
+                elif b"/write?db=" not in request:
+                    writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                else:
+                    self.lines.extend(body.decode().split("\n"))
+                    writer.write(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+class StandInMqtt(object):
+
+    """ hass.components.mqtt, keeping what is published """
+
+    def __init__(self):
+        self.messages = []
+
+    def async_publish(self, topic, payload, qos=0, retain=False):
+        self.messages.append((topic, payload))
+
+def _with_session(hass):
+    """ a session of our own as hass's shared one, hass refuses to close its own """
+    hass.data[DATA_CLIENTSESSION] = aiohttp.ClientSession()
+    return hass
+
+async def _settle(exporter):
+    await asyncio.sleep(0)
+    while exporter._flush is not None:
+        await asyncio.sleep(0.01)
+
+async def _pushes(hass, generators, count, acks):
+    for i in range(count):
+        body = generators[i % len(generators)].body()
+        start = time.perf_counter()
+        await async_handle_webook(hass, WEBHOOK_ID, StandInRequest(body))
+        acks.append(time.perf_counter() - start)
+        await asyncio.sleep(0)
+
+async def _check_influx(pushes, stations, config_dir, failures):
+    loop = asyncio.get_event_loop()
+    server = StandInInflux()
+    port = await server.async_start()
+
+    hass = _with_session(StandInHass(loop, config_dir))
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({
+        CONF_QUEUE_SIZE: 0,
+        CONF_EXPORT: {CONF_INFLUXDB: {"url": "http://127.0.0.1:{}".format(port), CONF_BATCH_SIZE: 100}},
+    })})
+    async_register(hass, "sensor", "sink", WEBHOOK_ID, "sensor.sink", lambda *args: None)
+    exporter = hass.data[DATA_EXPORTERS][0]
+    generators = station_payloads(stations, seed=0, temp_channels=2, pm25_channels=1)
+
+    acks = []
+    await _pushes(hass, generators, pushes, acks)
+    await _settle(exporter)
+
+    # outage: batches spool, new ones queue behind them
+    server.fail = 1000
+    await _pushes(hass, generators, pushes, acks)
+    await _settle(exporter)
+    if not exporter.spooled:
+        failures.append(("nothing spooled during outage", exporter.counters))
+    server.fail = 0
+    await exporter.async_flush(force=True)
+
+    # stall: the webhook must not wait on the sink
+    server.delay = 1.0
+    stalled = []
+    await _pushes(hass, generators, pushes, stalled)
+    server.delay = 0
+    await _settle(exporter)
+    await exporter.async_stop()
+
+    total = 3 * pushes
+    stamps = [
+        (line.split(",station=")[1].split(",")[0], line.rsplit(" ", 1)[1])
+        for line in server.lines if ",group=outdoor " in line
+    ]
+    if len(stamps) != total or len(set(stamps)) != total:
+        failures.append(("influx pushes", total, len(stamps), len(set(stamps))))
+    if exporter.counters["spool_batches"] or exporter.counters["pending"]:
+        failures.append(("left behind", exporter.counters))
+    if server.connections > 3:
+        failures.append(("connections not reused", server.connections, server.requests))
+    if max(stalled) > 0.05:
+        failures.append(("webhook waited on a stalled sink", max(stalled)))
+
+    await hass.data[DATA_CLIENTSESSION].close()
+    await server.async_stop()
+    acks.sort()
+    return {
+        "lines": len(server.lines),
+        "requests": server.requests,
+        "connections": server.connections,
+        "ack_median_us": acks[len(acks) // 2] * 1e6,
+        "stalled_ack_max_us": max(stalled) * 1e6,
+        "counters": exporter.counters,
+    }
+
+async def _check_spool(config_dir, failures):
+    loop = asyncio.get_event_loop()
+    hass = _with_session(StandInHass(loop))
+    # nothing listens on port 9
+    exporter = InfluxExporter(
+        hass, config_dir + "/bounded", "http://127.0.0.1:9", "gw1000",
+        batch_size=10, spool_size=8 * 1024,
+    )
+    generator = station_payloads(1, seed=1)[0]
+    for _ in range(500):
+        exporter.async_export(parse_payload(dict(generator.fields())))
+        await exporter.async_flush()
+    if exporter.counters["spool_bytes"] > 8 * 1024 or not exporter.spool_dropped:
+        failures.append(("spool not bounded", exporter.counters))
+    await exporter.async_stop()
+    await hass.data[DATA_CLIENTSESSION].close()
+    return exporter.counters
+
+async def _check_mqtt(pushes, config_dir, failures):
+    loop = asyncio.get_event_loop()
+    hass = StandInHass(loop)
+    hass.mqtt = StandInMqtt()
+    exporter = MqttExporter(hass, config_dir + "/mqtt", "gw1000/readings", batch_size=25)
+    generator = station_payloads(1, seed=2)[0]
+
+    # before MQTT is set up batches are spooled
+    for _ in range(pushes):
+        exporter.async_export(parse_payload(dict(generator.fields())))
+        await asyncio.sleep(0)
+    await _settle(exporter)
+    if not exporter.spooled:
+        failures.append(("mqtt not spooled while unavailable", exporter.counters))
+    hass.data["mqtt"] = True
+    for _ in range(pushes):
+        exporter.async_export(parse_payload(dict(generator.fields())))
+        await asyncio.sleep(0)
+    await exporter.async_stop()
+
+    readings = [line for _, payload in hass.mqtt.messages for line in payload.split("\n")]
+    if len(readings) != 2 * pushes or exporter.counters["spool_batches"]:
+        failures.append(("mqtt readings", 2 * pushes, len(readings), exporter.counters))
+    return {"messages": len(hass.mqtt.messages), "readings": len(readings)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pushes", type=int, default=400)
+    parser.add_argument("--stations", type=int, default=4)
+    args = parser.parse_args()
+
+    failures = []
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with tempfile.TemporaryDirectory() as config_dir:
+        influx = loop.run_until_complete(_check_influx(args.pushes, args.stations, config_dir, failures))
+        spool = loop.run_until_complete(_check_spool(config_dir, failures))
+        mqtt = loop.run_until_complete(_check_mqtt(args.pushes, config_dir, failures))
+    loop.close()
+
+    print("influxdb: {lines} lines in {requests} requests over {connections} connection(s), "
+          "ack median {ack_median_us:.1f}us, max while stalled {stalled_ack_max_us:.1f}us".format(**influx))
+    print("influxdb: {}".format(influx["counters"]))
+    print("spool: {}".format(spool))
+    print("mqtt: {messages} messages, {readings} readings".format(**mqtt))
+    for failure in failures:
+        print("FAILED", failure)
+    if not failures:
+        print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+""" Check the LAN API client against the local simulator
+
+Run from the repository root:
+
+    python -m benchmarks.check_lan [--polls N] [--seed S]
+
+Decoded live data must match the simulator's readings converted to the
+push units by independent formulas, the pooled connection must survive
+the simulator dropping it, discovery must find the simulator and polled
+results must reach a sensor through the push pipeline, also when the
+gateway could not be identified at start. Poll latency over
+the pooled connection is reported.
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+
+from custom_components.gw1000 import DOMAIN_SCHEMA, async_register, async_setup
+from custom_components.gw1000.const import CONF_QUEUE_SIZE, DOMAIN
+from custom_components.gw1000.lan import (
+    Gw1000Client,
+    Gw1000Poller,
+    async_discover,
+    decode_livedata,
+    station_key,
+)
+from custom_components.gw1000.sensor import GW1000Sensor
+
+from .simulator import Gw1000Simulator
+from .stand_in import StandInHass, stub_writes
+
+# field id: group, channel, part, raw (scaled int, metric) to push units,
+# tolerance (the push resolution)
+EXPECTED = {
+    0x01: ("indoor", None, "temperature", lambda raw: raw / 10 * 9 / 5 + 32, 0.05),
+    0x02: ("outdoor", None, "temperature", lambda raw: raw / 10 * 9 / 5 + 32, 0.05),
+    0x06: ("indoor", None, "humidity", lambda raw: raw, 0),
+    0x07: ("outdoor", None, "humidity", lambda raw: raw, 0),
+    0x08: ("pressure", None, "absolute", lambda raw: raw / 10 / 33.8639, 0.001),
+    0x09: ("pressure", None, "relative", lambda raw: raw / 10 / 33.8639, 0.001),
+    0x0A: ("wind", None, "bearing", lambda raw: raw, 0),
+    0x0B: ("wind", None, "speed", lambda raw: raw / 10 * 2.23694, 0.005),
+    0x0C: ("wind", None, "gust", lambda raw: raw / 10 * 2.23694, 0.005),
+    0x0E: ("rain", None, "rate", lambda raw: raw / 10 / 25.4, 0.0005),
+    0x14: ("rain", None, "total", lambda raw: raw / 10 / 25.4, 0.0005),
+    0x15: ("solar", None, "radiation", lambda raw: raw / 10 * 0.0079, 0.005),
+    0x17: ("solar", None, "uv", lambda raw: raw, 0),
+    0x1A: ("temperature", "1", "temperature", lambda raw: raw / 10 * 9 / 5 + 32, 0.05),
+    0x22: ("temperature", "1", "humidity", lambda raw: raw, 0),
+    0x2A: ("air", "1", "current", lambda raw: raw / 10, 0),
+    0x4D: ("air", "1", "avg_24h", lambda raw: raw / 10, 0),
+}
+
+def _check_decode(simulator, data, failures):
+    results = decode_livedata(data, "station")
+    for field_id, (group, channel, part, expect, tolerance) in EXPECTED.items():
+        raw = simulator.readings.get(field_id)
+        if raw is None:
+            continue
+        block = results.get(group, {})
+        value = (block.get(channel, {}) if channel else block).get(part)
+        wanted = expect(raw)
+        if value is None or abs(value - wanted) > tolerance + 1e-9:
+            failures.append((field_id, group, channel, part, value, wanted))
+    for part in ("dewpoint", "windchill", "heatindex"):
+        if part in results.get("outdoor", {}):
+            failures.append(("gateway derived value leaked", part))
+    return results
+
+async def _unreachable():
+    raise OSError("unreachable")
+
+async def _check(polls, seed):
+    loop = asyncio.get_event_loop()
+    failures = []
+
+    simulator = Gw1000Simulator(seed=seed)
+    port = await simulator.async_start(port=0, discovery_port=0)
+    discovery_port = simulator._transport.get_extra_info("sockname")[1]
+
+    client = Gw1000Client("127.0.0.1", port)
+    if await client.async_mac() != simulator.mac:
+        failures.append("mac")
+
+    samples = []
+    for _ in range(polls):
+        start = perf_counter()
+        data = await client.async_livedata()
+        samples.append(perf_counter() - start)
+        _check_decode(simulator, data, failures)
+
+    # the gateway drops idle connections, the client must reconnect
+    client._writer.transport.abort()
+    await client.async_livedata()
+    if client.connects != 2:
+        failures.append(("connects", client.connects))
+
+    found = await async_discover(loop, 0.2, "127.0.0.1", discovery_port)
+    if [gateway["mac"] for gateway in found] != [simulator.mac]:
+        failures.append(("discovery", found))
+
+    hass = StandInHass(loop)
+    # polled results are dispatched directly, no queue worker needed
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({CONF_QUEUE_SIZE: 0})})
+    poller = Gw1000Poller(hass, client, "lan")
+    # the gateway does not answer at start, it is identified on a poll
+    identify = client.async_mac
+    client.async_mac = _unreachable
+    await poller.async_start()
+    client.async_mac = identify
+    poller.async_stop()
+    if poller.station is not None:
+        failures.append(("identified without a mac", poller.station))
+    sensor = stub_writes(GW1000Sensor(hass, "lan", "lan", "windspeed", station=poller.station))
+    sensor.hass = hass
+    async_register(hass, "sensor", sensor.name, "lan", sensor.entity_id, sensor._async_handle_data, station=poller.station)
+    for _ in range(3):
+        await poller._async_poll(None)
+    if poller.station != station_key(simulator.mac) or poller.stationtype is None:
+        failures.append(("identify", poller.station, poller.stationtype))
+    if sensor.state is None or poller.polls != 3:
+        failures.append(("pipeline", sensor.state, poller.counters))
+
+    client.close()
+    await simulator.async_stop()
+
+    samples.sort()
+    return failures, samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--polls", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    failures, samples = loop.run_until_complete(_check(args.polls, args.seed))
+
+    print("{} polls, median {:.1f}us p99 {:.1f}us".format(
+        len(samples), samples[len(samples) // 2] * 1e6, samples[int(len(samples) * 0.99)] * 1e6
+    ))
+    for failure in failures[:20]:
+        print("MISMATCH", failure)
+    if failures:
+        raise SystemExit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+""" Check the per-sensor publish filter
+
+Run from the repository root:
+
+    python -m benchmarks.check_publish_filter
+
+Feeds PublishFilter value sequences on a simulated clock: the absolute
+and relative deadbands, min_interval and the heartbeat must each decide
+which values are written, and the published / suppressed counters must
+add up. Then sensors set up without any deadband configuration must
+write every changed value, and a configured deadband must only apply
+to its own sensor type.
+"""
+
+import asyncio
+
+from custom_components.gw1000.const import CONF_ABSOLUTE, CONF_DEADBAND, CONF_DISCOVERY, CONF_RELATIVE, DOMAIN
+from custom_components.gw1000.payload import parse_payload
+from custom_components.gw1000.publish import PublishFilter
+from custom_components.gw1000.sensor import PLATFORM_SCHEMA, async_setup_platform
+
+from .payload import PayloadGenerator
+from .stand_in import StandInHass, stub_writes
+
+def _run(publish, steps):
+    """ (time, value) steps, the values that were published """
+    return [value for now, value in steps if publish.check(value, now)]
+
+def _check_filter(failures):
+    cases = (
+        # no filtering: every change, no repeats
+        ("none", PublishFilter(), [(0, 1.0), (1, 1.0), (2, 1.01), (3, None), (4, None), (5, 2.0)],
+         [1.0, 1.01, None, 2.0]),
+        ("absolute", PublishFilter(absolute=0.5), [(0, 10.0), (1, 10.4), (2, 10.6), (3, 10.2), (4, 11.2)],
+         [10.0, 10.6, 11.2]),
+        ("relative", PublishFilter(relative=0.1), [(0, 100.0), (1, 109.0), (2, 111.0), (3, 101.0), (4, 99.0)],
+         [100.0, 111.0, 99.0]),
+        # both deadbands must be exceeded
+        ("both", PublishFilter(absolute=5, relative=0.01), [(0, 100.0), (1, 104.0), (2, 106.0), (3, 1000.0)],
+         [100.0, 106.0, 1000.0]),
+        ("min_interval", PublishFilter(min_interval=10), [(0, 1.0), (5, 2.0), (9, 3.0), (10, 4.0), (11, 5.0), (25, 5.0)],
+         [1.0, 4.0, 5.0]),
+        # the heartbeat writes an unchanged value, and overrides the deadband
+        ("heartbeat", PublishFilter(absolute=1, heartbeat=60), [(0, 5.0), (30, 5.0), (59, 5.5), (60, 5.5), (90, 5.5), (120, 5.2)],
+         [5.0, 5.5, 5.2]),
+        ("strings", PublishFilter(absolute=1), [(0, "N"), (1, "N"), (2, "NE")], ["N", "NE"]),
+    )
+    for name, publish, steps, expected in cases:
+        published = _run(publish, steps)
+        if published != expected:
+            failures.append((name, published, expected))
+        if publish.published != len(published) or publish.published + publish.suppressed != len(steps):
+            failures.append((name, "counters", publish.attributes))
+
+async def _check_sensors(failures):
+    loop = asyncio.get_event_loop()
+    hass = StandInHass(loop)
+    sensors = {}
+
+    def add_entities(entities, update_before_add=False):
+        for entity in entities:
+            entity.hass = hass
+            sensors[entity._sensor_type] = stub_writes(entity)
+
+    await async_setup_platform(hass, PLATFORM_SCHEMA({
+        "platform": DOMAIN,
+        "webhook_id": "filter",
+        CONF_DISCOVERY: False,
+        "monitored_conditions": ["solarradiation", "pressure_rel", "winddir"],
+        CONF_DEADBAND: {"winddir": {CONF_ABSOLUTE: 20, CONF_RELATIVE: 0}},
+    }), add_entities)
+
+    generator = PayloadGenerator(seed=4)
+    for i in range(200):
+        fields = dict(generator.fields())
+        # small steps, below any deadband a default would have set
+        fields["solarradiation"] = "{:.1f}".format(300 + (i % 2) * 50)
+        fields["baromrelin"] = "{:.3f}".format(29.9 + (i % 2) * 0.005)
+        fields["winddir"] = format(180 + (i % 2) * 10)
+        reading = parse_payload(fields)
+        for sensor in sensors.values():
+            sensor._async_handle_data(hass, "filter", sensor.entity_id, reading)
+
+    for sensor_type in ("solarradiation", "pressure_rel"):
+        if sensors[sensor_type].writes != 200:
+            failures.append(("unconfigured sensor filtered", sensor_type, sensors[sensor_type].writes))
+    if sensors["winddir"].writes != 1:
+        failures.append(("configured deadband not applied", sensors["winddir"].writes))
+    return {sensor_type: sensor.writes for sensor_type, sensor in sensors.items()}
+
+def main():
+    failures = []
+    _check_filter(failures)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    writes = loop.run_until_complete(_check_sensors(failures))
+    loop.close()
+
+    print("state writes over 200 pushes: {}".format(writes))
+    for failure in failures:
+        print("FAILED", failure)
+    if not failures:
+        print("OK")
+
+if __name__ == "__main__":
+    main()
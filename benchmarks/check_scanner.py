@@ -0,0 +1,88 @@
+""" Check the raw body scanner against aiohttp's form decoding
+
+Run from the repository root:
+
+    python -m benchmarks.check_scanner [--cases N] [--seed S]
+
+Generated payloads are mutated with percent-escapes, '+' spaces, blank
+and valueless fields, duplicates, unknown keys and empty segments, and
+scan_body must agree with the first value per schema key of parse_qsl.
+"""
+
+import argparse
+import random
+from urllib.parse import parse_qsl, quote
+
+from custom_components.gw1000.payload import INDEX, scan_body
+
+from .payload import PayloadGenerator
+
+def _escape(rand, text):
+    """ percent-escape a random subset of characters """
+    return "".join(
+        quote(char, safe="") if rand.random() < 0.2 and char != " " else char
+        for char in text
+    ).replace(" ", "+" if rand.random() < 0.5 else "%20")
+
+def _mutate(rand, fields):
+    out = []
+    for key, value in fields:
+        roll = rand.random()
+        if roll < 0.05:
+            value = ""
+        elif roll < 0.08:
+            value = value + " " + value
+        elif roll < 0.1:
+            value = "x&y=z"
+
+        if rand.random() < 0.1:
+            out.append(_escape(rand, key) + "=" + _escape(rand, value))
+        else:
+            out.append(key + "=" + quote(value, safe=""))
+
+        roll = rand.random()
+        if roll < 0.03:
+            out.append(quote(key) + "=dup")
+        elif roll < 0.06:
+            out.append("unknown{}={}".format(rand.randint(0, 99), value))
+        elif roll < 0.08:
+            out.append("")
+        elif roll < 0.1:
+            out.append(rand.choice(list(INDEX)))
+
+    if rand.random() < 0.2:
+        rand.shuffle(out)
+    body = "&".join(out)
+    if rand.random() < 0.1:
+        body += "\r\n"
+    return body.encode("ascii")
+
+def _expected(body):
+    fields = {}
+    for key, value in parse_qsl(body.rstrip().decode("utf-8"), keep_blank_values=True):
+        if key in INDEX and key not in fields:
+            fields[key] = value
+    return fields
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rand = random.Random(args.seed)
+    generator = PayloadGenerator(seed=args.seed, temp_channels=8, pm25_channels=4)
+    for case in range(args.cases):
+        body = _mutate(rand, generator.fields())
+        actual = scan_body(body)
+        expected = _expected(body)
+        if actual != expected:
+            raise SystemExit("case {} mismatch\nbody: {!r}\nscan: {!r}\nqsl:  {!r}".format(
+                case, body, actual, expected
+            ))
+
+    assert scan_body("tempf=1&name=é".encode("utf-8")) is None
+    print("{} payloads matched".format(args.cases))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+""" Check the warm start from the reading snapshot
+
+Run from the repository root:
+
+    python -m benchmarks.check_snapshot [--pushes N] [--stations S]
+
+Pushes to a first stand-in hass with sensor discovery, stops it (which
+writes the snapshot) and sets up a second one from the same directory.
+Before any push the second must have the same sensors, available, with
+the same states (within any deadband) and an age attribute; weather
+entities must be restored too. One push per station must then replace
+every restored state and clear the age. Downsampled sensors show the
+restored value but start their first window with the live push.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from custom_components.gw1000 import DOMAIN_SCHEMA, async_handle_webook, async_setup
+from custom_components.gw1000.const import CONF_DOWNSAMPLE, CONF_QUEUE_SIZE, DATA_SNAPSHOT, DOMAIN
+from custom_components.gw1000.sensor import PLATFORM_SCHEMA, async_setup_platform
+from custom_components.gw1000.weather import GW1000Weather
+
+from .payload import station_payloads
+from .stand_in import StandInHass, StandInRequest, stub_writes
+
+WEBHOOK_ID = "snapshot"
+
+async def _start(config_dir):
+    loop = asyncio.get_event_loop()
+    hass = StandInHass(loop, config_dir)
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({CONF_QUEUE_SIZE: 0})})
+
+    sensors = []
+
+    def add_entities(entities, update_before_add=False):
+        for entity in entities:
+            entity.hass = hass
+            sensors.append(stub_writes(entity))
+            loop.create_task(entity.async_added_to_hass())
+
+    await async_setup_platform(
+        hass,
+        PLATFORM_SCHEMA({
+            "platform": DOMAIN, "webhook_id": WEBHOOK_ID, CONF_DOWNSAMPLE: {"temp": 300, "winddir": 300},
+        }),
+        add_entities
+    )
+    await asyncio.sleep(0)
+    return hass, sensors
+
+async def _weather(hass, station):
+    weather = stub_writes(GW1000Weather("weather " + station[:6], WEBHOOK_ID, None, station=station))
+    weather.hass = hass
+    weather.entity_id = "weather.{}".format(station[:6].lower())
+    await weather.async_added_to_hass()
+    return weather
+
+async def _push(hass, generators):
+    for generator in generators:
+        await async_handle_webook(hass, WEBHOOK_ID, StandInRequest(generator.body()))
+        await asyncio.sleep(0)
+
+async def _check(pushes, stations, config_dir, failures):
+    generators = station_payloads(stations, seed=0, temp_channels=2, pm25_channels=1)
+
+    hass, sensors = await _start(config_dir)
+    for _ in range(pushes):
+        await _push(hass, generators)
+    weathers = [await _weather(hass, generator.passkey) for generator in generators]
+    await _push(hass, generators)
+    snapshot = hass.data[DATA_SNAPSHOT]
+    if snapshot.writes:
+        failures.append(("snapshot written before its interval", snapshot.writes))
+    await snapshot.async_stop()
+    before = {sensor.unique_id: sensor.latest for sensor in sensors}
+    weather_before = [(weather.temperature, weather.humidity) for weather in weathers]
+    path = hass.config.path(DOMAIN + "_snapshot.json")
+
+    start = time.perf_counter()
+    hass, sensors = await _start(config_dir)
+    setup = time.perf_counter() - start
+    weathers = [await _weather(hass, generator.passkey) for generator in generators]
+
+    # a deadband holds back live states and a window shows its mean, the
+    # restored one is the newest value
+    after = {sensor.unique_id: (sensor.latest, sensor._publish.absolute) for sensor in sensors}
+    missing = set(before) ^ set(after)
+    changed = [
+        key for key, (state, deadband) in after.items()
+        if key in before and state != before[key]
+        and not (deadband and abs(state - before[key]) <= deadband)
+    ]
+    if missing or changed:
+        failures.append(("restored states", len(before), len(after), sorted(missing)[:5], changed[:5]))
+    for sensor in sensors:
+        if not sensor.available or "age" not in sensor.device_state_attributes:
+            failures.append(("not restored", sensor.entity_id))
+    windows = [sensor._window for sensor in sensors if sensor._window is not None]
+    if not windows or any(window.count for window in windows):
+        failures.append(("restored values in a window", [window.count for window in windows]))
+    if [(weather.temperature, weather.humidity) for weather in weathers] != weather_before:
+        failures.append(("weather not restored", weather_before))
+    if not all(weather.available and "age" in weather.device_state_attributes for weather in weathers):
+        failures.append("weather not available")
+
+    await _push(hass, generators)
+    for entity in sensors + weathers:
+        if "age" in entity.device_state_attributes:
+            failures.append(("still restored after a push", entity.entity_id))
+    if any(window.count != 1 for window in windows):
+        failures.append(("first window after a restart", [window.count for window in windows]))
+
+    return {
+        "sensors": len(sensors),
+        "snapshot_bytes": os.path.getsize(path),
+        "setup_ms": setup * 1e3,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pushes", type=int, default=20)
+    parser.add_argument("--stations", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with tempfile.TemporaryDirectory() as config_dir:
+        report = loop.run_until_complete(_check(args.pushes, args.stations, config_dir, failures))
+    loop.close()
+
+    print("{sensors} sensors restored from a {snapshot_bytes} byte snapshot, "
+          "setup {setup_ms:.1f}ms".format(**report))
+    for failure in failures[:20]:
+        print("FAILED", failure)
+    if not failures:
+        print("OK")
+
+if __name__ == "__main__":
+    main()
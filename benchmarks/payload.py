@@ -0,0 +1,128 @@
+""" Seeded synthetic Ecowitt push payloads """
+
+import calendar
+import random
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+START = datetime(2020, 6, 1, 12, 0, 0)
+
+class PayloadGenerator(object):
+
+    """ Produce realistic, repeatable gateway form bodies
+
+    Values random-walk from push to push and dateutc advances by interval
+    seconds, so consecutive payloads look like one station reporting.
+    """
+
+    def __init__(self, seed=0, passkey=None, temp_channels=0, pm25_channels=0,
+                 wh65batt=True, model="GW1000_Pro", interval=16, start=START,
+                 leak_channels=0, lightning=False):
+        self._random = random.Random(seed)
+        self.passkey = passkey or "{:032X}".format(self._random.getrandbits(128))
+        self.temp_channels = temp_channels
+        self.pm25_channels = pm25_channels
+        self.leak_channels = leak_channels
+        self.lightning = lightning
+        self.leaks = [0] * leak_channels
+        self.strikes = 0
+        self.strike_time = None
+        self.wh65batt = wh65batt
+        self.model = model
+        self.interval = interval
+        self.time = start
+        self._state = {
+            "tempinf": 71.0, "humidityin": 40, "baromrelin": 29.92, "tempf": 55.0,
+            "humidity": 60, "winddir": 180, "windspeedmph": 4.0, "windgustmph": 6.0,
+            "solarradiation": 300.0, "rainratein": 0.0, "totalrainin": 12.0,
+        }
+
+    def _walk(self, key, step, low, high):
+        value = self._state[key] + self._random.uniform(-step, step)
+        value = min(high, max(low, value))
+        self._state[key] = value
+        return value
+
+    def fields(self):
+        """ next push as ordered (key, value) pairs """
+
+        walk = self._walk
+        rand = self._random
+        self.time += timedelta(seconds=self.interval)
+
+        baromrelin = walk("baromrelin", 0.01, 28.5, 31.0)
+        rainrate = walk("rainratein", 0.02, 0.0, 2.0)
+        total = self._state["totalrainin"] = self._state["totalrainin"] + rainrate * self.interval / 3600
+        windspeed = walk("windspeedmph", 1.5, 0.0, 40.0)
+        solar = walk("solarradiation", 25.0, 0.0, 1100.0)
+
+        fields = [
+            ("PASSKEY", self.passkey),
+            ("stationtype", "GW1000B_V1.6.3"),
+            ("dateutc", self.time.strftime("%Y-%m-%d %H:%M:%S")),
+            ("tempinf", "{:.1f}".format(walk("tempinf", 0.2, 60.0, 85.0))),
+            ("humidityin", "{:.0f}".format(walk("humidityin", 1, 20, 70))),
+            ("baromrelin", "{:.3f}".format(baromrelin)),
+            ("baromabsin", "{:.3f}".format(baromrelin - 0.35)),
+            ("tempf", "{:.1f}".format(walk("tempf", 0.4, -20.0, 110.0))),
+            ("humidity", "{:.0f}".format(walk("humidity", 2, 5, 100))),
+            ("winddir", "{:.0f}".format(walk("winddir", 20, 0, 359))),
+            ("windspeedmph", "{:.2f}".format(windspeed)),
+            ("windgustmph", "{:.2f}".format(windspeed + rand.uniform(0, 5))),
+            ("maxdailygust", "{:.2f}".format(windspeed + 8)),
+            ("solarradiation", "{:.2f}".format(solar)),
+            ("uv", "{:.0f}".format(solar // 100)),
+            ("rainratein", "{:.3f}".format(rainrate)),
+            ("eventrainin", "{:.3f}".format(rainrate / 4)),
+            ("hourlyrainin", "{:.3f}".format(rainrate / 2)),
+            ("dailyrainin", "{:.3f}".format(rainrate)),
+            ("weeklyrainin", "{:.3f}".format(rainrate * 2)),
+            ("monthlyrainin", "{:.3f}".format(rainrate * 4)),
+            ("yearlyrainin", "{:.3f}".format(total / 2)),
+            ("totalrainin", "{:.3f}".format(total)),
+        ]
+
+        for i in range(1, self.temp_channels + 1):
+            fields.append(("temp{}f".format(i), "{:.1f}".format(rand.uniform(30, 90))))
+            fields.append(("humidity{}".format(i), "{}".format(rand.randint(20, 90))))
+
+        for i in range(1, self.pm25_channels + 1):
+            fields.append(("pm25_ch{}".format(i), "{:.1f}".format(rand.uniform(0, 80))))
+            fields.append(("pm25_avg_24h_ch{}".format(i), "{:.1f}".format(rand.uniform(0, 40))))
+
+        # leaks start and stop now and then, strikes come in bursts
+        for i in range(self.leak_channels):
+            if rand.random() < 0.01:
+                self.leaks[i] ^= 1
+            fields.append(("leak_ch{}".format(i + 1), "{}".format(self.leaks[i])))
+            fields.append(("leakbatt{}".format(i + 1), "4"))
+
+        if self.lightning:
+            if rand.random() < 0.05:
+                self.strikes += rand.randint(1, 3)
+                self.strike_time = int(calendar.timegm(self.time.timetuple()))
+            fields.append(("lightning", "{:.0f}".format(rand.uniform(1, 40)) if self.strike_time else ""))
+            fields.append(("lightning_num", "{}".format(self.strikes)))
+            fields.append(("lightning_time", "{}".format(self.strike_time or "")))
+            fields.append(("wh57batt", "5"))
+
+        if self.wh65batt:
+            fields.append(("wh65batt", "0"))
+
+        for i in range(1, self.temp_channels + 1):
+            fields.append(("batt{}".format(i), "0"))
+
+        for i in range(1, self.pm25_channels + 1):
+            fields.append(("pm25batt{}".format(i), "{}".format(rand.randint(1, 5))))
+
+        fields.append(("freq", "915M"))
+        fields.append(("model", self.model))
+        return fields
+
+    def body(self):
+        """ next push as an urlencoded form body """
+        return urlencode(self.fields()).encode("ascii")
+
+def station_payloads(stations, seed=0, **kwargs):
+    """ one generator per station, seeded from seed """
+    return [PayloadGenerator(seed=seed + i, **kwargs) for i in range(stations)]
@@ -0,0 +1,125 @@
+""" Drive the start_profile / stop_profile services with synthetic pushes
+
+Run from the repository root:
+
+    python -m benchmarks.profile_pushes [--pushes N] [--stations S]
+        [--format pstats|collapsed] [--tracemalloc] [--out DIR]
+
+Sets up a stand-in hass with sensor discovery, pushes N synthetic
+payloads unprofiled, then calls start_profile for the next N pushes and
+pushes until it stops by itself. Prints the heaviest functions (pstats)
+or stacks (collapsed) and the per-push allocations with --tracemalloc.
+The push processing functions must be the originals before and after
+the profile, so an idle profiler costs nothing.
+"""
+
+import argparse
+import asyncio
+import os
+import pstats
+import tempfile
+import time
+from types import SimpleNamespace
+
+import custom_components.gw1000 as gw1000
+from custom_components.gw1000 import DOMAIN_SCHEMA, START_PROFILE_SCHEMA, async_handle_webook, async_setup
+from custom_components.gw1000.const import (
+    CONF_FORMAT,
+    CONF_PUSHES,
+    CONF_QUEUE_SIZE,
+    CONF_TRACEMALLOC,
+    DATA_PROFILER,
+    DOMAIN,
+    SERVICE_START_PROFILE,
+    SERVICE_STOP_PROFILE,
+)
+from custom_components.gw1000.profiler import PROFILED
+from custom_components.gw1000.sensor import PLATFORM_SCHEMA, async_setup_platform
+
+from .payload import station_payloads
+from .stand_in import StandInHass, StandInRequest, stub_writes
+
+WEBHOOK_ID = "profile"
+
+async def _push(hass, generators, pushes):
+    start = time.perf_counter()
+    for i in range(pushes):
+        await async_handle_webook(hass, WEBHOOK_ID, StandInRequest(generators[i % len(generators)].body()))
+        await asyncio.sleep(0)
+    return (time.perf_counter() - start) / pushes
+
+async def _profile(args, config_dir, failures):
+    loop = asyncio.get_event_loop()
+    hass = StandInHass(loop, config_dir)
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({CONF_QUEUE_SIZE: 0})})
+
+    def add_entities(entities, update_before_add=False):
+        for entity in entities:
+            entity.hass = hass
+            stub_writes(entity)
+            loop.create_task(entity.async_added_to_hass())
+
+    await async_setup_platform(hass, PLATFORM_SCHEMA({"platform": DOMAIN, "webhook_id": WEBHOOK_ID}), add_entities)
+    generators = station_payloads(args.stations, seed=0, temp_channels=2, pm25_channels=1)
+
+    originals = {name: getattr(gw1000, name) for name in PROFILED}
+    idle = await _push(hass, generators, args.pushes)
+
+    start = hass.services.handlers[(DOMAIN, SERVICE_START_PROFILE)]
+    start(SimpleNamespace(data=START_PROFILE_SCHEMA({
+        CONF_PUSHES: args.pushes, CONF_FORMAT: args.format, CONF_TRACEMALLOC: args.tracemalloc,
+    })))
+    profiler = hass.data[DATA_PROFILER]
+    profiled = await _push(hass, generators, args.pushes)
+    # the profile stopped by itself after its pushes, stop_profile waits for the files
+    await hass.services.handlers[(DOMAIN, SERVICE_STOP_PROFILE)](SimpleNamespace(data={}))
+
+    if profiler.running or profiler.pushes != args.pushes:
+        failures.append(("profile did not stop after its pushes", profiler.pushes))
+    if any(getattr(gw1000, name) is not original for name, original in originals.items()):
+        failures.append("push processing functions not restored")
+    for path in profiler.files:
+        if not os.path.getsize(path):
+            failures.append(("empty output", path))
+    return idle, profiled, profiler
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pushes", type=int, default=1000)
+    parser.add_argument("--stations", type=int, default=4)
+    parser.add_argument("--format", choices=("pstats", "collapsed"), default="pstats")
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--out", help="config directory to write to, a temporary one by default")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    failures = []
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with tempfile.TemporaryDirectory() as config_dir:
+        idle, profiled, profiler = loop.run_until_complete(_profile(args, args.out or config_dir, failures))
+        loop.close()
+
+        print("{} pushes: {:.1f}us per push idle, {:.1f}us profiled".format(
+            args.pushes, idle * 1e6, profiled * 1e6
+        ))
+        for path in profiler.files:
+            print("wrote", path if args.out else os.path.basename(path))
+            if path.endswith(".pstats"):
+                pstats.Stats(path).sort_stats("tottime").print_stats(args.top)
+            elif path.endswith(".collapsed"):
+                with open(path) as collapsed:
+                    stacks = [line.rsplit(" ", 1) for line in collapsed]
+                for stack, micro in sorted(stacks, key=lambda stack: -int(stack[1]))[:args.top]:
+                    print("{:>8}us {}".format(micro.strip(), stack.rsplit(";", 1)[-1]))
+            else:
+                with open(path) as report:
+                    print("".join(report.readlines()[:args.top]))
+
+    for failure in failures:
+        print("FAILED", failure)
+    if not failures:
+        print("OK")
+
+if __name__ == "__main__":
+    main()
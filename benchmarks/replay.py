@@ -0,0 +1,143 @@
+""" Replay recorded pushes through the webhook pipeline
+
+Run from the repository root:
+
+    python -m benchmarks.replay gw1000_pushes.rec [--speed N] [--queue] [--states out.json]
+    python -m benchmarks.replay synthetic.rec --synthesize 5000 --stations 10 --speed 0
+
+The recording (and its rotated .1, .2 ... backups, oldest first) is
+streamed from memory mapped files into async_handle_webook of a stand-in
+hass with sensor discovery, rolling history and metrics enabled. --speed
+1 keeps the recorded pacing, N replays N times faster and 0 as fast as
+possible. --states writes the final sensor states per station, the
+backfilled derived and rolling values included.
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from calendar import timegm
+
+from custom_components.gw1000 import DOMAIN_SCHEMA, async_handle_webook, async_metrics_dump, async_setup
+from custom_components.gw1000.const import CONF_METRICS, CONF_QUEUE_SIZE, DATA_QUEUE, DATA_SNAPSHOT, DOMAIN
+from custom_components.gw1000.ingest import DEFAULT_QUEUE_SIZE
+from custom_components.gw1000.recorder import PushRecorder, read_records, recording_files
+from custom_components.gw1000.sensor import PLATFORM_SCHEMA, async_setup_platform
+
+from .payload import station_payloads
+from .stand_in import StandInHass, StandInRequest, stub_writes
+
+WEBHOOK_ID = "replay"
+
+async def _synthesize(hass, path, pushes, stations, seed):
+    """ write a recording of interleaved synthetic stations """
+
+    recorder = PushRecorder(hass, path, max_size=1 << 40)
+    generators = station_payloads(stations, seed=seed, temp_channels=2, pm25_channels=1)
+    for i in range(pushes):
+        generator = generators[i % stations]
+        body = generator.body()
+        recorder.async_record(body, timegm(generator.time.timetuple()))
+    await recorder.async_stop()
+
+async def _replay(args, config_dir):
+    loop = asyncio.get_event_loop()
+    hass = StandInHass(loop, config_dir)
+
+    if args.synthesize:
+        await _synthesize(hass, args.path, args.synthesize, args.stations, args.seed)
+
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({
+        CONF_METRICS: True,
+        CONF_QUEUE_SIZE: DEFAULT_QUEUE_SIZE if args.queue else 0,
+    })})
+
+    sensors = []
+
+    def add_entities(entities, update_before_add=False):
+        for entity in entities:
+            entity.hass = hass
+            sensors.append(stub_writes(entity))
+            loop.create_task(entity.async_added_to_hass())
+
+    await async_setup_platform(
+        hass, PLATFORM_SCHEMA({"platform": DOMAIN, "webhook_id": WEBHOOK_ID}), add_entities
+    )
+
+    queue = hass.data.get(DATA_QUEUE)
+    pushes = 0
+    first = None
+    start = time.perf_counter()
+    for path in recording_files(args.path):
+        for arrival, body in read_records(path):
+            if args.speed:
+                if first is None:
+                    first = arrival
+                delay = start + (arrival - first) / args.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await async_handle_webook(hass, WEBHOOK_ID, StandInRequest(body))
+            pushes += 1
+            # let entities register and the queue worker keep up
+            await asyncio.sleep(0)
+    while queue is not None and queue.depth:
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+
+    if queue is not None:
+        await queue.async_stop()
+    snapshot = hass.data.get(DATA_SNAPSHOT)
+    if snapshot is not None:
+        await snapshot.async_stop()
+
+    report = {
+        "pushes": pushes,
+        "seconds": elapsed,
+        "pushes_per_second": pushes / elapsed if elapsed else None,
+        "entities": len(sensors),
+        "state_writes": sum(sensor.writes for sensor in sensors),
+        "metrics": async_metrics_dump(hass),
+    }
+
+    if args.states:
+        states = {}
+        for sensor in sensors:
+            states.setdefault(sensor._station, {})[sensor.entity_id] = sensor.state
+        with open(args.states, "w") as output:
+            json.dump(states, output, indent=2)
+
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("path", help="recording file, rotated backups are included")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 real time, N faster, 0 unthrottled")
+    parser.add_argument("--queue", action="store_true", help="replay through the ingestion queue")
+    parser.add_argument("--states", help="write the final sensor states as JSON")
+    parser.add_argument("--synthesize", type=int, default=0, help="first write N synthetic pushes to path")
+    parser.add_argument("--stations", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        # the snapshot is saved with the stand-in's config, not next to the recording
+        with tempfile.TemporaryDirectory() as config_dir:
+            report = loop.run_until_complete(_replay(args, config_dir))
+    finally:
+        loop.close()
+
+    stages = report["metrics"]["pipeline"]["stages"]
+    print("{pushes} pushes in {seconds:.2f}s, {pushes_per_second:.0f}/s, "
+          "{entities} entities, {state_writes} state writes".format(**report))
+    for stage, histogram in stages.items():
+        if histogram["count"]:
+            print("  {:<9} mean {:8.1f}us  max {:8.1f}us".format(
+                stage, histogram["mean"] * 1e6, histogram["max"] * 1e6
+            ))
+
+if __name__ == "__main__":
+    main()
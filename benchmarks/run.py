@@ -0,0 +1,217 @@
+""" Push pipeline benchmark suite
+
+Run from the repository root:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --compare bench.json
+
+Each case reports the mean and best time per push in microseconds. The
+JSON output can be fed back with --compare to check for regressions.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from urllib.parse import parse_qsl
+
+from multidict import MultiDict
+
+from custom_components.gw1000 import (
+    DOMAIN_SCHEMA,
+    _async_process_queued,
+    async_handle_webook,
+    async_register_many,
+    async_setup,
+)
+from custom_components.gw1000.const import DOMAIN, CONF_QUEUE_SIZE, DATA_METRICS, DATA_QUEUE
+from custom_components.gw1000.ingest import IngestQueue
+from custom_components.gw1000.conversions import CONVERT
+from custom_components.gw1000.metrics import PipelineMetrics
+from custom_components.gw1000.payload import parse_payload, scan_body
+from custom_components.gw1000.reading import LAYOUT
+from custom_components.gw1000.sensor import SENSOR_TYPES, GW1000Sensor
+
+from .payload import PayloadGenerator
+from .stand_in import StandInHass, StandInRequest, stub_writes
+
+WEBHOOK_ID = "bench"
+
+def _stats(samples):
+    samples = sorted(samples)
+    return {
+        "rounds": len(samples),
+        "mean_us": sum(samples) / len(samples) * 1e6,
+        "min_us": samples[0] * 1e6,
+        "median_us": samples[len(samples) // 2] * 1e6,
+    }
+
+def _time(func, args_list):
+    samples = []
+    clock = time.perf_counter
+    for args in args_list:
+        start = clock()
+        func(*args)
+        samples.append(clock() - start)
+    return _stats(samples)
+
+async def _time_async(func, args_list):
+    samples = []
+    clock = time.perf_counter
+    for args in args_list:
+        start = clock()
+        await func(*args)
+        samples.append(clock() - start)
+    return _stats(samples)
+
+def _form_decode(body):
+    """ what request.post() does with the body """
+    MultiDict(parse_qsl(body.rstrip().decode("utf-8"), keep_blank_values=True))
+
+# sensor type units and value offset, bound once like the sensors do
+_TARGETS = [
+    (units, LAYOUT.offset(key, part))
+    for _, units, _, _, key, part in SENSOR_TYPES.values()
+    if LAYOUT.offset(key, part) is not None
+]
+
+def _convert_all(reading):
+    """ every sensor type's conversion through the CONVERT table """
+    values = reading.values
+    for units, offset in _TARGETS:
+        convert = CONVERT.get(LAYOUT.units[offset], {}).get(units)
+        value = values[offset]
+        if convert is not None and value is not None:
+            convert(value)
+
+async def _time_acks(hass, queue, requests):
+    """ time each request, letting the worker drain outside the timer """
+    samples = []
+    clock = time.perf_counter
+    for request in requests:
+        start = clock()
+        await async_handle_webook(hass, WEBHOOK_ID, request)
+        samples.append(clock() - start)
+        while queue.depth:
+            await asyncio.sleep(0)
+    return _stats(samples)
+
+def _handle_all(sensors, results):
+    for sensor in sensors:
+        sensor._async_handle_data(None, WEBHOOK_ID, sensor.entity_id, results)
+
+def _sensors(hass):
+    sensors = [
+        stub_writes(GW1000Sensor(hass, "bench", WEBHOOK_ID, sensor_type))
+        for sensor_type in SENSOR_TYPES
+    ]
+    for sensor in sensors:
+        sensor.hass = hass
+    return sensors
+
+async def _bench(loop, rounds, seed):
+    hass = StandInHass(loop)
+    generator = PayloadGenerator(seed=seed, temp_channels=8, pm25_channels=4)
+    bodies = [generator.body() for _ in range(rounds)]
+    posts = [await StandInRequest(body).post() for body in bodies]
+    parsed = []
+    for post in posts:
+        parsed.append(parse_payload(post))
+
+    sensors = _sensors(hass)
+
+    report = {}
+    report["form_decode"] = _time(_form_decode, [(body,) for body in bodies])
+    report["scan"] = _time(scan_body, [(body,) for body in bodies])
+    report["parse"] = _time(parse_payload, [(post,) for post in posts])
+    report["convert_table"] = _time(_convert_all, [(results,) for results in parsed])
+    report["sensor_handlers"] = _time(_handle_all, [(sensors, results) for results in parsed])
+
+    # in-line processing, comparable with runs before the ingestion queue
+    await async_setup(hass, {DOMAIN: DOMAIN_SCHEMA({CONF_QUEUE_SIZE: 0})})
+    async_register_many(
+        hass, WEBHOOK_ID,
+        [("sensor", sensor.name, sensor.entity_id, sensor._async_handle_data) for sensor in sensors],
+    )
+    report["webhook"] = await _time_async(
+        async_handle_webook, [(hass, WEBHOOK_ID, StandInRequest(body)) for body in bodies]
+    )
+
+    hass.data[DATA_METRICS] = PipelineMetrics()
+    bodies = [generator.body() for _ in range(rounds)]
+    report["webhook_metrics"] = await _time_async(
+        async_handle_webook, [(hass, WEBHOOK_ID, StandInRequest(body)) for body in bodies]
+    )
+
+    # acknowledge only, the worker drains the queue between requests
+    queue = hass.data[DATA_QUEUE] = IngestQueue(_async_process_queued)
+    queue.async_start(hass)
+    bodies = [generator.body() for _ in range(rounds)]
+    report["webhook_ack"] = await _time_acks(
+        hass, queue, [StandInRequest(body) for body in bodies]
+    )
+    await queue.async_stop()
+    report["queue"] = queue.counters
+    report["state_writes"] = sum(sensor.writes for sensor in sensors)
+    return report
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _compare(report, baseline):
+    for name, stats in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not isinstance(stats, dict) or not isinstance(old, dict) or "mean_us" not in old:
+            continue
+        print("{:<16} {:10.1f}us -> {:10.1f}us  ({:+.1f}%)".format(
+            name, old["mean_us"], stats["mean_us"],
+            (stats["mean_us"] / old["mean_us"] - 1) * 100,
+        ))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="compare with a previous JSON output")
+    args = parser.parse_args(argv)
+
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(_bench(loop, args.rounds, args.seed))
+    finally:
+        loop.close()
+
+    report = {
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "rounds": args.rounds,
+        "seed": args.seed,
+        "results": results,
+    }
+
+    for name, stats in results.items():
+        if isinstance(stats, dict) and "mean_us" in stats:
+            print("{:<16} mean {:10.1f}us  min {:10.1f}us".format(name, stats["mean_us"], stats["min_us"]))
+        else:
+            print("{:<16} {}".format(name, stats))
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            _compare(report, json.load(baseline))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+if __name__ == "__main__":
+    main()
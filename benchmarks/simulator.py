@@ -0,0 +1,200 @@
+""" Local GW1000 binary API simulator
+
+Answers CMD_GW1000_LIVEDATA, CMD_READ_STATION_MAC and
+CMD_READ_FIRMWARE_VERSION over TCP and CMD_BROADCAST over UDP, with
+random-walk readings, so the LAN client can be exercised offline.
+
+Run from the repository root:
+
+    python -m benchmarks.simulator [--port 45000] [--discovery-port 46000]
+"""
+
+import argparse
+import asyncio
+import random
+import struct
+
+from custom_components.gw1000.lan import (
+    HEADER,
+    CMD_BROADCAST,
+    CMD_READ_STATION_MAC,
+    CMD_GW1000_LIVEDATA,
+    CMD_READ_FIRMWARE_VERSION,
+    DEFAULT_PORT,
+    DISCOVERY_PORT,
+    LIVEDATA_FIELDS,
+    WIDE_RESPONSES,
+)
+
+FIRMWARE = "GW1000B_V1.6.3"
+
+_FORMATS = {field_id: struct.Struct(fmt) for field_id, fmt, *_ in LIVEDATA_FIELDS}
+
+def response(command, data=b""):
+    """ response packet, size counts from the command through the checksum """
+
+    if command in WIDE_RESPONSES:
+        size = len(data) + 4
+        body = bytes((command, size >> 8, size & 0xFF)) + data
+    else:
+        body = bytes((command, len(data) + 3)) + data
+    return HEADER + body + bytes((sum(body) & 0xFF,))
+
+class Gw1000Simulator(object):
+
+    """ One simulated gateway and its WH65/WH31/WH41 sensors
+
+    readings holds the raw (scaled integer, metric) value per field id
+    sent by the last livedata reply, for comparison with decoded results.
+    """
+
+    def __init__(self, seed=0, mac="AA:BB:CC:DD:EE:FF", temp_channels=2, pm25_channels=1):
+        self._random = random.Random(seed)
+        self.mac = mac
+        self.temp_channels = temp_channels
+        self.pm25_channels = pm25_channels
+        self.requests = 0
+        self.connections = 0
+        self.readings = {}
+        self._state = {
+            0x01: 215, 0x02: 128, 0x06: 40, 0x07: 60, 0x08: 10020, 0x09: 10130,
+            0x0A: 180, 0x0B: 18, 0x0C: 27, 0x0E: 0, 0x14: 3048, 0x15: 400000, 0x17: 3,
+        }
+        self._server = None
+        self._transport = None
+        self.port = None
+
+    def _walk(self, field_id, step, low, high):
+        value = self._state[field_id] + self._random.randint(-step, step)
+        value = self._state[field_id] = min(high, max(low, value))
+        return value
+
+    def livedata(self):
+        """ next live data reply body """
+
+        walk = self._walk
+        rand = self._random
+        speed = walk(0x0B, 8, 0, 200)
+        rate = walk(0x0E, 5, 0, 500)
+        total = self._state[0x14] = self._state[0x14] + rate // 100
+        readings = {
+            0x01: walk(0x01, 2, 150, 300),
+            0x06: walk(0x06, 1, 20, 70),
+            0x02: walk(0x02, 4, -300, 450),
+            0x07: walk(0x07, 2, 5, 100),
+            0x08: walk(0x08, 3, 9500, 10400),
+            0x09: self._state[0x08] + 110,
+            0x0A: walk(0x0A, 20, 0, 359),
+            0x0B: speed,
+            0x0C: speed + rand.randint(0, 20),
+            0x19: speed + 40,
+            0x0D: rate // 4, 0x0E: rate, 0x0F: rate // 2, 0x10: rate,
+            0x11: rate * 2, 0x12: rate * 4, 0x13: total // 2, 0x14: total,
+            0x15: walk(0x15, 20000, 0, 1200000),
+            0x17: walk(0x17, 1, 0, 11),
+            0x03: 50, 0x04: 128, 0x05: 128,
+            # newer firmware reports its free heap before the channels
+            0x6C: 32768,
+        }
+        for i in range(self.temp_channels):
+            readings[0x1A + i] = rand.randint(-10, 320)
+            readings[0x22 + i] = rand.randint(20, 90)
+        for i in range(self.pm25_channels):
+            readings[0x2A if i == 0 else 0x50 + i] = rand.randint(0, 1500)
+            readings[0x4D + i] = rand.randint(0, 1500)
+
+        self.readings = readings
+        return b"".join(
+            bytes((field_id,)) + _FORMATS[field_id].pack(value)
+            for field_id, value in readings.items()
+        )
+
+    def mac_bytes(self):
+        return bytes(int(part, 16) for part in self.mac.split(":"))
+
+    def reply(self, command):
+        """ response packet for a command, None if unsupported """
+
+        if command == CMD_GW1000_LIVEDATA:
+            return response(command, self.livedata())
+        if command == CMD_READ_STATION_MAC:
+            return response(command, self.mac_bytes())
+        if command == CMD_READ_FIRMWARE_VERSION:
+            return response(command, bytes((len(FIRMWARE),)) + FIRMWARE.encode("ascii"))
+        if command == CMD_BROADCAST:
+            name = ("GW1000-WIFI" + self.mac[-5:].replace(":", "")).encode("ascii")
+            return response(
+                command,
+                self.mac_bytes() + bytes((127, 0, 0, 1)) + struct.pack(">H", self.port or DEFAULT_PORT)
+                + bytes((len(name),)) + name
+            )
+        return None
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readexactly(4)
+                await reader.readexactly(head[3] - 2)
+                packet = self.reply(head[2])
+                if packet is None:
+                    break
+                self.requests += 1
+                writer.write(packet)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def async_start(self, host="127.0.0.1", port=DEFAULT_PORT, discovery_port=None):
+        """ serve the API (port 0 picks a free one) and optionally discovery """
+
+        loop = asyncio.get_event_loop()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if discovery_port is not None:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DiscoveryResponder(self), local_addr=(host, discovery_port)
+            )
+        return self.port
+
+    async def async_stop(self):
+        if self._transport is not None:
+            self._transport.close()
+        self._server.close()
+        await self._server.wait_closed()
+
+class _DiscoveryResponder(asyncio.DatagramProtocol):
+
+    def __init__(self, simulator):
+        self._simulator = simulator
+        self._transport = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def datagram_received(self, data, addr):
+        if data[:3] == HEADER + bytes((CMD_BROADCAST,)):
+            self._transport.sendto(self._simulator.reply(CMD_BROADCAST), addr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--discovery-port", type=int, default=DISCOVERY_PORT)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    simulator = Gw1000Simulator(seed=args.seed)
+    port = loop.run_until_complete(simulator.async_start(args.host, args.port, args.discovery_port))
+    print("Simulating {} on {}:{}".format(simulator.mac, args.host, port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    loop.run_until_complete(simulator.async_stop())
+
+if __name__ == "__main__":
+    main()
@@ -6,34 +6,282 @@ _LOGGER = logging.getLogger(__name__)
 _LOGGER.debug("Loading...")
 
 import asyncio
+import json
+import sys
+from abc import ABC, abstractmethod
+from time import monotonic, perf_counter
 
-from homeassistant.core import callback
-from homeassistant.loader import bind_hass
+import voluptuous as vol
 
-from aiohttp.web import Request
+import homeassistant.helpers.config_validation as cv
 
 from homeassistant.const import (
-    PRESSURE_HPA,
-    PRESSURE_INHG,
-    TEMP_CELSIUS,
-    TEMP_FAHRENHEIT,
-    LENGTH_INCHES,
+    CONF_HOST,
+    CONF_PASSWORD,
+    CONF_PORT,
+    CONF_SCAN_INTERVAL,
+    CONF_TOKEN,
+    CONF_URL,
+    CONF_USERNAME,
+    CONF_WEBHOOK_ID,
+    EVENT_HOMEASSISTANT_STOP,
 )
+from homeassistant.core import callback
+from homeassistant.loader import bind_hass
+
+from aiohttp.web import Request
 
 from .const import (
     DOMAIN,
-    LENGTH_MILLIMETERS,
-    LIGHT_WATTS,
-    LIGHT_LUX,
-    SPEED_MILES,
-    SPEED_KILOMETERS,
+    CONF_DEDUPLICATE,
+    CONF_MAX_STATIONS,
+    CONF_HISTORY_SIZE,
+    CONF_DERIVED,
+    CONF_AIR_QUALITY_INDEX,
+    CONF_PUBLISH_INTERVAL,
+    CONF_PUBLISH_MAX_WRITES,
+    CONF_METRICS,
+    CONF_FILENAME,
+    CONF_GATEWAYS,
+    CONF_STATION,
+    CONF_QUEUE_SIZE,
+    CONF_QUEUE_POLICY,
+    CONF_RECORD,
+    CONF_MAX_SIZE,
+    CONF_BACKUPS,
+    CONF_EXPORT,
+    CONF_INFLUXDB,
+    CONF_MQTT,
+    CONF_DATABASE,
+    CONF_MEASUREMENT,
+    CONF_TOPIC,
+    CONF_QOS,
+    CONF_BATCH_SIZE,
+    CONF_FLUSH_INTERVAL,
+    CONF_SPOOL_SIZE,
+    CONF_SNAPSHOT,
+    CONF_SAVE_INTERVAL,
+    CONF_STALE_AFTER,
+    CONF_PUSHES,
+    CONF_SECONDS,
+    CONF_FORMAT,
+    CONF_TRACEMALLOC,
+    DATA_DUPLICATES,
+    DATA_HISTORY,
+    DATA_DERIVED,
+    DATA_AQI,
+    DATA_SCHEDULER,
+    DATA_METRICS,
+    DATA_GATEWAYS,
+    DATA_QUEUE,
+    DATA_RECORDER,
+    DATA_EXPORTERS,
+    DATA_SNAPSHOT,
+    DATA_WATCHDOG,
+    DATA_PROFILER,
+    SERVICE_DUMP_METRICS,
+    SERVICE_START_PROFILE,
+    SERVICE_STOP_PROFILE,
 ) 
 
+from .payload import (
+    async_read_post,
+    parse_payload,
+)
+
+from .aqi import (
+    AirQualityIndexes
+)
+
+from .dedupe import (
+    DEFAULT_MAX_STATIONS,
+    DuplicateFilter,
+)
+
+from .derived import (
+    DerivedValues
+)
+
+from .export import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_SPOOL_SIZE,
+    InfluxExporter,
+    MqttExporter,
+)
+
+from .ingest import (
+    DEFAULT_QUEUE_SIZE,
+    POLICIES,
+    POLICY_DROP_OLDEST,
+    IngestQueue,
+)
+
+from .lan import (
+    DEFAULT_PORT,
+    DEFAULT_POLL_INTERVAL,
+    Gw1000Client,
+    Gw1000Poller,
+    async_discover,
+)
+
+from .metrics import (
+    NULL_TIMER,
+    PipelineMetrics,
+    stage_timer,
+)
+
+from .profiler import (
+    FORMATS,
+    FORMAT_PSTATS,
+    PushProfiler,
+)
+
+from .publish import (
+    PublishScheduler
+)
+
+from .recorder import (
+    DEFAULT_BACKUPS,
+    DEFAULT_MAX_SIZE,
+    PushRecorder,
+)
+
+from .rolling import (
+    DEFAULT_HISTORY_SIZE,
+    RollingHistory,
+)
+
+from .snapshot import (
+    DEFAULT_SAVE_INTERVAL,
+    ReadingSnapshot,
+)
+
+from .watchdog import (
+    DEFAULT_STALE_AFTER,
+    StalenessWatchdog,
+)
+
 DEPENDENCIES = ['webhook']
 
+RETIRE_CHECK_INTERVAL = 300
+
+GATEWAY_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_HOST): cv.string,
+        vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.port,
+        vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_POLL_INTERVAL): vol.All(vol.Coerce(float), vol.Range(min=1)),
+        vol.Optional(CONF_WEBHOOK_ID, default=DOMAIN): cv.string,
+        vol.Optional(CONF_STATION): cv.string,
+    }
+)
+
+RECORD_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_FILENAME, default=DOMAIN + "_pushes.rec"): cv.string,
+        vol.Optional(CONF_MAX_SIZE, default=DEFAULT_MAX_SIZE): cv.positive_int,
+        vol.Optional(CONF_BACKUPS, default=DEFAULT_BACKUPS): cv.positive_int,
+    }
+)
+
+SNAPSHOT_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_FILENAME, default=DOMAIN + "_snapshot.json"): cv.string,
+        vol.Optional(CONF_SAVE_INTERVAL, default=DEFAULT_SAVE_INTERVAL): cv.positive_int,
+    }
+)
+
+BATCH_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_BATCH_SIZE, default=DEFAULT_BATCH_SIZE): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(CONF_FLUSH_INTERVAL, default=DEFAULT_FLUSH_INTERVAL): vol.All(vol.Coerce(float), vol.Range(min=1)),
+        vol.Optional(CONF_SPOOL_SIZE, default=DEFAULT_SPOOL_SIZE): cv.positive_int,
+    }
+)
+
+INFLUXDB_SCHEMA = BATCH_SCHEMA.extend(
+    {
+        vol.Required(CONF_URL): cv.url,
+        vol.Optional(CONF_DATABASE, default=DOMAIN): cv.string,
+        vol.Optional(CONF_MEASUREMENT, default=DOMAIN): cv.string,
+        vol.Optional(CONF_USERNAME): cv.string,
+        vol.Optional(CONF_PASSWORD): cv.string,
+        vol.Optional(CONF_TOKEN): cv.string,
+    }
+)
+
+MQTT_SCHEMA = BATCH_SCHEMA.extend(
+    {
+        vol.Optional(CONF_TOPIC, default=DOMAIN + "/readings"): cv.string,
+        vol.Optional(CONF_QOS, default=0): vol.In([0, 1, 2]),
+    }
+)
+
+EXPORT_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_INFLUXDB): INFLUXDB_SCHEMA,
+        vol.Optional(CONF_MQTT): MQTT_SCHEMA,
+    }
+)
+
+DOMAIN_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_DEDUPLICATE, default=True): cv.boolean,
+        vol.Optional(CONF_MAX_STATIONS, default=DEFAULT_MAX_STATIONS): cv.positive_int,
+        vol.Optional(CONF_HISTORY_SIZE, default=DEFAULT_HISTORY_SIZE): cv.positive_int,
+        vol.Optional(CONF_DERIVED, default=True): cv.boolean,
+        vol.Optional(CONF_AIR_QUALITY_INDEX, default=True): cv.boolean,
+        vol.Optional(CONF_PUBLISH_INTERVAL, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_PUBLISH_MAX_WRITES, default=0): cv.positive_int,
+        vol.Optional(CONF_METRICS, default=False): cv.boolean,
+        vol.Optional(CONF_QUEUE_SIZE, default=DEFAULT_QUEUE_SIZE): cv.positive_int,
+        vol.Optional(CONF_QUEUE_POLICY, default=POLICY_DROP_OLDEST): vol.In(POLICIES),
+        vol.Optional(CONF_RECORD): RECORD_SCHEMA,
+        vol.Optional(CONF_EXPORT, default={}): EXPORT_SCHEMA,
+        vol.Optional(CONF_SNAPSHOT, default={}): SNAPSHOT_SCHEMA,
+        vol.Optional(CONF_STALE_AFTER, default=DEFAULT_STALE_AFTER): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_GATEWAYS, default=[]): vol.All(cv.ensure_list, [GATEWAY_SCHEMA]),
+    }
+)
+
+DUMP_METRICS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_FILENAME, default=DOMAIN + "_metrics.json"): cv.string,
+    }
+)
+
+START_PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_FILENAME, default=DOMAIN + "_profile"): cv.string,
+        vol.Optional(CONF_PUSHES, default=0): cv.positive_int,
+        vol.Optional(CONF_SECONDS, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_FORMAT, default=FORMAT_PSTATS): vol.In(FORMATS),
+        vol.Optional(CONF_TRACEMALLOC, default=False): cv.boolean,
+    }
+)
+
+CONFIG_SCHEMA = vol.Schema({DOMAIN: DOMAIN_SCHEMA}, extra=vol.ALLOW_EXTRA)
+
 @callback
 @bind_hass
-def async_register(hass, domain, name, webhook_id, entity_id, handler):
+def async_register(hass, domain, name, webhook_id, entity_id, handler, timeout=None, station=None):
+    """ add a data handler for a webhook
+
+    Plain (callback) handlers are run in-line by the dispatcher, coroutine
+    handlers are scheduled as tasks, bounded by timeout seconds if given.
+    Handlers with a station (PASSKEY) only receive that station's pushes,
+    handlers without one receive every push on the webhook.
+    """
+
+    async_register_many(
+        hass, webhook_id, ((domain, name, entity_id, handler),), timeout, station
+    )
+
+@callback
+@bind_hass
+def async_register_many(hass, webhook_id, registrations, timeout=None, station=None):
+    """ add (domain, name, entity_id, handler) data handlers in one batch """
+
     hooks = hass.data.setdefault(DOMAIN, {})
 
     if not webhook_id in hooks:
@@ -42,26 +290,48 @@ def async_register(hass, domain, name, webhook_id, entity_id, handler):
             DOMAIN, DOMAIN + "DATA", webhook_id, async_handle_webook
         )
 
-    handlers = hooks.setdefault(webhook_id, {})
+    handlers = hooks.setdefault(webhook_id, {}).setdefault(station, {})
 
-    if entity_id in handlers:
-        raise ValueError("Handler is already defined!")
+    entries = {}
+    for domain, name, entity_id, handler in registrations:
+        if entity_id in handlers or entity_id in entries:
+            raise ValueError("Handler is already defined!")
 
-    _LOGGER.info("Registered Webhook %s handler %s", webhook_id, entity_id)
-    handlers[entity_id] = { "domain": domain, "name": name, "handler": handler }
+        entries[entity_id] = {
+            "domain": domain,
+            "name": name,
+            "handler": handler,
+            "coroutine": asyncio.iscoroutinefunction(handler),
+            "timeout": timeout,
+        }
 
+    handlers.update(entries)
+    _LOGGER.info("Registered Webhook %s station %s handlers %s", webhook_id, station, list(entries))
 
 @callback
 @bind_hass
-def async_unregister(hass, webhook_id, entity_id):
+def async_unregister(hass, webhook_id, entity_id, station=None):
     """ remove webhook """
 
-    _LOGGER.info("Unregistering Webhook %s handler %s", webhook_id, entity_id)
+    async_unregister_many(hass, webhook_id, (entity_id,), station)
+
+@callback
+@bind_hass
+def async_unregister_many(hass, webhook_id, entity_ids, station=None):
+    """ remove data handlers in one batch """
+
+    _LOGGER.info("Unregistering Webhook %s station %s handlers %s", webhook_id, station, entity_ids)
 
     hooks = hass.data.setdefault(DOMAIN, {})
-    handlers = hooks.get(webhook_id, {})
-    handlers.pop(entity_id, None)
+    routes = hooks.get(webhook_id, {})
+    handlers = routes.get(station, {})
+    for entity_id in entity_ids:
+        handlers.pop(entity_id, None)
+
     if len(handlers) == 0:
+        routes.pop(station, None)
+
+    if len(routes) == 0:
         _LOGGER.info("Unregistering Webhook %s", webhook_id)
         hooks.pop(webhook_id, None)
         hass.components.webhook.async_unregister(webhook_id)
@@ -76,118 +346,489 @@ async def async_handle_webook(hass, webhook_id, request: Request):
     if webhook_id not in hooks:
         return
     
-    handlers = hooks.get(webhook_id)
-    if not handlers:
+    routes = hooks.get(webhook_id)
+    if not routes:
         return
 
-    post = await request.post()
-    results = {
-        "key": post['PASSKEY'],
-        "stationtype": post['stationtype'],
-        "dateutc": post['dateutc'],
-        "freq": post['freq'],
-        "model": post['model'],
-        "indoor": {
-            "units": TEMP_FAHRENHEIT,
-            "temperature": float(post['tempinf']),
-            "humidity": int(post['humidityin']),
-        },
-        "outdoor": {
-            "units": TEMP_FAHRENHEIT,
-            "temperature": float(post['tempf']),
-            "humidity": int(post['humidity']),
-        },
-        "pressure": {
-            "units": PRESSURE_INHG,
-            "relative": float(post['baromrelin']),
-            "absolute": float(post['baromabsin'])
-        },
-        "rain": {
-            "units": LENGTH_INCHES,
-            "rate": float(post['rainratein']),
-            "event": float(post['eventrainin']),
-            "hourly": float(post['hourlyrainin']),
-            "daily": float(post['dailyrainin']),
-            "weekly": float(post['weeklyrainin']),
-            "monthly": float(post['monthlyrainin']),
-            "yearly": float(post['yearlyrainin']),
-            "total": float(post['totalrainin']),
-        },
-        "wind": {
-            "units": SPEED_MILES,
-            "bearing": int(post['winddir']),
-            "speed": float(post['windspeedmph']),
-            "gust": float(post['windgustmph']),
-            "maxgust": float(post['maxdailygust']),
-        },
-        "solar": {
-            "units": LIGHT_WATTS,
-            "radiation": float(post['solarradiation']),
-            "uv": int(post['uv']),
-        },
-#        "temperature": {},
-#        "air": {},
-#        "soil": {},
-#        "lightning": {},
-#        "leak": {},
-    }
+    metrics = hass.data.get(DATA_METRICS)
+    timer = stage_timer(metrics)
+
+    post = await async_read_post(request)
+
+    recorder = hass.data.get(DATA_RECORDER)
+    if recorder is not None:
+        # the body is cached by the request, this does not read it again
+        recorder.async_record(await request.read())
+    timer.lap("read")
+
+    # before queueing, so gateway retries take no queue slots
+    duplicates = hass.data.get(DATA_DUPLICATES)
+    if duplicates is not None and not duplicates.accept(post.get("PASSKEY"), post.get("dateutc")):
+        _LOGGER.debug("Webhook %s dropped repeated push %s", webhook_id, post.get("dateutc"))
+        return
+    timer.lap("filter")
+
+    # acknowledge at once, the queue worker does the rest
+    queue = hass.data.get(DATA_QUEUE)
+    if queue is not None:
+        queue.async_put(post.get("PASSKEY"), hass, webhook_id, post, timer)
+        return
+
+    async_process_post(hass, webhook_id, post, timer)
+
+@callback
+@bind_hass
+def async_process_post(hass, webhook_id, post, timer=NULL_TIMER):
+    """ parse and dispatch a push that passed the duplicate filter """
+
+    routes = hass.data.get(DOMAIN, {}).get(webhook_id)
+    if not routes:
+        return
+
+    results = parse_payload(post)
+    timer.lap("parse")
+
+    async_process_results(hass, webhook_id, routes, results, timer)
+
+@callback
+@bind_hass
+def async_process_results(hass, webhook_id, routes, results: dict, timer=NULL_TIMER):
+    """ enrich parsed results (pushed or polled) and dispatch them """
+
+    metrics = hass.data.get(DATA_METRICS)
+
+    derived = hass.data.get(DATA_DERIVED)
+    if derived is not None:
+        derived.update(results)
 
-    for i in range(1,9):
-        temp = post.get('temp{}f'.format(i))
-        if temp is not None:
-            results.setdefault("temperature", {})[format(i)] = {
-                    "id": i, 
-                    "temperature": temp, 
-                    "humidity": int(post['humidity{}'.format(i)]), 
-                    "lowbatt": post['batt{}'.format(i)] != '0' 
-                }
-
-    for i in range(1,5):
-        air = post.get('pm25_ch{}'.format(i))
-        if air is not None:
-            results.setdefault("air", {})[format(i)] = {
-                "id": i, 
-                "current": float(air),
-                "avg_24h": float(post['pm25_avg_24h_ch{}'.format(i)]),
-                "battery": (int(post['pm25batt{}'.format(i)]) / 5) * 100
-            }
-
-    batt = post.get('wh65batt')
-    if batt is not None:
-        batt = batt != '0'
-        results['outdoor']['lowbatt'] = batt
-        results['rain']['lowbatt'] = batt
-        results['wind']['lowbatt'] = batt
+    aqi = hass.data.get(DATA_AQI)
+    if aqi is not None:
+        aqi.update(results)
+
+    history = hass.data.get(DATA_HISTORY)
+    if history is not None:
+        history.update(results)
+
+    if metrics is not None:
+        interval = metrics.push(results.get("key"), results.get("freq"))
+        results["metrics"] = metrics.summary(interval)
+
+    snapshot = hass.data.get(DATA_SNAPSHOT)
+    if snapshot is not None:
+        snapshot.async_update(results)
+
+    # before dispatch, so stale entities are live again when updated
+    watchdog = hass.data.get(DATA_WATCHDOG)
+    if watchdog is not None:
+        watchdog.async_seen(results.get("key"))
+    timer.lap("enrich")
 
     _LOGGER.debug("Webhook %s handler fired: %s", webhook_id, results)
 
-    await asyncio.wait([handlers[entity_id]["handler"](hass, webhook_id, entity_id, results) for entity_id in handlers])
+    async_route(hass, webhook_id, routes, results)
+    timer.lap("dispatch")
+
+    exporters = hass.data.get(DATA_EXPORTERS)
+    if exporters:
+        for exporter in exporters:
+            try:
+                exporter.async_export(results)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Webhook %s %s export failed", webhook_id, exporter.name)
+        timer.lap("export")
+
+@callback
+def async_route(hass, webhook_id, routes, results: dict):
+    """ dispatch a push to its station's handlers and the catch-all ones """
+
+    station = results.get("key")
+    if station is not None:
+        handlers = routes.get(station)
+        if handlers:
+            async_dispatch(hass, webhook_id, handlers, results)
+
+    handlers = routes.get(None)
+    if handlers:
+        async_dispatch(hass, webhook_id, handlers, results)
+
+@callback
+def async_dispatch(hass, webhook_id, handlers, results: dict):
+    """ update every handler of a webhook in a single pass """
+
+    metrics = hass.data.get(DATA_METRICS)
+
+    # handlers may (un)register entities while we iterate
+    for entity_id, entry in tuple(handlers.items()):
+        if metrics is not None:
+            start = perf_counter()
+        try:
+            if entry["coroutine"]:
+                hass.async_create_task(
+                    _async_run_handler(hass, webhook_id, entity_id, entry, results)
+                )
+            else:
+                entry["handler"](hass, webhook_id, entity_id, results)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Webhook %s handler %s failed", webhook_id, entity_id)
+            if metrics is not None:
+                metrics.handler_errors += 1
+        if metrics is not None:
+            metrics.observe_handler(entry["domain"], perf_counter() - start)
+
+async def _async_run_handler(hass, webhook_id, entity_id, entry, results: dict):
+    """ run a coroutine handler, isolated from the others """
+
+    try:
+        await asyncio.wait_for(
+            entry["handler"](hass, webhook_id, entity_id, results), entry["timeout"]
+        )
+    except asyncio.TimeoutError:
+        _LOGGER.warning("Webhook %s handler %s timed out", webhook_id, entity_id)
+        _async_count_error(hass)
+    except Exception:  # pylint: disable=broad-except
+        _LOGGER.exception("Webhook %s handler %s failed", webhook_id, entity_id)
+        _async_count_error(hass)
+
+@callback
+def _async_count_error(hass):
+    metrics = hass.data.get(DATA_METRICS)
+    if metrics is not None:
+        metrics.handler_errors += 1
 
 async def async_setup(hass, config):
     """Set up the gw1000 platform."""
 
+    conf = config.get(DOMAIN) or DOMAIN_SCHEMA({})
+
+    if conf[CONF_DEDUPLICATE]:
+        hass.data[DATA_DUPLICATES] = DuplicateFilter(conf[CONF_MAX_STATIONS])
+
+    if conf[CONF_DERIVED]:
+        hass.data[DATA_DERIVED] = DerivedValues()
+
+    if conf[CONF_AIR_QUALITY_INDEX]:
+        hass.data[DATA_AQI] = AirQualityIndexes()
+
+    if conf[CONF_HISTORY_SIZE]:
+        hass.data[DATA_HISTORY] = RollingHistory(conf[CONF_HISTORY_SIZE])
+
+    if conf[CONF_PUBLISH_INTERVAL]:
+        scheduler = hass.data[DATA_SCHEDULER] = PublishScheduler(
+            hass, conf[CONF_PUBLISH_INTERVAL], conf[CONF_PUBLISH_MAX_WRITES]
+        )
+
+        @callback
+        def _async_stop_scheduler(event):
+            scheduler.async_stop()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_scheduler)
+
+    if conf[CONF_METRICS]:
+        hass.data[DATA_METRICS] = PipelineMetrics()
+
+        async def _async_dump_metrics(call):
+            path = hass.config.path(call.data[CONF_FILENAME])
+            dump = async_metrics_dump(hass)
+            await hass.async_add_executor_job(_write_json, path, dump)
+            _LOGGER.info("Wrote metrics to %s", path)
+
+        hass.services.async_register(
+            DOMAIN, SERVICE_DUMP_METRICS, _async_dump_metrics, schema=DUMP_METRICS_SCHEMA
+        )
+
+    if conf[CONF_QUEUE_SIZE]:
+        queue = hass.data[DATA_QUEUE] = IngestQueue(
+            _async_process_queued, conf[CONF_QUEUE_SIZE], conf[CONF_QUEUE_POLICY]
+        )
+        queue.async_start(hass)
+
+        async def _async_stop_queue(event):
+            await queue.async_stop()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_queue)
+
+    if CONF_RECORD in conf:
+        record = conf[CONF_RECORD]
+        recorder = hass.data[DATA_RECORDER] = PushRecorder(
+            hass, hass.config.path(record[CONF_FILENAME]),
+            record[CONF_MAX_SIZE] * 1024 * 1024, record[CONF_BACKUPS]
+        )
+
+        async def _async_stop_recorder(event):
+            await recorder.async_stop()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_recorder)
+
+    if conf[CONF_EXPORT]:
+        async_setup_exporters(hass, conf[CONF_EXPORT])
+
+    # platforms are set up after us, so entities can start from the snapshot
+    if conf[CONF_SNAPSHOT][CONF_SAVE_INTERVAL]:
+        snapshot = hass.data[DATA_SNAPSHOT] = ReadingSnapshot(
+            hass, hass.config.path(conf[CONF_SNAPSHOT][CONF_FILENAME]),
+            conf[CONF_SNAPSHOT][CONF_SAVE_INTERVAL]
+        )
+        await snapshot.async_load()
+
+        async def _async_stop_snapshot(event):
+            await snapshot.async_stop()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_snapshot)
+
+    if conf[CONF_STALE_AFTER]:
+        watchdog = hass.data[DATA_WATCHDOG] = StalenessWatchdog(hass, conf[CONF_STALE_AFTER])
+
+        # restored stations that never push again go stale too
+        snapshot = hass.data.get(DATA_SNAPSHOT)
+        if snapshot is not None:
+            for station in snapshot.readings:
+                watchdog.async_expect(station)
+            watchdog.async_expect(None)
+
+        @callback
+        def _async_stop_watchdog(event):
+            watchdog.async_stop()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_watchdog)
+
+    async_setup_profiling(hass)
+
+    if conf[CONF_GATEWAYS]:
+        hass.async_create_task(async_setup_gateways(hass, conf[CONF_GATEWAYS]))
+
     _LOGGER.debug("Initialized module")
 
     return True
 
-class GW1000EntityFactory(object):
+@callback
+def _async_process_queued(hass, webhook_id, post, timer):
+    timer.lap("queue")
+    async_process_post(hass, webhook_id, post, timer)
 
-    """Factory to create/remove entities based on webhook data """
+@callback
+def async_setup_profiling(hass):
+    """ register the start_profile / stop_profile services """
+
+    @callback
+    def _async_start_profile(call):
+        profiler = hass.data.get(DATA_PROFILER)
+        if profiler is not None and profiler.running:
+            _LOGGER.warning("A profile is already running")
+            return
+        profiler = hass.data[DATA_PROFILER] = PushProfiler(
+            hass, sys.modules[__name__], hass.config.path(call.data[CONF_FILENAME]),
+            call.data[CONF_FORMAT], call.data[CONF_PUSHES], call.data[CONF_SECONDS],
+            call.data[CONF_TRACEMALLOC],
+        )
+        profiler.async_start()
 
-    def __init__(self, hass, add_entities, domain, name, key, webhook_id):
+    async def _async_stop_profile(call):
+        profiler = hass.data.get(DATA_PROFILER)
+        if profiler is not None:
+            await profiler.async_stop()
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_START_PROFILE, _async_start_profile, schema=START_PROFILE_SCHEMA
+    )
+    hass.services.async_register(DOMAIN, SERVICE_STOP_PROFILE, _async_stop_profile)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_profile)
+
+@callback
+def async_setup_exporters(hass, export):
+    """ start the configured export sinks """
+
+    def batching(sink):
+        return {
+            "spool_path": hass.config.path(DOMAIN + "_spool", sink),
+            "batch_size": export[sink][CONF_BATCH_SIZE],
+            "flush_interval": export[sink][CONF_FLUSH_INTERVAL],
+            "spool_size": export[sink][CONF_SPOOL_SIZE] * 1024 * 1024,
+        }
+
+    exporters = hass.data.setdefault(DATA_EXPORTERS, [])
+    if CONF_INFLUXDB in export:
+        influxdb = export[CONF_INFLUXDB]
+        exporters.append(InfluxExporter(
+            hass, url=influxdb[CONF_URL], database=influxdb[CONF_DATABASE],
+            measurement=influxdb[CONF_MEASUREMENT], username=influxdb.get(CONF_USERNAME),
+            password=influxdb.get(CONF_PASSWORD), token=influxdb.get(CONF_TOKEN),
+            **batching(CONF_INFLUXDB)
+        ))
+    if CONF_MQTT in export:
+        mqtt = export[CONF_MQTT]
+        exporters.append(MqttExporter(
+            hass, topic=mqtt[CONF_TOPIC], qos=mqtt[CONF_QOS], **batching(CONF_MQTT)
+        ))
+
+    async def _async_stop_exporters(event):
+        for exporter in exporters:
+            await exporter.async_stop()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_exporters)
+
+async def async_setup_gateways(hass, gateways):
+    """ start LAN API pollers, gateways without a host are discovered """
+
+    if any(CONF_HOST not in gateway for gateway in gateways):
+        found = await async_discover(hass.loop)
+        _LOGGER.info("Discovered gateways %s", found)
+    else:
+        found = []
+
+    pollers = hass.data.setdefault(DATA_GATEWAYS, [])
+    for gateway in gateways:
+        host, port = gateway.get(CONF_HOST), gateway[CONF_PORT]
+        if host is None:
+            if not found:
+                _LOGGER.error("No gateway found for %s", gateway[CONF_WEBHOOK_ID])
+                continue
+            discovered = found.pop(0)
+            host, port = discovered["host"], discovered["port"]
+
+        poller = Gw1000Poller(
+            hass, Gw1000Client(host, port), gateway[CONF_WEBHOOK_ID],
+            gateway[CONF_SCAN_INTERVAL], gateway.get(CONF_STATION)
+        )
+        await poller.async_start()
+        pollers.append(poller)
+
+    @callback
+    def _async_stop_pollers(event):
+        for poller in pollers:
+            poller.async_stop()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_pollers)
+
+@callback
+@bind_hass
+def async_metrics_dump(hass):
+    """ pipeline metrics and filter/scheduler counters as a dict """
+
+    dump = {}
+    metrics = hass.data.get(DATA_METRICS)
+    if metrics is not None:
+        dump["pipeline"] = metrics.as_dict()
+    for name, key in (
+            ("duplicates", DATA_DUPLICATES),
+            ("scheduler", DATA_SCHEDULER),
+            ("queue", DATA_QUEUE),
+            ("recorder", DATA_RECORDER),
+            ("snapshot", DATA_SNAPSHOT),
+            ("watchdog", DATA_WATCHDOG),
+        ):
+        data = hass.data.get(key)
+        if data is not None:
+            dump[name] = data.counters
+    pollers = hass.data.get(DATA_GATEWAYS)
+    if pollers:
+        dump["gateways"] = {poller.station: poller.counters for poller in pollers}
+    exporters = hass.data.get(DATA_EXPORTERS)
+    if exporters:
+        dump["exporters"] = {exporter.name: exporter.counters for exporter in exporters}
+    return dump
+
+def _write_json(path, data):
+    with open(path, "w") as output:
+        json.dump(data, output, indent=2)
+
+class GW1000EntityFactory(ABC):
+
+    """Factory to create/remove entities based on webhook data
+
+    Subclasses yield the unique ids of entities a push has data for from
+    async_discover and build missing ones in async_create. New entities
+    are added in one batch per push, entities whose data has not been
+    seen for retire_after seconds are removed (and may be rediscovered).
+    With a reading snapshot, the entities of the last readings are created
+    at setup, marked restored until their first live push.
+    """
+
+    def __init__(self, hass, add_entities, domain, name, key, webhook_id, station=None, retire_after=0):
+        self._hass = hass
         self._domain = domain
         self._name = name
         self._webhook_id = webhook_id
+        self._station = station
         self._key = key
         self._add_entities = add_entities
+        self._retire_after = retire_after
+        self._next_retire = None
+        self._seen = {}
         self.entities = {}
 
         hass.components.gw1000.async_register(
-            self._domain, self._name, self._webhook_id, "factory", self._async_handle_data
+            self._domain, self._name, self._webhook_id,
+            "{}.{}_factory".format(domain, name), self._async_handle_data,
+            station=station
         )
 
-    async def _async_handle_data(self, hass, webhook_id, entity_id, results: dict):
+        snapshot = hass.data.get(DATA_SNAPSHOT)
+        if snapshot is not None:
+            self._async_restore(snapshot)
+
+    def async_discover(self, results: dict):
+        """ unique ids of the entities this push has data for """
+        return ()
+
+    @abstractmethod
+    def async_create(self, unique_id, results: dict, restored=False):
+        """ build the entity for unique_id, primed with this push (or, when
+        restored, with the snapshot's reading) """
+
+    @callback
+    def _async_restore(self, snapshot):
+        """ create the entities of the snapshot's readings """
+
+        now = monotonic()
+        if self._station is not None:
+            restored = snapshot.async_latest(self._station)
+            readings = [restored] if restored is not None else []
+        else:
+            readings = snapshot.readings.values()
+
+        new = []
+        for reading, timestamp in readings:
+            for unique_id in self.async_discover(reading):
+                self._seen[unique_id] = now
+                if unique_id not in self.entities:
+                    entity = self.entities[unique_id] = self.async_create(unique_id, reading, True)
+                    entity.async_mark_restored(timestamp)
+                    new.append(entity)
+
+        if new:
+            _LOGGER.info("Restored %s %s entities on %s", len(new), self._domain, self._webhook_id)
+            self._add_entities(new)
+
+    @callback
+    def _async_handle_data(self, hass, webhook_id, entity_id, results: dict):
         """Implement entity create/update"""
-        
-        block = results.get(self._key, {})
 
+        now = monotonic()
+        seen = self._seen
+        entities = self.entities
+        new = []
+        for unique_id in self.async_discover(results):
+            seen[unique_id] = now
+            if unique_id not in entities:
+                entity = entities[unique_id] = self.async_create(unique_id, results)
+                new.append(entity)
+
+        if new:
+            _LOGGER.info("Discovered %s %s entities on %s", len(new), self._domain, webhook_id)
+            self._add_entities(new)
+
+        if self._retire_after and (self._next_retire is None or now >= self._next_retire):
+            self._next_retire = now + min(self._retire_after, RETIRE_CHECK_INTERVAL)
+            self._async_retire(now)
+
+    @callback
+    def _async_retire(self, now):
+        cutoff = now - self._retire_after
+        for unique_id, last in list(self._seen.items()):
+            if last >= cutoff:
+                continue
+            del self._seen[unique_id]
+            entity = self.entities.pop(unique_id, None)
+            if entity is not None and entity.hass is not None:
+                _LOGGER.info("Retiring silent entity %s", entity.entity_id)
+                self._hass.async_create_task(entity.async_remove())
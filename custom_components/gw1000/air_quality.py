@@ -5,46 +5,62 @@ import logging
 _LOGGER = logging.getLogger(__name__)
 _LOGGER.debug("Loading...")
 
+from time import time
+
 import voluptuous as vol
 
 import homeassistant.helpers.config_validation as cv
 
-from homeassistant.components.air_quality import PLATFORM_SCHEMA, AirQualityEntity
+from homeassistant.components.air_quality import PLATFORM_SCHEMA, AirQualityEntity, ENTITY_ID_FORMAT
 
 from homeassistant.const import (
     CONF_WEBHOOK_ID,
     CONF_NAME,
-    ATTR_ATTRIBUTION,
-    CONF_ENTITY_NAMESPACE,
 )
 from homeassistant.core import callback
 
-from homeassistant.helpers.entity import Entity, generate_entity_id
-
-from homeassistant.helpers.icon import icon_for_battery_level
+from homeassistant.helpers.entity import async_generate_entity_id
 
 from . import (
     GW1000EntityFactory
 )
 
 from .const import (
-    DOMAIN
+    DOMAIN,
+    CONCENTRATION_MICROGRAMS,
+    CONF_STATION,
+    CONF_RETIRE_AFTER,
+    DATA_WATCHDOG,
+)
+
+from .aqi import (
+    AQI_PARTS
+)
+
+from .reading import (
+    LAYOUT
 )
 
-from .conversions import (
-    CONVERT
+from .publish import (
+    async_publish,
 )
 
 DEPENDENCIES = ['gw1000']
 
+DEFAULT_RETIRE_AFTER = 86400
+
+_PM25_OFFSETS = LAYOUT.channel_offsets("air", "current")
+
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
         vol.Optional(CONF_NAME, default=DOMAIN): cv.string,
         vol.Optional(CONF_WEBHOOK_ID): cv.string,
+        vol.Optional(CONF_STATION): cv.string,
+        vol.Optional(CONF_RETIRE_AFTER, default=DEFAULT_RETIRE_AFTER): cv.positive_int,
     }
 )
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the webhook."""
 
     name = config.get(CONF_NAME)
@@ -52,30 +68,56 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
 
     _LOGGER.debug("Initializing Air Quality platform: name=%s webhook_id=%s", name, webhook_id)
 
-    factory = GW1000AirQualityEntityFactory(hass, add_entities, webhook_id)
-    #add_entities([GW1000PM25(name, webhook_id)], True)
+    GW1000AirQualityEntityFactory(
+        hass, async_add_entities, name, webhook_id,
+        config.get(CONF_STATION), config[CONF_RETIRE_AFTER]
+    )
 
 class GW1000AirQualityEntityFactory(GW1000EntityFactory):
-    """Air Quality Factory"""
-
-    def __init__(self, hass, add_entities, webhook_id):
-        super().__init__(hass, add_entities, "air_quality", "factory", "air", webhook_id)
-
-    async def _async_handle_data(self, hass, webhook_id, entity_id, results: dict):
-
-
+    """Air Quality Factory, one entity per PM2.5 channel"""
+
+    def __init__(self, hass, add_entities, name, webhook_id, station=None, retire_after=0):
+        super().__init__(hass, add_entities, "air_quality", name, "air", webhook_id, station, retire_after)
+
+    def async_discover(self, reading):
+        values = reading.values
+        for channel, offset in _PM25_OFFSETS:
+            if values[offset] is not None:
+                yield "{}_pm25_ch{}".format(reading.key, channel)
+
+    def async_create(self, unique_id, reading, restored=False):
+        channel = unique_id.rsplit("_pm25_ch", 1)[1]
+        entity = GW1000PM25(
+            self._hass, "{} PM2.5 {}".format(self._name, channel), self._webhook_id,
+            unique_id, reading.key, channel
+        )
+        entity._async_update(reading)
+        return entity
 
 class GW1000PM25(AirQualityEntity):
     """Representation of an air quality sensor."""
 
-    def __init__(self, name, webhook_id):
+    def __init__(self, hass, name, webhook_id, unique_id=None, station=None, channel=None):
         """Initialize the entity."""
         self._name = name
+        self.entity_id = async_generate_entity_id(ENTITY_ID_FORMAT, name, hass=hass)
+        self._unique_id = unique_id
         self._webhook_id = webhook_id
+        self._station = station
+        self._channel = channel
+        self._offsets = tuple(
+            LAYOUT.offset("air", part, channel) for part in ("current", "avg_24h", "battery") + AQI_PARTS
+        )
 
         self._ready = False
-        self._units = "μg/m3"
+        self._units = CONCENTRATION_MICROGRAMS
         self._pm25 = None
+        self._pm25_avg_24h = None
+        self._battery = None
+        self._indexes = (None,) * len(AQI_PARTS)
+        self._restored = None
+        self._stale = False
+        self._unsub_stale = None
 
     @property
     def should_poll(self):
@@ -85,13 +127,18 @@ class GW1000PM25(AirQualityEntity):
     @property
     def available(self):
         """ return if weather data is available. """
-        return self._ready
+        return self._ready and not self._stale
 
     @property
     def name(self):
         """Return the name of the sensor."""
         return self._name
 
+    @property
+    def unique_id(self):
+        """Return the unique id of the sensor."""
+        return self._unique_id
+
     @property
     def unit_of_measurement(self):
         """Return the unit of measurement."""
@@ -102,16 +149,76 @@ class GW1000PM25(AirQualityEntity):
         """Return the particulate matter 2.5 level."""
         return self._pm25
 
+    @property
+    def air_quality_index(self):
+        """Return the US EPA AQI, from the NowCast or else the 24h average."""
+        _, aqi, aqi_24h = self._indexes[:3]
+        return aqi if aqi is not None else aqi_24h
+
+    @property
+    def state_attributes(self):
+        """Return the state attributes."""
+        data = super().state_attributes
+        data["pm25_avg_24h"] = self._pm25_avg_24h
+        data["battery_level"] = self._battery
+        for part, value in zip(AQI_PARTS, self._indexes):
+            if value is not None:
+                data[part] = value
+        if self._restored is not None:
+            data["age"] = round(time() - self._restored)
+        return data
+
     async def async_added_to_hass(self):
         self.hass.components.gw1000.async_register(
-            "air_quality", self._name, self._webhook_id, self.entity_id, self._async_handle_data
+            "air_quality", self._name, self._webhook_id, self.entity_id, self._async_handle_data,
+            station=self._station
         )
 
+        watchdog = self.hass.data.get(DATA_WATCHDOG)
+        if watchdog is not None:
+            self._stale = watchdog.is_stale(self._station)
+            self._unsub_stale = watchdog.async_listen(self._station, self._async_stale_changed)
+
     async def async_will_remove_from_hass(self):
         self.hass.components.gw1000.async_unregister(
-            self._webhook_id, self.entity_id
+            self._webhook_id, self.entity_id, station=self._station
         )
+        if self._unsub_stale is not None:
+            self._unsub_stale()
+            self._unsub_stale = None
+
+    @callback
+    def async_mark_restored(self, timestamp):
+        """ the state is from a snapshot taken at timestamp (unix time) """
+        if self._ready:
+            self._restored = timestamp
+
+    @callback
+    def _async_stale_changed(self, stale):
+        """ the station stopped pushing, or pushed again """
+        self._stale = stale
+        async_publish(self.hass, self)
+
+    @callback
+    def _async_handle_data(self, hass, webhook_id, entity_id, results: dict):
+        if self._async_update(results):
+            async_publish(self.hass, self)
+
+    @callback
+    def _async_update(self, reading):
+        """ take this channel's values from a push, True if they changed """
+
+        values = reading.values
+        current = tuple(values[offset] for offset in self._offsets)
+        if current[0] is None:
+            return False
+
+        last = (self._pm25, self._pm25_avg_24h, self._battery) + self._indexes
+        if self._ready and self._restored is None and current == last:
+            return False
 
-    async def _async_handle_data(self, hass, webhook_id, entity_id, results: dict):
         self._ready = True
-
+        self._restored = None
+        self._pm25, self._pm25_avg_24h, self._battery = current[:3]
+        self._indexes = current[3:]
+        return True
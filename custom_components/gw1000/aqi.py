@@ -0,0 +1,272 @@
+""" Air quality indexes from PM2.5 """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+from array import array
+from bisect import bisect_left
+from math import floor
+from time import time
+
+from .dedupe import parse_dateutc
+
+from .payload import field_units
+
+from .reading import LAYOUT
+
+# US EPA PM2.5 breakpoints (2024 revision), µg/m³ truncated to 0.1:
+# concentration low, high, index low, high
+EPA_PM25 = (
+    (0.0, 9.0, 0, 50),
+    (9.1, 35.4, 51, 100),
+    (35.5, 55.4, 101, 150),
+    (55.5, 125.4, 151, 200),
+    (125.5, 225.4, 201, 300),
+    (225.5, 325.4, 301, 500),
+)
+
+# CITEAIR common air quality index (CAQI) PM2.5 grids, hourly and daily
+CAQI_PM25_HOURLY = (
+    (0, 15, 0, 25),
+    (15, 30, 25, 50),
+    (30, 55, 50, 75),
+    (55, 110, 75, 100),
+)
+CAQI_PM25_DAILY = (
+    (0, 10, 0, 25),
+    (10, 20, 25, 50),
+    (20, 30, 50, 75),
+    (30, 60, 75, 100),
+)
+
+NOWCAST_HOURS = 12
+NOWCAST_MIN_WEIGHT = 0.5
+
+class Breakpoints(object):
+
+    """ Piecewise linear index over concentration breakpoints
+
+    The upper bounds are kept in one sorted array for bisect, with the
+    offset and slope of every segment precomputed next to them. Values
+    above the last segment are capped when cap is set (EPA) and follow
+    its slope otherwise (CAQI reports beyond 100). With scale set,
+    concentrations are truncated to 1 / scale first, as EPA does.
+    """
+
+    __slots__ = ("_highs", "_segments", "_cap", "_scale")
+
+    def __init__(self, table, cap=False, scale=None):
+        self._highs = array("d", (high for _, high, _, _ in table))
+        self._segments = tuple(
+            (low, index_low, (index_high - index_low) / (high - low))
+            for low, high, index_low, index_high in table
+        )
+        self._cap = table[-1][3] if cap else None
+        self._scale = scale
+
+    def index(self, concentration):
+        """ index of a concentration, None for None """
+
+        if concentration is None:
+            return None
+        if concentration < 0:
+            concentration = 0.0
+        if self._scale is not None:
+            concentration = floor(concentration * self._scale) / self._scale
+        i = bisect_left(self._highs, concentration)
+        if i == len(self._highs):
+            if self._cap is not None:
+                return self._cap
+            i -= 1
+        low, index_low, slope = self._segments[i]
+        return int(round(index_low + slope * (concentration - low)))
+
+EPA_INDEX = Breakpoints(EPA_PM25, cap=True, scale=10)
+CAQI_HOURLY_INDEX = Breakpoints(CAQI_PM25_HOURLY)
+CAQI_DAILY_INDEX = Breakpoints(CAQI_PM25_DAILY)
+
+class NowCast(object):
+
+    """ EPA NowCast of one channel over a ring of hourly sums
+
+    Every push only adds to the sum of its hour. The NowCast weighs the
+    hourly means of the last 12 hours by w ** hours ago, w being
+    1 - range / max clamped to 0.5, and needs 2 of the 3 most recent
+    hours. The means of the past hours, their range and their weighted
+    sum are kept until the hour turns (or a late sample lands in one of
+    them), so a push within the hour only folds in the current mean.
+    """
+
+    __slots__ = ("_hour", "_sums", "_counts", "_past", "_recent", "_low", "_high", "_weighted")
+
+    def __init__(self, hours=NOWCAST_HOURS):
+        self._hour = None
+        self._sums = array("d", [0.0]) * hours
+        self._counts = array("l", [0]) * hours
+        self._past = None
+
+    def add(self, timestamp, value):
+        """ add a sample, returns False if it is older than the ring """
+
+        hour = int(timestamp // 3600)
+        size = len(self._sums)
+        if self._hour is None:
+            self._hour = hour
+        elif hour > self._hour:
+            for passed in range(self._hour + 1, min(hour, self._hour + size) + 1):
+                self._sums[passed % size] = 0.0
+                self._counts[passed % size] = 0
+            self._hour = hour
+            self._past = None
+        elif hour <= self._hour - size:
+            return False
+        elif hour < self._hour:
+            self._past = None
+        self._sums[hour % size] += value
+        self._counts[hour % size] += 1
+        return True
+
+    def hourly(self, ago=0):
+        """ mean of the hour ago hours before the newest, None if empty """
+
+        if self._hour is None or ago >= len(self._sums):
+            return None
+        slot = (self._hour - ago) % len(self._sums)
+        count = self._counts[slot]
+        return self._sums[slot] / count if count else None
+
+    def _settle_past(self):
+        past = self._past = []
+        for ago in range(1, len(self._sums)):
+            mean = self.hourly(ago)
+            if mean is not None:
+                past.append((ago, mean))
+        self._recent = sum(1 for ago, _ in past if ago < 3)
+        self._low = min((mean for _, mean in past), default=None)
+        self._high = max((mean for _, mean in past), default=None)
+        self._weighted = (None, 0.0, 0.0)
+
+    def value(self):
+        """ NowCast concentration, None without enough recent hours """
+
+        if self._hour is None:
+            return None
+        if self._past is None:
+            self._settle_past()
+
+        current = self.hourly()
+        if (current is not None) + self._recent < 2:
+            return None
+
+        low, high = self._low, self._high
+        if current is not None:
+            low = current if low is None or current < low else low
+            high = current if high is None or current > high else high
+        weight = 1.0 - (high - low) / high if high > 0 else 1.0
+        if weight < NOWCAST_MIN_WEIGHT:
+            weight = NOWCAST_MIN_WEIGHT
+
+        if self._weighted[0] != weight:
+            self._weighted = (
+                weight,
+                sum(weight ** ago * mean for ago, mean in self._past),
+                sum(weight ** ago for ago, _ in self._past),
+            )
+        _, total, norm = self._weighted
+        if current is not None:
+            total += current
+            norm += 1.0
+        return floor(total / norm * 10) / 10
+
+# Outputs per PM2.5 channel, next to the channel's current and 24h values
+AQI_PARTS = ("nowcast", "aqi", "aqi_24h", "caqi", "caqi_24h")
+
+def _register():
+    """ (channel, current, avg_24h, outputs...) offsets per PM2.5 channel """
+
+    channels = [channel for channel, _ in LAYOUT.channel_offsets("air", "current")]
+    for part in AQI_PARTS:
+        LAYOUT.add("air", part, field_units("air", part), channels)
+    return tuple(
+        (channel,) + tuple(
+            LAYOUT.offset("air", part, channel) for part in ("current", "avg_24h") + AQI_PARTS
+        )
+        for channel in channels
+    )
+
+_CHANNELS = _register()
+
+class _Channel(object):
+
+    """ NowCast and last inputs/indexes of one station's PM2.5 channel """
+
+    __slots__ = ("nowcast", "hourly", "caqi", "concentration", "aqi", "avg_24h", "daily")
+
+    def __init__(self):
+        self.nowcast = NowCast()
+        self.hourly = self.caqi = None
+        self.concentration = self.aqi = None
+        self.avg_24h = None
+        self.daily = (None, None)
+
+class AirQualityIndexes(object):
+
+    """ EPA and CAQI indexes of every PM2.5 channel, per station
+
+    One pass per push over the channels present: the current value is
+    added to the channel's NowCast, then the EPA index is taken from the
+    NowCast and from the station's 24h average, the CAQI from the hourly
+    mean and the 24h average. Like the derived values, an index is only
+    looked up again when its input changed since the channel's last push.
+    """
+
+    def __init__(self):
+        self._stations = {}
+
+    def update(self, reading):
+        """ add the indexes of a push's PM2.5 channels to the reading """
+
+        channels = reading.groups.get("air")
+        if not channels:
+            return
+
+        states = self._stations.get(reading.key)
+        if states is None:
+            states = self._stations[reading.key] = {}
+
+        timestamp = parse_dateutc(reading.dateutc)
+        if timestamp is None:
+            timestamp = time()
+
+        values = reading.values
+        for channel, current, avg_24h, nowcast, aqi, aqi_24h, caqi, caqi_24h in _CHANNELS:
+            if channel not in channels:
+                continue
+            state = states.get(channel)
+            value = values[current]
+            if value is not None:
+                if state is None:
+                    state = states[channel] = _Channel()
+                state.nowcast.add(timestamp, value)
+            if state is None:
+                continue
+
+            concentration = state.nowcast.value()
+            if concentration != state.concentration:
+                state.concentration = concentration
+                state.aqi = EPA_INDEX.index(concentration)
+            hourly = state.nowcast.hourly()
+            if hourly != state.hourly:
+                state.hourly = hourly
+                state.caqi = CAQI_HOURLY_INDEX.index(hourly)
+            average = values[avg_24h]
+            if average != state.avg_24h:
+                state.avg_24h = average
+                state.daily = (EPA_INDEX.index(average), CAQI_DAILY_INDEX.index(average))
+
+            values[nowcast] = concentration
+            values[aqi] = state.aqi
+            values[caqi] = state.caqi
+            values[aqi_24h], values[caqi_24h] = state.daily
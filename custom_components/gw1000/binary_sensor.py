@@ -4,3 +4,342 @@ import logging
 
 _LOGGER = logging.getLogger(__name__)
 _LOGGER.debug("Loading...")
+
+from time import time
+
+import voluptuous as vol
+
+import homeassistant.helpers.config_validation as cv
+
+from homeassistant.components.binary_sensor import ENTITY_ID_FORMAT, PLATFORM_SCHEMA, BinarySensorEntity
+
+from homeassistant.const import (
+    CONF_WEBHOOK_ID,
+    CONF_ENTITY_NAMESPACE,
+    CONF_MONITORED_CONDITIONS,
+)
+from homeassistant.core import callback
+
+from homeassistant.helpers.entity import async_generate_entity_id
+
+from . import (
+    GW1000EntityFactory
+)
+
+from .const import (
+    DOMAIN,
+    DEFAULT_ENTITY_NAMESPACE,
+    CONF_STATION,
+    CONF_RETIRE_AFTER,
+    CONF_LIGHTNING_WINDOW,
+    DATA_WATCHDOG,
+    EVENT_LIGHTNING,
+)
+
+from .dedupe import (
+    parse_dateutc
+)
+
+from .reading import (
+    LAYOUT
+)
+
+from .publish import (
+    async_publish,
+)
+
+DEPENDENCIES = ['gw1000']
+
+DEFAULT_RETIRE_AFTER = 86400
+
+# Strikes within this many seconds of a push keep the lightning sensor on
+DEFAULT_LIGHTNING_WINDOW = 1800
+
+# 0-5 battery levels are pushed as percentages, 1 and below is low
+LOW_BATTERY_LEVEL = 20
+# WH51 soil sensors push their battery voltage
+LOW_BATTERY_VOLTAGE = 1.2
+
+def _flag(value, now, window):
+    return bool(value)
+
+def _low_level(value, now, window):
+    return value <= LOW_BATTERY_LEVEL
+
+def _low_voltage(value, now, window):
+    return value < LOW_BATTERY_VOLTAGE
+
+def _recent_strike(value, now, window):
+    return now - value <= window
+
+# Binary sensor types: Name, class, icon, key, part, test
+BINARY_SENSOR_TYPES = {
+    "wh65_battery": ("WH65 Battery", "battery", None, "outdoor", "lowbatt", _flag),
+    "lightning_battery": ("Lightning Battery", "battery", None, "lightning", "battery", _low_level),
+    "co2_battery": ("CO2 Battery", "battery", None, "co2", "battery", _low_level),
+    "lightning": ("Lightning", None, "flash", "lightning", "time", _recent_strike),
+}
+
+# Channel binary sensor types: Name, class, icon, key, part, test
+# one sensor per channel present in results[key]
+CHANNEL_BINARY_SENSOR_TYPES = {
+    "battery_ch": ("Battery {}", "battery", None, "temperature", "lowbatt", _flag),
+    "pm25_battery_ch": ("PM2.5 Battery {}", "battery", None, "air", "battery", _low_level),
+    "soil_battery_ch": ("Soil Battery {}", "battery", None, "soil", "voltage", _low_voltage),
+    "leak_battery_ch": ("Leak Battery {}", "battery", None, "leak", "battery", _low_level),
+    "leak_ch": ("Leak {}", "moisture", None, "leak", "leak", _flag),
+}
+
+ALL_BINARY_SENSOR_TYPES = dict(BINARY_SENSOR_TYPES, **CHANNEL_BINARY_SENSOR_TYPES)
+
+_LIGHTNING_COUNT = LAYOUT.offset("lightning", "count")
+_LIGHTNING_OFFSETS = tuple(LAYOUT.offset("lightning", part) for part in ("distance", "time"))
+
+PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
+    {
+        vol.Optional(
+            CONF_ENTITY_NAMESPACE, default=DEFAULT_ENTITY_NAMESPACE
+        ): cv.string,
+        vol.Optional(CONF_WEBHOOK_ID): cv.string,
+        vol.Optional(CONF_STATION): cv.string,
+        vol.Optional(CONF_MONITORED_CONDITIONS): vol.All(
+            cv.ensure_list, [vol.In(ALL_BINARY_SENSOR_TYPES)]
+        ),
+        vol.Optional(CONF_RETIRE_AFTER, default=DEFAULT_RETIRE_AFTER): cv.positive_int,
+        vol.Optional(CONF_LIGHTNING_WINDOW, default=DEFAULT_LIGHTNING_WINDOW): cv.positive_int,
+    }
+)
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up the binary sensors."""
+
+    namespace = config.get(CONF_ENTITY_NAMESPACE)
+    webhook_id = config.get(CONF_WEBHOOK_ID, namespace)
+
+    _LOGGER.debug("Initializing Binary Sensor platform: namespace=%s webhook_id=%s", namespace, webhook_id)
+
+    GW1000BinarySensorFactory(
+        hass, async_add_entities, namespace, webhook_id, config.get(CONF_STATION),
+        config.get(CONF_MONITORED_CONDITIONS, list(ALL_BINARY_SENSOR_TYPES)),
+        config[CONF_RETIRE_AFTER], config[CONF_LIGHTNING_WINDOW],
+    )
+
+class GW1000BinarySensorFactory(GW1000EntityFactory):
+    """Create binary sensors for the flags a station pushes
+
+    The factory is the only handler registered for its webhook: each push
+    is tested against the bound offsets, and an entity is only told (and
+    written) when its state flips. Discovery only names the flags, so
+    restoring from the snapshot does not set any state. New lightning
+    strikes, the rise of the station's strike count, are fired as
+    gw1000_lightning events.
+    """
+
+    def __init__(self, hass, add_entities, namespace, webhook_id, station, sensor_types, retire_after, lightning_window=DEFAULT_LIGHTNING_WINDOW):
+        self._namespace = namespace
+        self._lightning_window = lightning_window
+        self._types = [
+            (sensor_type, LAYOUT.offset(*BINARY_SENSOR_TYPES[sensor_type][3:5]), BINARY_SENSOR_TYPES[sensor_type][5])
+            for sensor_type in sensor_types if sensor_type in BINARY_SENSOR_TYPES
+        ]
+        self._channel_types = [
+            (
+                sensor_type,
+                LAYOUT.channel_offsets(*CHANNEL_BINARY_SENSOR_TYPES[sensor_type][3:5]),
+                CHANNEL_BINARY_SENSOR_TYPES[sensor_type][5],
+            )
+            for sensor_type in sensor_types if sensor_type in CHANNEL_BINARY_SENSOR_TYPES
+        ]
+        self._ids = {}
+        self._sensors = {}
+        self._strikes = {}
+        super().__init__(hass, add_entities, "binary_sensor", namespace, None, webhook_id, station, retire_after)
+
+    def _unique_id(self, ids, station, sensor_type, channel):
+        unique_id = ids.get((sensor_type, channel))
+        if unique_id is None:
+            unique_id = ids[(sensor_type, channel)] = "{}_{}{}".format(station, sensor_type, channel or "")
+            self._sensors[unique_id] = (sensor_type, channel)
+        return unique_id
+
+    def _async_flags(self, reading):
+        """ (unique id, state) of the flags present in a push """
+
+        station = reading.key
+        ids = self._ids.get(station)
+        if ids is None:
+            ids = self._ids[station] = {}
+        values = reading.values
+        now = parse_dateutc(reading.dateutc) or time()
+        window = self._lightning_window
+
+        for sensor_type, offset, test in self._types:
+            value = values[offset]
+            if value is None:
+                continue
+            yield self._unique_id(ids, station, sensor_type, None), test(value, now, window)
+
+        for sensor_type, channels, test in self._channel_types:
+            for channel, offset in channels:
+                value = values[offset]
+                if value is None:
+                    continue
+                yield self._unique_id(ids, station, sensor_type, channel), test(value, now, window)
+
+    def async_discover(self, reading):
+        """ unique ids of the flags present """
+        return (unique_id for unique_id, _ in self._async_flags(reading))
+
+    @callback
+    def _async_handle_data(self, hass, webhook_id, entity_id, results: dict):
+        super()._async_handle_data(hass, webhook_id, entity_id, results)
+
+        # new entities were primed by async_create, the known ones are told
+        entities = self.entities
+        for unique_id, state in self._async_flags(results):
+            entity = entities.get(unique_id)
+            if entity is not None:
+                entity.async_set(state)
+        self._async_strikes(results)
+
+    @callback
+    def _async_strikes(self, reading):
+        """ fire an event for the strikes counted since the last push """
+
+        count = reading.values[_LIGHTNING_COUNT]
+        if count is None:
+            return
+        station = reading.key
+        last = self._strikes.get(station)
+        self._strikes[station] = count
+        # the first push only sets the baseline, a drop is the daily reset
+        if last is None or count == last:
+            return
+        strikes = count - last if count > last else count
+        if not strikes:
+            return
+
+        distance, strike_time = (reading.values[offset] for offset in _LIGHTNING_OFFSETS)
+        self._hass.bus.async_fire(EVENT_LIGHTNING, {
+            "station": station,
+            "webhook_id": self._webhook_id,
+            "strikes": strikes,
+            "count": count,
+            "distance": distance,
+            "time": strike_time,
+        })
+
+    def async_create(self, unique_id, reading, restored=False):
+        sensor_type, channel = self._sensors[unique_id]
+        sensor = ALL_BINARY_SENSOR_TYPES[sensor_type]
+        offset = LAYOUT.offset(sensor[3], sensor[4], channel)
+        entity = GW1000BinarySensor(
+            self._hass, self._namespace, sensor_type, reading.key, channel, unique_id
+        )
+        now = parse_dateutc(reading.dateutc) or time()
+        entity.async_set(sensor[5](reading.values[offset], now, self._lightning_window))
+        return entity
+
+class GW1000BinarySensor(BinarySensorEntity):
+    """ GW1000 Binary Sensor, set by its factory """
+
+    def __init__(self, hass, namespace, sensor_type, station=None, channel=None, unique_id=None):
+        """ Initialize Binary Sensor """
+
+        sensor = ALL_BINARY_SENSOR_TYPES[sensor_type]
+        self._sensor_type = sensor_type
+        self._channel = channel
+        self._name = sensor[0].format(channel)
+        self.entity_id = async_generate_entity_id(ENTITY_ID_FORMAT, '{} {}'.format(namespace, self._name), hass=hass)
+        self._unique_id = unique_id
+        self._device_class = sensor[1]
+        self._icon = "mdi:{}".format(sensor[2]) if sensor[2] else None
+        self._station = station
+        self._ready = False
+        self._state = None
+        self._restored = None
+        self._stale = False
+        self._unsub_stale = None
+        self.transitions = 0
+
+    async def async_added_to_hass(self):
+        watchdog = self.hass.data.get(DATA_WATCHDOG)
+        if watchdog is not None:
+            self._stale = watchdog.is_stale(self._station)
+            self._unsub_stale = watchdog.async_listen(self._station, self._async_stale_changed)
+
+    async def async_will_remove_from_hass(self):
+        if self._unsub_stale is not None:
+            self._unsub_stale()
+            self._unsub_stale = None
+
+    @callback
+    def async_mark_restored(self, timestamp):
+        """ the state is from a snapshot taken at timestamp (unix time) """
+        if self._ready:
+            self._restored = timestamp
+
+    @callback
+    def _async_stale_changed(self, stale):
+        """ the station stopped pushing, or pushed again """
+        self._stale = stale
+        async_publish(self.hass, self)
+
+    @callback
+    def async_set(self, state):
+        """ take a pushed state, written only when it flips (or replaces a
+        restored one) """
+
+        if self._ready and self._restored is None and state == self._state:
+            return False
+
+        if self._ready and state != self._state:
+            self.transitions += 1
+        self._ready = True
+        self._restored = None
+        self._state = state
+        if self.hass is not None:
+            async_publish(self.hass, self)
+        return True
+
+    @property
+    def unique_id(self):
+        """Return the unique id of discovered sensors."""
+        return self._unique_id
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def should_poll(self):
+        """ this is event driven so polling is unecessary """
+        return False
+
+    @property
+    def available(self):
+        """ return if sensor data is available. """
+        return self._ready and not self._stale
+
+    @property
+    def is_on(self):
+        """Return true if the flag is set."""
+        return self._state
+
+    @property
+    def device_class(self):
+        """Return the device class."""
+        return self._device_class
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend, if any."""
+        return self._icon
+
+    @property
+    def device_state_attributes(self):
+        """Return the age of a restored state."""
+        if self._restored is not None:
+            return {"age": round(time() - self._restored)}
+        return None
@@ -0,0 +1,269 @@
+""" Local weather condition and Zambretti forecast """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from math import asin, atan2, cos, exp, floor, radians, sin
+
+from homeassistant.const import (
+    PRESSURE_HPA,
+    PRESSURE_INHG,
+)
+
+from .conversions import conversion
+
+from .reading import LAYOUT
+
+_TO_HPA = conversion(PRESSURE_INHG, PRESSURE_HPA)
+
+# Condition inputs: group, part, in the pushed (imperial) units
+CONDITION_FIELDS = (
+    ("rain", "rate"),
+    ("wind", "speed"),
+    ("wind", "gust"),
+    ("wind", "bearing"),
+    ("solar", "radiation"),
+    ("pressure", "relative"),
+)
+
+_OFFSETS = tuple(LAYOUT.offset(group, part) for group, part in CONDITION_FIELDS)
+
+# Rain rate, in/hr
+POURING_RATE = 0.3
+# Beaufort 6 (strong breeze), mph
+WINDY_SPEED = 25
+WINDY_GUST = 40
+# Below this clear-sky irradiance (W/m²) it is night for the condition
+NIGHT_IRRADIANCE = 50
+# Measured / clear-sky irradiance
+SUNNY_CLEARNESS = 0.7
+PARTLY_CLOUDY_CLEARNESS = 0.35
+# Time constant of the smoothed clearness, seconds
+CLEARNESS_SMOOTHING = 600
+
+# Pressure tendency, hPa per 3h
+TREND_SPAN = 10800
+TREND_STEP = 600
+TREND_THRESHOLD = 1.6
+# A night with pressure falling this fast is taken as cloudy
+CLOUDY_NIGHT_TREND = -3.0
+
+# Zambretti lookup: sea level pressure range, hPa
+ZAMBRETTI_BOTTOM = 950
+ZAMBRETTI_TOP = 1050
+ZAMBRETTI_STEPS = 22
+
+ZAMBRETTI_FORECASTS = (
+    "Settled fine", "Fine weather", "Becoming fine", "Fine, becoming less settled",
+    "Fine, possible showers", "Fairly fine, improving", "Fairly fine, possible showers early",
+    "Fairly fine, showery later", "Showery early, improving", "Changeable, mending",
+    "Fairly fine, showers likely", "Rather unsettled clearing later", "Unsettled, probably improving",
+    "Showery, bright intervals", "Showery, becoming less settled", "Changeable, some rain",
+    "Unsettled, short fine intervals", "Unsettled, rain later", "Unsettled, some rain",
+    "Mostly very unsettled", "Occasional rain, worsening", "Rain at times, very unsettled",
+    "Rain at frequent intervals", "Rain, very unsettled", "Stormy, may improve", "Stormy, much rain",
+)
+
+# Forecast per pressure step, highest pressure last, by trend
+ZAMBRETTI_RISING = (25, 25, 25, 24, 24, 19, 16, 12, 11, 9, 8, 6, 5, 2, 1, 1, 0, 0, 0, 0, 0, 0)
+ZAMBRETTI_STEADY = (25, 25, 25, 25, 25, 25, 23, 23, 22, 18, 15, 13, 10, 4, 1, 1, 0, 0, 0, 0, 0, 0)
+ZAMBRETTI_FALLING = (25, 25, 25, 25, 25, 25, 25, 25, 23, 23, 21, 20, 17, 14, 7, 3, 1, 1, 1, 0, 0, 0)
+
+# Northern hemisphere wind adjustment per 16 point compass (N first), % of range
+ZAMBRETTI_WIND = (6, 5, 5, 2, -0.5, -2, -5, -8.5, -12, -10, -6, -4.5, -3, -0.5, 1.5, 3)
+ZAMBRETTI_SEASON = 7
+
+# Condition of each Zambretti forecast
+ZAMBRETTI_CONDITIONS = (
+    ("sunny",) * 3 + ("partlycloudy",) * 7 + ("rainy",) * 10 + ("pouring",) * 4 + ("lightning-rainy",) * 2
+)
+
+FORECAST_HOURS = 12
+
+def solar_elevation(latitude, longitude, timestamp):
+    """ sun elevation in degrees, to within a fraction of a degree """
+
+    days = timestamp / 86400.0 - 10957.5
+    anomaly = radians((357.529 + 0.98560028 * days) % 360)
+    mean = (280.459 + 0.98564736 * days) % 360
+    ecliptic = radians((mean + 1.915 * sin(anomaly) + 0.020 * sin(2 * anomaly)) % 360)
+    obliquity = radians(23.439 - 0.00000036 * days)
+    ascension = atan2(cos(obliquity) * sin(ecliptic), cos(ecliptic))
+    declination = asin(sin(obliquity) * sin(ecliptic))
+    sidereal = (18.697374558 + 24.06570982441908 * days) % 24
+    hour_angle = radians(sidereal * 15 + longitude) - ascension
+    latitude = radians(latitude)
+    return asin(
+        sin(latitude) * sin(declination) + cos(latitude) * cos(declination) * cos(hour_angle)
+    ) * 57.29577951308232
+
+def clear_sky_irradiance(elevation):
+    """ Haurwitz clear-sky global horizontal irradiance, W/m² """
+    if elevation <= 0:
+        return 0.0
+    zenith = sin(radians(elevation))
+    return 1098 * zenith * exp(-0.057 / zenith)
+
+def zambretti(pressure, trend, bearing=None, month=None, northern=True):
+    """ Zambretti forecast index for sea level pressure (hPa), its 3h
+    trend, wind bearing and month """
+
+    span = ZAMBRETTI_TOP - ZAMBRETTI_BOTTOM
+    if trend > TREND_THRESHOLD:
+        options = ZAMBRETTI_RISING
+    elif trend < -TREND_THRESHOLD:
+        options = ZAMBRETTI_FALLING
+    else:
+        options = ZAMBRETTI_STEADY
+
+    if bearing is not None and bearing == bearing:
+        if not northern:
+            bearing = 180 - bearing
+        pressure += ZAMBRETTI_WIND[int((bearing % 360) / 22.5 + 0.5) % 16] / 100 * span
+    if month is not None:
+        summer = 4 <= month <= 9 if northern else not 4 <= month <= 9
+        if summer and options is ZAMBRETTI_RISING:
+            pressure += ZAMBRETTI_SEASON / 100 * span
+        elif summer and options is ZAMBRETTI_FALLING:
+            pressure -= ZAMBRETTI_SEASON / 100 * span
+
+    step = floor((pressure - ZAMBRETTI_BOTTOM) * ZAMBRETTI_STEPS / span)
+    return options[min(max(step, 0), ZAMBRETTI_STEPS - 1)]
+
+class PressureTrend(object):
+
+    """ Pressure change over the last 3 hours
+
+    One sample is kept per step (10 minutes), in a deque that only holds
+    the span, so a push costs O(1). Until a full span was seen the change
+    is scaled from at least one hour of samples.
+    """
+
+    __slots__ = ("_samples",)
+
+    def __init__(self):
+        self._samples = deque(maxlen=TREND_SPAN // TREND_STEP + 2)
+
+    def add(self, timestamp, pressure):
+        samples = self._samples
+        if not samples or timestamp - samples[-1][0] >= TREND_STEP:
+            samples.append((timestamp, pressure))
+        while len(samples) > 1 and samples[1][0] <= timestamp - TREND_SPAN:
+            samples.popleft()
+
+    def change(self, timestamp, pressure):
+        """ change per span, None without an hour of samples """
+        if not self._samples:
+            return None
+        start, oldest = self._samples[0]
+        elapsed = timestamp - start
+        if elapsed < TREND_SPAN / 3:
+            return None
+        return (pressure - oldest) * TREND_SPAN / elapsed
+
+class LocalConditions(object):
+
+    """ Current condition and a Zambretti forecast from one station's pushes
+
+    Rain comes first (pouring above 0.3 in/hr), then strong wind, then
+    the sky: by day from the measured solar radiation against the
+    clear-sky irradiance of the location and time (smoothed over ten
+    minutes so a passing cloud does not flip it), by night from the
+    pressure tendency. The forecast is the classic Zambretti lookup of
+    sea level pressure, its 3h trend, wind bearing and season.
+    """
+
+    def __init__(self, latitude, longitude):
+        self._latitude = latitude
+        self._longitude = longitude
+        self._trend = PressureTrend()
+        self._clearness = None
+        self._last = None
+        self.condition = None
+        self.clearness = None
+        self.pressure_trend = None
+        self.zambretti = None
+        self.forecast = None
+
+    def update(self, timestamp, reading):
+        """ fold in a push, True if the condition or forecast changed """
+
+        values = reading.values
+        rain, speed, gust, bearing, radiation, pressure = (values[offset] for offset in _OFFSETS)
+
+        if pressure is not None:
+            pressure = _TO_HPA(pressure)
+            self._trend.add(timestamp, pressure)
+            self.pressure_trend = self._trend.change(timestamp, pressure)
+
+        # without a location the sky is unknown
+        night = None
+        if self._latitude is not None and self._longitude is not None:
+            clear = clear_sky_irradiance(solar_elevation(self._latitude, self._longitude, timestamp))
+            night = clear < NIGHT_IRRADIANCE
+            if not night and radiation is not None:
+                clearness = min(radiation / clear, 1.5)
+                if self._clearness is None or self._last is None or timestamp <= self._last:
+                    self._clearness = clearness
+                else:
+                    weight = 1 - exp(-(timestamp - self._last) / CLEARNESS_SMOOTHING)
+                    self._clearness += weight * (clearness - self._clearness)
+                self._last = timestamp
+            else:
+                self._clearness = self._last = None
+        self.clearness = None if self._clearness is None else round(self._clearness, 2)
+
+        trend = self.pressure_trend
+        if rain is not None and rain >= POURING_RATE:
+            condition = "pouring"
+        elif rain:
+            condition = "rainy"
+        elif (speed is not None and speed >= WINDY_SPEED) or (gust is not None and gust >= WINDY_GUST):
+            condition = "windy"
+        elif not night and self._clearness is not None:
+            if self._clearness >= SUNNY_CLEARNESS:
+                condition = "sunny"
+            elif self._clearness >= PARTLY_CLOUDY_CLEARNESS:
+                condition = "partlycloudy"
+            else:
+                condition = "cloudy"
+        elif night:
+            condition = "cloudy" if trend is not None and trend <= CLOUDY_NIGHT_TREND else "clear-night"
+        else:
+            condition = None
+
+        forecast = None
+        if pressure is not None:
+            month = datetime.fromtimestamp(timestamp, timezone.utc).month
+            forecast = zambretti(
+                pressure, trend or 0.0, bearing, month,
+                self._latitude is None or self._latitude >= 0,
+            )
+
+        if condition == self.condition and forecast == self.zambretti:
+            return False
+
+        # the forecast covers the next hours from when it last changed
+        self.condition = condition
+        self.zambretti = forecast
+        self.forecast = None if forecast is None else [{
+            "datetime": (
+                datetime.fromtimestamp(timestamp, timezone.utc) + timedelta(hours=FORECAST_HOURS)
+            ).isoformat(),
+            "condition": ZAMBRETTI_CONDITIONS[forecast],
+            "detailed_description": ZAMBRETTI_FORECASTS[forecast],
+        }]
+        return True
+
+    @property
+    def attributes(self):
+        """ the inputs behind the condition and forecast """
+        return {
+            "clearness": self.clearness,
+            "pressure_trend": None if self.pressure_trend is None else round(self.pressure_trend, 1),
+            "zambretti": None if self.zambretti is None else ZAMBRETTI_FORECASTS[self.zambretti],
+        }
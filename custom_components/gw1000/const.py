@@ -10,8 +10,85 @@ DOMAIN = "gw1000"
 DEFAULT_ENTITY_NAMESPACE = "gw1000"
 
 LENGTH_MILLIMETERS = "mm"
+LENGTH_CENTIMETERS = "cm"
 LIGHT_WATTS = "W/m^2"
 LIGHT_LUX = "lux"
 
 SPEED_MILES = "mph"
-SPEED_KILOMETERS = "kph"
\ No newline at end of file
+SPEED_KILOMETERS = "kph"
+SPEED_METERS = "m/s"
+
+TEMP_KELVIN = "K"
+
+PRESSURE_PA = "Pa"
+PRESSURE_KPA = "kPa"
+PRESSURE_MBAR = "mbar"
+
+CONCENTRATION_MICROGRAMS = "μg/m3"
+CONCENTRATION_PPM = "ppm"
+DENSITY_GRAMS = "g/m³"
+
+CONF_DEADBAND = "deadband"
+CONF_ABSOLUTE = "absolute"
+CONF_RELATIVE = "relative"
+CONF_MIN_INTERVAL = "min_interval"
+CONF_HEARTBEAT = "heartbeat"
+CONF_STATION = "station"
+CONF_DISCOVERY = "discovery"
+CONF_RETIRE_AFTER = "retire_after"
+CONF_DOWNSAMPLE = "downsample"
+CONF_LIGHTNING_WINDOW = "lightning_window"
+CONF_LOCAL_CONDITIONS = "local_conditions"
+
+CONF_DEDUPLICATE = "deduplicate"
+CONF_MAX_STATIONS = "max_stations"
+CONF_HISTORY_SIZE = "history_size"
+CONF_DERIVED = "derived"
+CONF_AIR_QUALITY_INDEX = "air_quality_index"
+CONF_PUBLISH_INTERVAL = "publish_interval"
+CONF_PUBLISH_MAX_WRITES = "publish_max_writes"
+CONF_METRICS = "metrics"
+CONF_FILENAME = "filename"
+CONF_GATEWAYS = "gateways"
+CONF_QUEUE_SIZE = "queue_size"
+CONF_QUEUE_POLICY = "queue_policy"
+CONF_RECORD = "record"
+CONF_MAX_SIZE = "max_size"
+CONF_BACKUPS = "backups"
+CONF_EXPORT = "export"
+CONF_INFLUXDB = "influxdb"
+CONF_MQTT = "mqtt"
+CONF_DATABASE = "database"
+CONF_MEASUREMENT = "measurement"
+CONF_TOPIC = "topic"
+CONF_QOS = "qos"
+CONF_BATCH_SIZE = "batch_size"
+CONF_FLUSH_INTERVAL = "flush_interval"
+CONF_SPOOL_SIZE = "spool_size"
+CONF_SNAPSHOT = "snapshot"
+CONF_SAVE_INTERVAL = "save_interval"
+CONF_STALE_AFTER = "stale_after"
+CONF_PUSHES = "pushes"
+CONF_SECONDS = "seconds"
+CONF_FORMAT = "format"
+CONF_TRACEMALLOC = "tracemalloc"
+
+DATA_DUPLICATES = DOMAIN + "_duplicates"
+DATA_HISTORY = DOMAIN + "_history"
+DATA_DERIVED = DOMAIN + "_derived"
+DATA_AQI = DOMAIN + "_aqi"
+DATA_SCHEDULER = DOMAIN + "_scheduler"
+DATA_METRICS = DOMAIN + "_metrics"
+DATA_GATEWAYS = DOMAIN + "_gateways"
+DATA_QUEUE = DOMAIN + "_queue"
+DATA_RECORDER = DOMAIN + "_recorder"
+DATA_EXPORTERS = DOMAIN + "_exporters"
+DATA_SNAPSHOT = DOMAIN + "_snapshot"
+DATA_WATCHDOG = DOMAIN + "_watchdog"
+DATA_PROFILER = DOMAIN + "_profiler"
+
+SERVICE_DUMP_METRICS = "dump_metrics"
+SERVICE_START_PROFILE = "start_profile"
+SERVICE_STOP_PROFILE = "stop_profile"
+
+EVENT_LIGHTNING = DOMAIN + "_lightning"
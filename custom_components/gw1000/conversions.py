@@ -5,6 +5,8 @@ import logging
 _LOGGER = logging.getLogger(__name__)
 _LOGGER.debug("Loading...")
 
+from collections import deque
+
 from homeassistant.const import (
     PRESSURE_HPA,
     PRESSURE_INHG,
@@ -15,26 +17,93 @@ from homeassistant.const import (
 
 from .const import (
     LENGTH_MILLIMETERS,
+    LENGTH_CENTIMETERS,
     LIGHT_WATTS,
     LIGHT_LUX,
     SPEED_MILES,
     SPEED_KILOMETERS,
+    SPEED_METERS,
+    TEMP_KELVIN,
+    PRESSURE_PA,
+    PRESSURE_KPA,
+    PRESSURE_MBAR,
+)
+
+# Linear unit graph: from, to, scale, offset (to = from * scale + offset)
+# the reverse edge is derived, conversions between any connected units
+# are chained through it
+UNIT_GRAPH = (
+    (TEMP_FAHRENHEIT, TEMP_CELSIUS, 1 / 1.8, -32 / 1.8),
+    (TEMP_CELSIUS, TEMP_KELVIN, 1, 273.15),
+    (PRESSURE_INHG, PRESSURE_HPA, 33.86389, 0),
+    (PRESSURE_HPA, PRESSURE_KPA, 0.1, 0),
+    (PRESSURE_HPA, PRESSURE_PA, 100, 0),
+    (PRESSURE_HPA, PRESSURE_MBAR, 1, 0),
+    (SPEED_MILES, SPEED_KILOMETERS, 1 / 0.62137, 0),
+    (SPEED_KILOMETERS, SPEED_METERS, 1 / 3.6, 0),
+    (LENGTH_INCHES, LENGTH_MILLIMETERS, 25.4, 0),
+    (LENGTH_MILLIMETERS, LENGTH_CENTIMETERS, 0.1, 0),
+    (LIGHT_WATTS, LIGHT_LUX, 1 / 0.0079, 0),
 )
 
+def _build_edges():
+    edges = {}
+    for src, dst, scale, offset in UNIT_GRAPH:
+        edges.setdefault(src, {})[dst] = (scale, offset)
+        edges.setdefault(dst, {})[src] = (1 / scale, -offset / scale)
+    return edges
+
+_EDGES = _build_edges()
+
+def _resolve(src, dst):
+    """ compose the shortest edge path into a single (scale, offset) """
+
+    if src == dst or src not in _EDGES:
+        return None
+
+    seen = {src: (1, 0)}
+    queue = deque((src,))
+    while queue:
+        unit = queue.popleft()
+        scale, offset = seen[unit]
+        for nxt, (edge_scale, edge_offset) in _EDGES[unit].items():
+            if nxt in seen:
+                continue
+            seen[nxt] = (scale * edge_scale, offset * edge_scale + edge_offset)
+            if nxt == dst:
+                return seen[nxt]
+            queue.append(nxt)
+
+    return None
+
+def _linear(scale, offset):
+    if offset == 0:
+        return lambda value: value * scale
+    return lambda value: value * scale + offset
+
+_PLANS = {}
+
+def conversion(src, dst):
+    """ return a callable converting src to dst units, None for identity
+
+    Units without a path between them are passed through unchanged.
+    Plans are resolved once and shared, so equal (src, dst) pairs return
+    the same callable.
+    """
+
+    key = (src, dst)
+    try:
+        return _PLANS[key]
+    except KeyError:
+        pass
+
+    plan = _resolve(src, dst)
+    if plan is not None:
+        plan = _linear(*plan)
+    _PLANS[key] = plan
+    return plan
+
 CONVERT = {
-    TEMP_FAHRENHEIT: {
-        TEMP_CELSIUS: lambda value: (float(value) - 32) / 1.8, 
-    },
-    PRESSURE_INHG: {
-        PRESSURE_HPA: lambda value: float(value) * 33.86389, 
-    },
-    SPEED_MILES: {
-        SPEED_KILOMETERS: lambda value: float(value) / 0.62137, 
-    },
-    LENGTH_INCHES: {
-        LENGTH_MILLIMETERS: lambda value: float(value) * 25.4, 
-    },
-    LIGHT_WATTS: {
-        LIGHT_LUX: lambda value: float(value) / 0.0079, 
-    },
+    src: {dst: conversion(src, dst) for dst in dsts}
+    for src, dsts in _EDGES.items()
 }
@@ -0,0 +1,103 @@
+""" Duplicate and out-of-order push rejection """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+from calendar import timegm
+from collections import OrderedDict
+from functools import lru_cache
+
+DEFAULT_MAX_STATIONS = 1024
+
+# A station whose clock stepped back is followed again after this many
+# consecutive older pushes, each newer than the one before
+STALE_RESYNC = 5
+
+@lru_cache(maxsize=256)
+def parse_dateutc(value):
+    """ 'YYYY-MM-DD HH:MM:SS' (UTC) as epoch seconds, None if malformed
+
+    Stations sharing a push interval report the same few timestamps, so
+    the parse is cached.
+    """
+
+    try:
+        return timegm((
+            int(value[0:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:19]),
+        ))
+    except (TypeError, ValueError):
+        return None
+
+class DuplicateFilter(object):
+
+    """ Track the newest dateutc per station, dropping repeats
+
+    A push is accepted only when its dateutc is newer than the last one
+    accepted for its PASSKEY. Stations are kept in an LRU bounded by
+    max_stations, so memory does not grow with the number of gateways.
+
+    A gateway clock that steps back (an NTP fix, a reboot with a wrong
+    clock) would otherwise silence the station until it catches up: once
+    resync older pushes in a row agree with each other, each newer than
+    the last, the station is followed from the last of them. A replayed
+    old push, however old, is dropped like any other.
+    """
+
+    def __init__(self, max_stations=DEFAULT_MAX_STATIONS, resync=STALE_RESYNC):
+        self._max_stations = max_stations
+        self._resync = resync
+        self._latest = OrderedDict()
+        # station: (older pushes in a row, newest of them), only for
+        # stations in such a run
+        self._stale_runs = {}
+        self.accepted = 0
+        self.duplicates = 0
+        self.stale = 0
+        self.resynced = 0
+
+    def accept(self, station, dateutc):
+        """ return True if the push should be processed """
+
+        timestamp = parse_dateutc(dateutc)
+        if station is None or timestamp is None:
+            self.accepted += 1
+            return True
+
+        latest = self._latest
+        last = latest.get(station)
+        if last is not None:
+            if timestamp == last:
+                self.duplicates += 1
+                return False
+            if timestamp < last:
+                run, previous = self._stale_runs.get(station, (0, None))
+                # a run only continues on a clock that moves forward
+                run = run + 1 if previous is not None and timestamp > previous else 1
+                if run < self._resync:
+                    self._stale_runs[station] = (run, timestamp)
+                    self.stale += 1
+                    return False
+                _LOGGER.info("Clock of station %s stepped back %ss, following it", station, last - timestamp)
+                self.resynced += 1
+            self._stale_runs.pop(station, None)
+            latest.move_to_end(station)
+        elif len(latest) >= self._max_stations:
+            self._stale_runs.pop(latest.popitem(last=False)[0], None)
+
+        latest[station] = timestamp
+        self.accepted += 1
+        return True
+
+    @property
+    def counters(self):
+        """ accepted/dropped push counts """
+        return {
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "stale": self.stale,
+            "resynced": self.resynced,
+            "stations": len(self._latest),
+        }
@@ -0,0 +1,129 @@
+""" Derived meteorological values """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+from math import exp, log
+
+from homeassistant.const import (
+    TEMP_CELSIUS,
+    TEMP_FAHRENHEIT,
+)
+
+from .conversions import conversion
+
+from .payload import field_units
+
+from .reading import LAYOUT
+
+_TO_C = conversion(TEMP_FAHRENHEIT, TEMP_CELSIUS)
+_TO_F = conversion(TEMP_CELSIUS, TEMP_FAHRENHEIT)
+
+def dew_point(temp, humidity):
+    """ Magnus dew point, °F """
+    if not humidity:
+        return None
+    temp = _TO_C(temp)
+    gamma = log(humidity / 100) + 17.62 * temp / (243.12 + temp)
+    return round(_TO_F(243.12 * gamma / (17.62 - gamma)), 1)
+
+def heat_index(temp, humidity):
+    """ NWS (Rothfusz/Steadman) heat index, °F """
+    simple = 0.5 * (temp + 61 + (temp - 68) * 1.2 + humidity * 0.094)
+    if (simple + temp) / 2 < 80:
+        return round(simple, 1)
+
+    index = (
+        -42.379 + 2.04901523 * temp + 10.14333127 * humidity
+        - 0.22475541 * temp * humidity - 0.00683783 * temp * temp
+        - 0.05481717 * humidity * humidity + 0.00122874 * temp * temp * humidity
+        + 0.00085282 * temp * humidity * humidity
+        - 0.00000199 * temp * temp * humidity * humidity
+    )
+    if humidity < 13 and 80 <= temp <= 112:
+        index -= (13 - humidity) / 4 * ((17 - abs(temp - 95)) / 17) ** 0.5
+    elif humidity > 85 and 80 <= temp <= 87:
+        index += (humidity - 85) / 10 * (87 - temp) / 5
+    return round(index, 1)
+
+def wind_chill(temp, speed):
+    """ NWS wind chill, °F, the temperature outside its valid range """
+    if temp > 50 or speed <= 3:
+        return temp
+    speed = speed ** 0.16
+    return round(35.74 + 0.6215 * temp - 35.75 * speed + 0.4275 * temp * speed, 1)
+
+def feels_like(temp, humidity, speed):
+    """ heat index when hot, wind chill when cold, °F """
+    if temp >= 80:
+        return heat_index(temp, humidity)
+    if temp <= 50:
+        return wind_chill(temp, speed)
+    return temp
+
+def absolute_humidity(temp, humidity):
+    """ water vapour density, g/m³ """
+    temp = _TO_C(temp)
+    return round(
+        6.112 * exp(17.67 * temp / (temp + 243.5)) * humidity * 2.1674 / (273.15 + temp), 2
+    )
+
+# Derived values: group, part, inputs (group, part), function
+DERIVED = (
+    ("outdoor", "dewpoint", (("outdoor", "temperature"), ("outdoor", "humidity")), dew_point),
+    ("outdoor", "heatindex", (("outdoor", "temperature"), ("outdoor", "humidity")), heat_index),
+    ("outdoor", "windchill", (("outdoor", "temperature"), ("wind", "speed")), wind_chill),
+    ("outdoor", "feelslike", (("outdoor", "temperature"), ("outdoor", "humidity"), ("wind", "speed")), feels_like),
+    ("outdoor", "absolute_humidity", (("outdoor", "temperature"), ("outdoor", "humidity")), absolute_humidity),
+    ("indoor", "dewpoint", (("indoor", "temperature"), ("indoor", "humidity")), dew_point),
+)
+
+def _register(derived):
+    """ resolve DERIVED rows to value offsets """
+    return tuple(
+        (
+            group,
+            LAYOUT.add(group, part, field_units(group, part)),
+            tuple(LAYOUT.offset(in_group, in_part) for in_group, in_part in inputs),
+            func,
+        )
+        for group, part, inputs, func in derived
+    )
+
+_ROWS = _register(DERIVED)
+
+class DerivedValues(object):
+
+    """ Compute DERIVED rows into each push, per station
+
+    The inputs of every row are remembered per station and a row is only
+    recomputed when one of them changed since that station's last push.
+    """
+
+    def __init__(self, derived=DERIVED):
+        self._rows = _ROWS if derived is DERIVED else _register(derived)
+        self._stations = {}
+
+    def update(self, reading):
+        """ add derived values to the reading """
+
+        rows = self._rows
+        last = self._stations.get(reading.key)
+        if last is None:
+            last = self._stations[reading.key] = [None] * len(rows)
+
+        groups = reading.groups
+        values = reading.values
+        for i, (group, offset, inputs, func) in enumerate(rows):
+            if group not in groups:
+                continue
+
+            args = tuple(values[in_offset] for in_offset in inputs)
+            if None in args:
+                continue
+            cached = last[i]
+            if cached is None or cached[0] != args:
+                cached = last[i] = (args, func(*args))
+            values[offset] = cached[1]
@@ -0,0 +1,408 @@
+""" Batched export of parsed readings """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from time import monotonic, time
+
+import aiohttp
+
+from homeassistant.core import callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_time_interval
+
+from .dedupe import (
+    parse_dateutc
+)
+from .reading import (
+    LAYOUT
+)
+
+DEFAULT_BATCH_SIZE = 250
+DEFAULT_FLUSH_INTERVAL = 10
+DEFAULT_SPOOL_SIZE = 16
+DEFAULT_TIMEOUT = 10
+
+# Readings held in memory before the oldest are dropped: this many
+# batches, at least MIN_PENDING readings
+MAX_PENDING_BATCHES = 4
+MIN_PENDING = 2000
+
+# Retry backoff after a failed send, doubling up to the max, in seconds
+RETRY_BACKOFF = 5
+RETRY_BACKOFF_MAX = 300
+
+class ExportError(Exception):
+    """ A batch could not be delivered, it is spooled and retried """
+
+class ExportRejected(ExportError):
+    """ The sink refused a batch, retrying it would fail again """
+
+class Spool(object):
+
+    """ Bounded on disk queue of undelivered batches
+
+    One file per batch in a directory, named by a sequence number so they
+    sort oldest first. Past max_size bytes the oldest batches are dropped.
+    Methods do blocking file I/O and are meant for executor jobs.
+    """
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self._files = None
+        self._size = 0
+        self._next = 0
+
+    def _load(self):
+        if self._files is not None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._files = []
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(".batch"):
+                continue
+            size = os.path.getsize(os.path.join(self.path, name))
+            self._files.append((name, size))
+            self._size += size
+        if self._files:
+            self._next = int(self._files[-1][0].split(".")[0]) + 1
+
+    def push(self, data: bytes):
+        """ spool a batch, returns the number of old batches dropped """
+
+        self._load()
+        name = "{:012d}.batch".format(self._next)
+        self._next += 1
+        with open(os.path.join(self.path, name), "wb") as output:
+            output.write(data)
+        self._files.append((name, len(data)))
+        self._size += len(data)
+
+        dropped = 0
+        while self._size > self.max_size and len(self._files) > 1:
+            old, size = self._files.pop(0)
+            os.remove(os.path.join(self.path, old))
+            self._size -= size
+            dropped += 1
+        return dropped
+
+    def peek(self):
+        """ (name, data) of the oldest batch, None when empty """
+
+        self._load()
+        if not self._files:
+            return None
+        name = self._files[0][0]
+        with open(os.path.join(self.path, name), "rb") as source:
+            return name, source.read()
+
+    def remove(self, name):
+        """ drop a delivered batch """
+
+        self._load()
+        if self._files and self._files[0][0] == name:
+            self._size -= self._files.pop(0)[1]
+            os.remove(os.path.join(self.path, name))
+
+    def __len__(self):
+        self._load()
+        return len(self._files)
+
+    @property
+    def size(self):
+        return self._size
+
+class BatchExporter(ABC):
+
+    """ Buffer readings and send them in batches
+
+    async_export only appends the reading, so the webhook never waits on
+    a sink or on formatting. A batch of batch_size readings is formatted
+    and sent once that many are pending or every flush_interval seconds,
+    by a single flush task. Batches that fail go to the spool; spooled
+    batches are resent oldest first before new ones, with a growing
+    backoff while the sink is down. Subclasses format a reading into
+    entries (lines) and send a batch.
+    """
+
+    name = None
+
+    def __init__(self, hass, spool_path, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, spool_size=DEFAULT_SPOOL_SIZE * 1024 * 1024):
+        self._hass = hass
+        self._batch_size = batch_size
+        self._max_pending = max(batch_size * MAX_PENDING_BATCHES, MIN_PENDING)
+        self._pending = []
+        self._spool = Spool(spool_path, spool_size)
+        self._spooled = None
+        self._lock = asyncio.Lock()
+        self._flush = None
+        self._retry_at = 0
+        self._backoff = RETRY_BACKOFF
+        self._unsub = async_track_time_interval(
+            hass, self._async_tick, timedelta(seconds=flush_interval)
+        )
+        # entries (lines) and batches delivered
+        self.exported = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.spooled = 0
+        # readings dropped from memory, batches dropped from the spool
+        self.dropped = 0
+        self.spool_dropped = 0
+
+    @abstractmethod
+    def entries(self, reading):
+        """ the export entries (str) of a reading """
+
+    @abstractmethod
+    async def async_send(self, data: bytes):
+        """ deliver a batch, raise ExportError on failure """
+
+    @callback
+    def async_export(self, reading):
+        """ queue a reading for export """
+
+        pending = self._pending
+        pending.append(reading)
+        if len(pending) > self._max_pending:
+            del pending[0]
+            self.dropped += 1
+        if len(pending) >= self._batch_size:
+            self._async_schedule_flush(True)
+
+    @callback
+    def _async_tick(self, now):
+        # the first tick also picks up batches spooled before a restart
+        if self._pending or self._spooled != 0:
+            self._async_schedule_flush(False)
+
+    @callback
+    def _async_schedule_flush(self, full):
+        if self._flush is None:
+            self._flush = self._hass.async_create_task(self._async_flush_scheduled(full))
+
+    async def _async_flush_scheduled(self, full):
+        try:
+            await self.async_flush(full=full)
+        finally:
+            self._flush = None
+
+    async def async_flush(self, force=False, full=False):
+        """ resend spooled batches, then send what is pending
+
+        With full only whole batches are sent, the rest waits for the
+        next tick. force ignores the retry backoff.
+        """
+
+        async with self._lock:
+            hass = self._hass
+            if self._spooled is None:
+                self._spooled = await hass.async_add_executor_job(len, self._spool)
+
+            down = not force and monotonic() < self._retry_at
+            while self._spooled and not down:
+                name, data = await hass.async_add_executor_job(self._spool.peek)
+                if not await self._async_deliver(data):
+                    down = True
+                    break
+                await hass.async_add_executor_job(self._spool.remove, name)
+                self._spooled -= 1
+
+            least = self._batch_size if full else 1
+            while len(self._pending) >= least:
+                batch = self._pending[:self._batch_size]
+                del self._pending[:self._batch_size]
+                # readings are not changed after dispatch, format them off the loop
+                data = await hass.async_add_executor_job(self._format, batch)
+                if down or self._spooled or not await self._async_deliver(data):
+                    down = True
+                    await self._async_spool(data)
+
+    def _format(self, batch):
+        entries = self.entries
+        return "\n".join(
+            entry for reading in batch for entry in entries(reading)
+        ).encode("utf-8")
+
+    async def _async_deliver(self, data):
+        """ send a batch, False (with backoff) if it has to be kept """
+
+        try:
+            await self.async_send(data)
+        except ExportRejected as err:
+            self.rejected += 1
+            _LOGGER.error("%s export rejected a batch of %s bytes: %s", self.name, len(data), err)
+            return True
+        except ExportError as err:
+            self.failures += 1
+            self._retry_at = monotonic() + self._backoff
+            _LOGGER.warning("%s export failed, retrying in %ss: %s", self.name, self._backoff, err)
+            self._backoff = min(self._backoff * 2, RETRY_BACKOFF_MAX)
+            return False
+        self.batches += 1
+        self.exported += data.count(b"\n") + 1
+        self._backoff = RETRY_BACKOFF
+        return True
+
+    async def _async_spool(self, data):
+        try:
+            dropped = await self._hass.async_add_executor_job(self._spool.push, data)
+        except OSError as err:
+            self.spool_dropped += 1
+            _LOGGER.error("Unable to spool %s export batch: %s", self.name, err)
+            return
+        self.spooled += 1
+        self._spooled += 1 - dropped
+        self.spool_dropped += dropped
+
+    async def async_stop(self):
+        """ stop the flush timer and send (or spool) what is pending """
+        self._unsub()
+        await self.async_flush(force=True)
+
+    @property
+    def counters(self):
+        """ entry, batch and spool counts """
+        return {
+            "pending": len(self._pending),
+            "exported": self.exported,
+            "batches": self.batches,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "spooled": self.spooled,
+            "spool_batches": self._spooled or 0,
+            "spool_bytes": self._spool.size,
+            "dropped": self.dropped,
+            "spool_dropped": self.spool_dropped,
+        }
+
+def reading_timestamp(reading):
+    """ unix time of a reading's dateutc, now if it has none """
+
+    timestamp = parse_dateutc(reading.dateutc)
+    return int(time()) if timestamp is None else timestamp
+
+def _escape(text):
+    return str(text).replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+def _field(name, value):
+    if isinstance(value, bool):
+        return "{}={}".format(name, "true" if value else "false")
+    if isinstance(value, (int, float)):
+        # always floats, a field must not change type between pushes
+        return "{}={!r}".format(name, float(value))
+    return '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+
+class InfluxExporter(BatchExporter):
+
+    """ InfluxDB line protocol over HTTP
+
+    One line per group (and channel) of a reading, tagged with the station
+    and, for channels, the channel number, timestamped with dateutc.
+    Batches are posted to /write (InfluxDB 1.x, and 2.x through its
+    compatibility API) on Home Assistant's shared, keep-alive client
+    session.
+    """
+
+    name = "influxdb"
+
+    def __init__(self, hass, spool_path, url, database, measurement="gw1000",
+                 username=None, password=None, token=None, **kwargs):
+        super().__init__(hass, spool_path, **kwargs)
+        self._url = url.rstrip("/") + "/write"
+        self._params = {"db": database, "precision": "s"}
+        self._headers = {"Content-Type": "text/plain; charset=utf-8"}
+        if token is not None:
+            self._headers["Authorization"] = "Token {}".format(token)
+        self._auth = aiohttp.BasicAuth(username, password or "") if username else None
+        self._measurement = _escape(measurement)
+        self._fields = {}
+
+    def _group_fields(self, group, channel):
+        """ (field name, offset) of a group or channel, in layout order """
+
+        fields = self._fields.get((group, channel))
+        if fields is None:
+            fields = self._fields[(group, channel)] = [
+                (_escape(part), LAYOUT.offset(group, part, channel))
+                for part in LAYOUT.parts(group, channel)
+            ]
+        return fields
+
+    def entries(self, reading):
+        values = reading.values
+        prefix = "{},station={}".format(self._measurement, _escape(reading.key))
+        timestamp = reading_timestamp(reading)
+
+        lines = []
+        for group, channels in reading.groups.items():
+            for channel in (None,) + tuple(channels):
+                fields = ",".join(
+                    _field(name, values[offset])
+                    for name, offset in self._group_fields(group, channel)
+                    if values[offset] is not None
+                )
+                if not fields:
+                    continue
+                if channel is None:
+                    tags = "{},group={}".format(prefix, group)
+                else:
+                    tags = "{},group={},channel={}".format(prefix, group, channel)
+                lines.append("{} {} {}".format(tags, fields, timestamp))
+        return lines
+
+    async def async_send(self, data: bytes):
+        session = async_get_clientsession(self._hass)
+        try:
+            async with session.post(
+                self._url, params=self._params, data=data, headers=self._headers,
+                auth=self._auth, timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
+            ) as response:
+                if response.status < 300:
+                    return
+                text = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as err:
+            raise ExportError(err)
+
+        # bad lines are not going to get better by retrying them
+        if response.status in (400, 413):
+            raise ExportRejected("{} {}".format(response.status, text.strip()))
+        raise ExportError("{} {}".format(response.status, text.strip()))
+
+class MqttExporter(BatchExporter):
+
+    """ Readings as JSON lines, published in batches over MQTT
+
+    Each batch is one message on topic with one reading per line, through
+    Home Assistant's MQTT integration. While it is not set up batches are
+    spooled like any failed delivery.
+    """
+
+    name = "mqtt"
+
+    def __init__(self, hass, spool_path, topic, qos=0, **kwargs):
+        super().__init__(hass, spool_path, **kwargs)
+        self._topic = topic
+        self._qos = qos
+
+    def entries(self, reading):
+        data = reading.as_dict()
+        data.pop("metrics", None)
+        return [json.dumps(data, separators=(",", ":"))]
+
+    async def async_send(self, data: bytes):
+        if "mqtt" not in self._hass.data:
+            raise ExportError("MQTT is not set up")
+        self._hass.components.mqtt.async_publish(
+            self._topic, data.decode("utf-8"), self._qos, False
+        )
@@ -0,0 +1,131 @@
+""" Bounded per station ingestion queue """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+import asyncio
+from collections import deque
+from time import monotonic
+
+from homeassistant.core import callback
+
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_LATEST = "latest"
+POLICIES = (POLICY_DROP_OLDEST, POLICY_LATEST)
+
+DEFAULT_QUEUE_SIZE = 8
+
+class IngestQueue(object):
+
+    """ Decouple push processing from the gateway's HTTP request
+
+    Each station gets its own queue of at most size pushes. When a queue
+    is full, drop_oldest discards its oldest push. The latest policy keeps
+    only the newest push of each station. So a backlog never grows beyond
+    size pushes per station. A single worker serves the stations round
+    robin and yields to the loop between pushes, so one chatty station
+    cannot starve the others.
+    """
+
+    def __init__(self, process, size=DEFAULT_QUEUE_SIZE, policy=POLICY_DROP_OLDEST):
+        self._process = process
+        self._size = 1 if policy == POLICY_LATEST else size
+        self._queues = {}
+        self._ready = deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.depth = 0
+        self.max_depth = 0
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+
+    @callback
+    def async_put(self, station, *item):
+        """ queue a push of station, dropping per policy when full """
+
+        queue = self._queues.get(station)
+        if queue is None:
+            queue = self._queues[station] = deque()
+            self._ready.append(station)
+
+        if len(queue) >= self._size:
+            queue.popleft()
+            self.dropped += 1
+        else:
+            self.depth += 1
+            if self.depth > self.max_depth:
+                self.max_depth = self.depth
+
+        queue.append((monotonic(), item))
+        self.enqueued += 1
+        self._wakeup.set()
+
+    @callback
+    def async_start(self, hass):
+        """ start the worker """
+        self._task = hass.async_create_task(self._async_run())
+
+    async def async_stop(self):
+        """ stop the worker, queued pushes are discarded """
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _async_run(self):
+        queues = self._queues
+        ready = self._ready
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while ready:
+                station = ready.popleft()
+                queue = queues[station]
+                queued, item = queue.popleft()
+                if queue:
+                    ready.append(station)
+                else:
+                    del queues[station]
+                self.depth -= 1
+
+                wait = self.last_wait = monotonic() - queued
+                self.total_wait += wait
+                if wait > self.max_wait:
+                    self.max_wait = wait
+
+                try:
+                    self._process(*item)
+                    self.processed += 1
+                except Exception:  # pylint: disable=broad-except
+                    self.errors += 1
+                    _LOGGER.exception("Processing push of %s failed", station)
+
+                await asyncio.sleep(0)
+
+    @property
+    def counters(self):
+        """ queue depth, wait times and drop counts """
+        return {
+            "queue_depth": self.depth,
+            "max_queue_depth": self.max_depth,
+            "stations": len(self._queues),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_wait": self.last_wait,
+            "mean_wait": self.total_wait / self.processed if self.processed else None,
+            "max_wait": self.max_wait,
+        }
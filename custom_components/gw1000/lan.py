@@ -0,0 +1,457 @@
+""" Ecowitt GW1000 LAN (binary) API client """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+import asyncio
+import hashlib
+import struct
+from datetime import datetime, timedelta
+
+from homeassistant.const import (
+    PRESSURE_HPA,
+    PRESSURE_INHG,
+    TEMP_CELSIUS,
+    TEMP_FAHRENHEIT,
+    LENGTH_INCHES,
+)
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    DOMAIN,
+    DATA_METRICS,
+    LENGTH_MILLIMETERS,
+    LIGHT_WATTS,
+    LIGHT_LUX,
+    SPEED_MILES,
+    SPEED_METERS,
+)
+
+from .conversions import conversion
+
+from .metrics import stage_timer
+
+# importing the push schema registers the fields decoded into in LAYOUT
+from . import payload  # pylint: disable=unused-import
+
+from .reading import (
+    LAYOUT,
+    StationReading,
+)
+
+DEFAULT_PORT = 45000
+DISCOVERY_PORT = 46000
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_TIMEOUT = 5
+
+HEADER = b"\xff\xff"
+
+CMD_BROADCAST = 0x12
+CMD_READ_STATION_MAC = 0x26
+CMD_GW1000_LIVEDATA = 0x27
+CMD_READ_FIRMWARE_VERSION = 0x50
+
+# responses of these commands carry a two byte size
+WIDE_RESPONSES = frozenset((CMD_BROADCAST, CMD_GW1000_LIVEDATA))
+
+class ProtocolError(Exception):
+    """ malformed or unexpected gateway response """
+
+def build_packet(command, payload=b""):
+    """ command packet: header, command, size, payload, checksum """
+    body = bytes((command, len(payload) + 3)) + payload
+    return HEADER + body + bytes((sum(body) & 0xFF,))
+
+def check_response(command, response: bytes):
+    """ validate a full response, returns its data """
+
+    if response[:2] != HEADER or response[2] != command:
+        raise ProtocolError("Unexpected response to command 0x{:02x}".format(command))
+    if sum(response[2:-1]) & 0xFF != response[-1]:
+        raise ProtocolError("Bad checksum in response to command 0x{:02x}".format(command))
+    return response[5 if command in WIDE_RESPONSES else 4:-1]
+
+def _round(convert, digits):
+    if convert is None:
+        return lambda value: round(value, digits)
+    return lambda value: round(convert(value), digits)
+
+_TEMP = _round(conversion(TEMP_CELSIUS, TEMP_FAHRENHEIT), 1)
+_PRESSURE = _round(conversion(PRESSURE_HPA, PRESSURE_INHG), 3)
+_SPEED = _round(conversion(SPEED_METERS, SPEED_MILES), 2)
+_RAIN = _round(conversion(LENGTH_MILLIMETERS, LENGTH_INCHES), 3)
+_LIGHT = _round(conversion(LIGHT_LUX, LIGHT_WATTS), 2)
+_TENTHS = _round(None, 1)
+
+def _unset(missing):
+    """ pass values through, None for the sensor's 'no data' marker """
+    return lambda value: None if value == missing else value
+
+# Live data fields: id, struct format, scale, group (None to skip), channel,
+# part, convert to the push units. Values are scaled (value / scale) and
+# converted so results match what the HTTP push produces.
+LIVEDATA_FIELDS = (
+    (0x01, ">h", 10, "indoor", None, "temperature", _TEMP),
+    (0x02, ">h", 10, "outdoor", None, "temperature", _TEMP),
+    (0x03, ">h", 10, None, None, "dewpoint", None),
+    (0x04, ">h", 10, None, None, "windchill", None),
+    (0x05, ">h", 10, None, None, "heatindex", None),
+    (0x06, ">B", 1, "indoor", None, "humidity", None),
+    (0x07, ">B", 1, "outdoor", None, "humidity", None),
+    (0x08, ">H", 10, "pressure", None, "absolute", _PRESSURE),
+    (0x09, ">H", 10, "pressure", None, "relative", _PRESSURE),
+    (0x0A, ">H", 1, "wind", None, "bearing", None),
+    (0x0B, ">H", 10, "wind", None, "speed", _SPEED),
+    (0x0C, ">H", 10, "wind", None, "gust", _SPEED),
+    (0x0D, ">H", 10, "rain", None, "event", _RAIN),
+    (0x0E, ">H", 10, "rain", None, "rate", _RAIN),
+    (0x0F, ">H", 10, "rain", None, "hourly", _RAIN),
+    (0x10, ">H", 10, "rain", None, "daily", _RAIN),
+    (0x11, ">H", 10, "rain", None, "weekly", _RAIN),
+    (0x12, ">I", 10, "rain", None, "monthly", _RAIN),
+    (0x13, ">I", 10, "rain", None, "yearly", _RAIN),
+    (0x14, ">I", 10, "rain", None, "total", _RAIN),
+    (0x15, ">I", 10, "solar", None, "radiation", _LIGHT),
+    (0x16, ">H", 10, None, None, "uv_radiation", None),
+    (0x17, ">B", 1, "solar", None, "uv", None),
+    (0x18, ">6s", 1, None, None, "time", None),
+    (0x19, ">H", 10, "wind", None, "maxgust", _SPEED),
+) + tuple(
+    (0x1A + i, ">h", 10, "temperature", format(i + 1), "temperature", _TEMP) for i in range(8)
+) + tuple(
+    (0x22 + i, ">B", 1, "temperature", format(i + 1), "humidity", None) for i in range(8)
+) + (
+    (0x2A, ">H", 10, "air", "1", "current", _TENTHS),
+) + tuple(
+    row for i in range(8) for row in (
+        (0x2B + 2 * i, ">h", 10, None, format(i + 1), "temperature", None),
+        (0x2C + 2 * i, ">B", 1, "soil", format(i + 1), "moisture", None),
+    )
+) + (
+    (0x4C, ">16s", 1, None, None, "lowbatt", None),
+) + tuple(
+    (0x4D + i, ">H", 10, "air", format(i + 1), "avg_24h", _TENTHS) for i in range(4)
+) + tuple(
+    (0x51 + i, ">H", 10, "air", format(i + 2), "current", _TENTHS) for i in range(3)
+) + tuple(
+    (0x58 + i, ">B", 1, "leak", format(i + 1), "leak", None) for i in range(4)
+) + (
+    (0x60, ">B", 1, "lightning", None, "distance", _unset(0xFF)),
+    (0x61, ">I", 1, "lightning", None, "time", _unset(0xFFFFFFFF)),
+    (0x62, ">I", 1, "lightning", None, "count", None),
+) + tuple(
+    (0x63 + i, ">3s", 1, None, format(i + 1), "temperature", None) for i in range(8)
+) + (
+    (0x6C, ">I", 1, None, None, "heap", None),
+    (0x70, ">hBHHHHHHB", 1, "co2", None, None, None),
+) + tuple(
+    (0x72 + i, ">B", 1, None, format(i + 1), "leafwetness", None) for i in range(8)
+)
+
+# WH45 block layout: part, scale, convert
+CO2_PARTS = (
+    ("temperature", 10, _TEMP),
+    ("humidity", 1, None),
+    ("pm10", 10, _TENTHS),
+    ("pm10_avg_24h", 10, _TENTHS),
+    ("pm25", 10, _TENTHS),
+    ("pm25_avg_24h", 10, _TENTHS),
+    ("co2", 1, None),
+    ("co2_avg_24h", 1, None),
+    ("battery", None, None),
+)
+
+_CO2_OFFSETS = tuple(LAYOUT.offset("co2", part) for part, _, _ in CO2_PARTS)
+
+def _build_decoders():
+    """ field id -> (struct, scale, group, channel, value offset, convert) """
+    return {
+        field_id: (
+            struct.Struct(fmt), scale, group, channel,
+            None if group is None or part is None else LAYOUT.offset(group, part, channel),
+            convert,
+        )
+        for field_id, fmt, scale, group, channel, part, convert in LIVEDATA_FIELDS
+    }
+
+DECODERS = _build_decoders()
+
+def station_key(mac):
+    """ the PASSKEY the gateway sends with its HTTP pushes """
+    return hashlib.md5(mac.upper().encode("ascii")).hexdigest().upper()
+
+def format_mac(data: bytes):
+    return ":".join("{:02X}".format(byte) for byte in data)
+
+def decode_livedata(data: bytes, station=None, model="GW1000", stationtype=None):
+    """ decode CMD_GW1000_LIVEDATA data into a StationReading """
+
+    groups = {}
+    reading = StationReading(groups)
+    reading.key = station
+    reading.stationtype = stationtype
+    reading.dateutc = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    reading.model = model
+    values = reading.values
+
+    decoders = DECODERS
+    offset = 0
+    end = len(data)
+    while offset < end:
+        field_id = data[offset]
+        decoder = decoders.get(field_id)
+        if decoder is None:
+            # field sizes are implied by their id, nothing after an
+            # unknown one can be decoded
+            _LOGGER.debug("Unknown live data field 0x%02x, %s bytes skipped", field_id, end - offset)
+            break
+
+        packed, scale, group, channel, target, convert = decoder
+        offset += 1
+        if offset + packed.size > end:
+            raise ProtocolError("Truncated live data field 0x{:02x}".format(field_id))
+        fields = packed.unpack_from(data, offset)
+        offset += packed.size
+        if group is None:
+            continue
+
+        channels = groups.get(group)
+        if channels is None:
+            channels = groups[group] = []
+        if channel is not None and channel not in channels:
+            channels.append(channel)
+
+        if target is None:
+            _decode_co2(fields, values)
+            continue
+
+        value = fields[0]
+        if scale != 1:
+            value = value / scale
+        if convert is not None:
+            value = convert(value)
+        values[target] = value
+
+    return reading
+
+def _decode_co2(fields, values):
+    for (part, scale, convert), offset, value in zip(CO2_PARTS, _CO2_OFFSETS, fields):
+        if part == "battery":
+            value = value / 5 * 100 if value <= 5 else None
+        else:
+            if scale != 1:
+                value = value / scale
+            if convert is not None:
+                value = convert(value)
+        values[offset] = value
+
+class Gw1000Client(object):
+
+    """ Pooled connection to one gateway's binary API
+
+    Requests share a single persistent connection, serialized by a lock.
+    A request that fails on a stale connection is retried once on a
+    fresh one.
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self._timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+        self.connects = 0
+        self.requests = 0
+
+    async def async_request(self, command, payload=b""):
+        """ send a command, returns the response data """
+
+        async with self._lock:
+            for retry in (False, True):
+                try:
+                    if self._writer is None:
+                        await self._async_connect()
+                    self._writer.write(build_packet(command, payload))
+                    response = await asyncio.wait_for(self._async_read(command), self._timeout)
+                    self.requests += 1
+                    return check_response(command, response)
+                except (OSError, EOFError, asyncio.TimeoutError, ProtocolError):
+                    self.close()
+                    if retry:
+                        raise
+
+    async def _async_connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self._timeout
+        )
+        self.connects += 1
+        _LOGGER.debug("Connected to %s:%s", self.host, self.port)
+
+    async def _async_read(self, command):
+        reader = self._reader
+        head = await reader.readexactly(5 if command in WIDE_RESPONSES else 4)
+        if command in WIDE_RESPONSES:
+            size = (head[3] << 8) | head[4]
+        else:
+            size = head[3]
+        # size counts from the command byte through the checksum
+        return head + await reader.readexactly(size + 2 - len(head))
+
+    async def async_livedata(self):
+        """ raw live data """
+        return await self.async_request(CMD_GW1000_LIVEDATA)
+
+    async def async_mac(self):
+        """ gateway MAC address, AA:BB:CC:DD:EE:FF """
+        return format_mac((await self.async_request(CMD_READ_STATION_MAC))[:6])
+
+    async def async_firmware(self):
+        """ firmware version string """
+        data = await self.async_request(CMD_READ_FIRMWARE_VERSION)
+        return data[1:1 + data[0]].decode("ascii", "replace")
+
+    def close(self):
+        """ drop the connection, the next request reconnects """
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+def parse_broadcast(response: bytes):
+    """ gateway details from a CMD_BROADCAST reply """
+
+    data = check_response(CMD_BROADCAST, response)
+    name_size = data[12]
+    return {
+        "mac": format_mac(data[0:6]),
+        "host": ".".join(str(byte) for byte in data[6:10]),
+        "port": (data[10] << 8) | data[11],
+        "name": data[13:13 + name_size].decode("ascii", "replace"),
+    }
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self):
+        self.gateways = {}
+
+    def datagram_received(self, data, addr):
+        try:
+            gateway = parse_broadcast(data)
+        except (ProtocolError, IndexError):
+            return
+        self.gateways[gateway["mac"]] = gateway
+
+async def async_discover(loop, timeout=2, address="255.255.255.255", port=DISCOVERY_PORT):
+    """ broadcast for gateways, returns the details of those that reply """
+
+    transport, protocol = await loop.create_datagram_endpoint(
+        _DiscoveryProtocol, local_addr=("0.0.0.0", 0), allow_broadcast=True
+    )
+    try:
+        transport.sendto(build_packet(CMD_BROADCAST), (address, port))
+        await asyncio.sleep(timeout)
+    finally:
+        transport.close()
+    return list(protocol.gateways.values())
+
+class Gw1000Poller(object):
+
+    """ Poll a gateway's live data into the push pipeline
+
+    Every interval the live data is read over the pooled connection,
+    decoded into the push results structure under the gateway's station
+    key and dispatched to the handlers of webhook_id, just as a push.
+    A poll still in flight when the next is due skips that tick. A
+    gateway that could not be identified at start is identified again
+    before each poll, and not polled until it is.
+    """
+
+    def __init__(self, hass, client, webhook_id, interval=DEFAULT_POLL_INTERVAL, station=None):
+        self._hass = hass
+        self._client = client
+        self._webhook_id = webhook_id
+        self._interval = interval
+        self._unsub = None
+        self._polling = False
+        self.station = station
+        self.stationtype = None
+        self.polls = 0
+        self.errors = 0
+        self.skipped = 0
+
+    async def async_start(self):
+        """ identify the gateway and start polling """
+
+        await self._async_identify()
+
+        _LOGGER.info(
+            "Polling gateway %s (%s) every %ss for %s",
+            self._client.host, self.stationtype, self._interval, self._webhook_id
+        )
+        self._unsub = async_track_time_interval(
+            self._hass, self._async_poll, timedelta(seconds=self._interval)
+        )
+
+    async def _async_identify(self):
+        """ station key and firmware, True once the station is known """
+
+        try:
+            if self.station is None:
+                self.station = station_key(await self._client.async_mac())
+            if self.stationtype is None:
+                self.stationtype = await self._client.async_firmware()
+        except (OSError, EOFError, asyncio.TimeoutError, ProtocolError) as err:
+            _LOGGER.warning("Unable to identify gateway %s: %s", self._client.host, err)
+        return self.station is not None
+
+    @callback
+    def async_stop(self):
+        """ stop polling and close the connection """
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self._client.close()
+
+    async def _async_poll(self, now):
+        if self._polling:
+            self.skipped += 1
+            return
+
+        hass = self._hass
+        routes = hass.data.get(DOMAIN, {}).get(self._webhook_id)
+        if not routes:
+            return
+
+        self._polling = True
+        try:
+            # without its station key a poll would reach no station route
+            if self.station is None and not await self._async_identify():
+                self.errors += 1
+                return
+            timer = stage_timer(hass.data.get(DATA_METRICS))
+            data = await self._client.async_livedata()
+            timer.lap("read")
+            results = decode_livedata(data, self.station, stationtype=self.stationtype)
+            timer.lap("parse")
+        except (OSError, EOFError, asyncio.TimeoutError, ProtocolError) as err:
+            self.errors += 1
+            _LOGGER.warning("Polling gateway %s failed: %s", self._client.host, err)
+            return
+        finally:
+            self._polling = False
+
+        self.polls += 1
+        hass.components.gw1000.async_process_results(self._webhook_id, routes, results, timer)
+
+    @property
+    def counters(self):
+        """ poll and connection counts """
+        return {
+            "polls": self.polls,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "connects": self._client.connects,
+        }
@@ -0,0 +1,186 @@
+""" Webhook pipeline instrumentation """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+from array import array
+from bisect import bisect_left
+from time import monotonic, perf_counter
+
+# Stage latency bucket upper bounds, seconds
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+# Push interval bucket upper bounds, seconds
+INTERVAL_BUCKETS = (4, 8, 12, 16, 20, 30, 45, 60, 90, 120, 300, 600)
+
+# Pipeline stages, in order
+STAGES = ("read", "filter", "queue", "parse", "enrich", "dispatch", "export", "write")
+
+RATE_SMOOTHING = 0.1
+
+class Histogram(object):
+
+    """ Fixed bucket histogram, the last bucket counts overflows """
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = array("L", bytes(array("L").itemsize * (len(bounds) + 1)))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """ add a sample """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        """ mean of all samples """
+        return self.total / self.count if self.count else None
+
+    def as_dict(self):
+        """ JSON friendly form """
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "max": self.max,
+            "buckets": dict(zip([str(bound) for bound in self.bounds] + ["inf"], self.counts)),
+        }
+
+class StationMetrics(object):
+
+    """ Push interval tracking of one station """
+
+    __slots__ = ("last", "freq", "intervals")
+
+    def __init__(self):
+        self.last = None
+        self.freq = None
+        self.intervals = Histogram(INTERVAL_BUCKETS)
+
+class PipelineMetrics(object):
+
+    """ Stage timers, push rates and error counters
+
+    Only created when metrics are enabled, callers look it up in hass.data
+    and fall back to NULL_TIMER, so a disabled pipeline pays a lookup and
+    a few no-op calls per push.
+    """
+
+    def __init__(self):
+        self.started = monotonic()
+        self.stages = {stage: Histogram(LATENCY_BUCKETS) for stage in STAGES}
+        self.handlers = {}
+        self.stations = {}
+        self.pushes = 0
+        self.handler_errors = 0
+        self.rate = 0.0
+        self._last_push = None
+
+    def observe(self, stage, seconds):
+        """ record a stage duration """
+        self.stages[stage].observe(seconds)
+
+    def observe_handler(self, domain, seconds):
+        """ record one entity handler duration """
+        histogram = self.handlers.get(domain)
+        if histogram is None:
+            histogram = self.handlers[domain] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+
+    def push(self, station, freq, now=None):
+        """ record a push arrival, returns this station's last interval """
+
+        if now is None:
+            now = monotonic()
+
+        self.pushes += 1
+        if self._last_push is not None:
+            elapsed = now - self._last_push
+            if elapsed > 0:
+                self.rate += RATE_SMOOTHING * (1 / elapsed - self.rate)
+        self._last_push = now
+
+        metrics = self.stations.get(station)
+        if metrics is None:
+            metrics = self.stations[station] = StationMetrics()
+        metrics.freq = freq
+
+        interval = None
+        if metrics.last is not None:
+            interval = now - metrics.last
+            metrics.intervals.observe(interval)
+        metrics.last = now
+        return interval
+
+    def summary(self, interval=None):
+        """ values for the diagnostic sensors """
+        return {
+            "units": None,
+            "pushes": self.pushes,
+            "pushes_per_second": round(self.rate, 3),
+            "push_interval": round(interval, 1) if interval is not None else None,
+            "parse_time": _ms(self.stages["parse"].mean),
+            "dispatch_time": _ms(self.stages["dispatch"].mean),
+            "handler_errors": self.handler_errors,
+        }
+
+    def as_dict(self):
+        """ JSON friendly dump of everything """
+        return {
+            "uptime": monotonic() - self.started,
+            "pushes": self.pushes,
+            "pushes_per_second": self.rate,
+            "handler_errors": self.handler_errors,
+            "stages": {stage: histogram.as_dict() for stage, histogram in self.stages.items()},
+            "handlers": {domain: histogram.as_dict() for domain, histogram in self.handlers.items()},
+            "stations": {
+                station: {"freq": metrics.freq, "intervals": metrics.intervals.as_dict()}
+                for station, metrics in self.stations.items()
+            },
+        }
+
+class StageTimer(object):
+
+    """ Lap timer feeding consecutive stage histograms """
+
+    __slots__ = ("_metrics", "_last")
+
+    def __init__(self, metrics):
+        self._metrics = metrics
+        self._last = perf_counter()
+
+    def lap(self, stage):
+        """ close the current stage """
+        now = perf_counter()
+        self._metrics.stages[stage].observe(now - self._last)
+        self._last = now
+
+class _NullTimer(object):
+
+    """ Stage timer used when metrics are disabled """
+
+    __slots__ = ()
+
+    def lap(self, stage):
+        pass
+
+NULL_TIMER = _NullTimer()
+
+def stage_timer(metrics):
+    """ a StageTimer, or the no-op timer without metrics """
+    return NULL_TIMER if metrics is None else StageTimer(metrics)
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
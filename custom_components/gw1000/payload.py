@@ -0,0 +1,307 @@
+""" Ecowitt push payload schema and compiled parser """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+from urllib.parse import unquote_plus
+
+from homeassistant.const import (
+    PRESSURE_INHG,
+    TEMP_FAHRENHEIT,
+    LENGTH_INCHES,
+    LENGTH_KILOMETERS,
+)
+
+from .const import (
+    LIGHT_WATTS,
+    SPEED_MILES,
+    CONCENTRATION_MICROGRAMS,
+    CONCENTRATION_PPM,
+    DENSITY_GRAMS,
+)
+
+from .reading import (
+    LAYOUT,
+    StationReading,
+)
+
+def _lowbatt(value):
+    """ battery flag, anything but 0 is low """
+    return value != '0'
+
+def _battery_level(value):
+    """ 0-5 battery level as a percentage """
+    return (int(value) / 5) * 100
+
+def _optional_float(value):
+    """ float, or None when the gateway sends an empty value """
+    return float(value) if value else None
+
+def _optional_int(value):
+    """ int, or None when the gateway sends an empty value """
+    return int(value) if value else None
+
+# Group units, groups missing here carry no units
+GROUP_UNITS = {
+    "indoor": TEMP_FAHRENHEIT,
+    "outdoor": TEMP_FAHRENHEIT,
+    "pressure": PRESSURE_INHG,
+    "rain": LENGTH_INCHES,
+    "wind": SPEED_MILES,
+    "solar": LIGHT_WATTS,
+    "temperature": TEMP_FAHRENHEIT,
+    "air": CONCENTRATION_MICROGRAMS,
+    "soil": "%",
+    "leak": None,
+    "lightning": None,
+    "co2": None,
+}
+
+# Units of the fields whose units are not their group's, None for flags,
+# counts, indexes and times
+PART_UNITS = {
+    ("indoor", "humidity"): "%",
+    ("outdoor", "humidity"): "%",
+    ("outdoor", "absolute_humidity"): DENSITY_GRAMS,
+    ("outdoor", "lowbatt"): None,
+    ("rain", "lowbatt"): None,
+    ("wind", "bearing"): "°",
+    ("wind", "lowbatt"): None,
+    ("solar", "uv"): None,
+    ("temperature", "humidity"): "%",
+    ("temperature", "lowbatt"): None,
+    ("air", "battery"): "%",
+    ("air", "aqi"): None,
+    ("air", "aqi_24h"): None,
+    ("air", "caqi"): None,
+    ("air", "caqi_24h"): None,
+    ("soil", "voltage"): "V",
+    ("leak", "battery"): "%",
+    ("lightning", "distance"): LENGTH_KILOMETERS,
+    ("lightning", "battery"): "%",
+    ("co2", "temperature"): TEMP_FAHRENHEIT,
+    ("co2", "humidity"): "%",
+    ("co2", "pm25"): CONCENTRATION_MICROGRAMS,
+    ("co2", "pm25_avg_24h"): CONCENTRATION_MICROGRAMS,
+    ("co2", "pm10"): CONCENTRATION_MICROGRAMS,
+    ("co2", "pm10_avg_24h"): CONCENTRATION_MICROGRAMS,
+    ("co2", "co2"): CONCENTRATION_PPM,
+    ("co2", "co2_avg_24h"): CONCENTRATION_PPM,
+    ("co2", "battery"): "%",
+}
+
+def field_units(group, part):
+    """ units of a field, its group's unless listed in PART_UNITS """
+    key = (group, part)
+    return PART_UNITS[key] if key in PART_UNITS else GROUP_UNITS.get(group)
+
+# Station fields: post key, group (None for top level), part, type
+FIELDS = (
+    ("PASSKEY", None, "key", str),
+    ("stationtype", None, "stationtype", str),
+    ("dateutc", None, "dateutc", str),
+    ("freq", None, "freq", str),
+    ("model", None, "model", str),
+    ("tempinf", "indoor", "temperature", float),
+    ("humidityin", "indoor", "humidity", int),
+    ("tempf", "outdoor", "temperature", float),
+    ("humidity", "outdoor", "humidity", int),
+    ("baromrelin", "pressure", "relative", float),
+    ("baromabsin", "pressure", "absolute", float),
+    ("rainratein", "rain", "rate", float),
+    ("eventrainin", "rain", "event", float),
+    ("hourlyrainin", "rain", "hourly", float),
+    ("dailyrainin", "rain", "daily", float),
+    ("weeklyrainin", "rain", "weekly", float),
+    ("monthlyrainin", "rain", "monthly", float),
+    ("yearlyrainin", "rain", "yearly", float),
+    ("totalrainin", "rain", "total", float),
+    ("winddir", "wind", "bearing", int),
+    ("windspeedmph", "wind", "speed", float),
+    ("windgustmph", "wind", "gust", float),
+    ("maxdailygust", "wind", "maxgust", float),
+    ("solarradiation", "solar", "radiation", float),
+    ("uv", "solar", "uv", int),
+    ("wh65batt", "outdoor", "lowbatt", _lowbatt),
+    ("wh65batt", "rain", "lowbatt", _lowbatt),
+    ("wh65batt", "wind", "lowbatt", _lowbatt),
+    # WH57 lightning
+    ("lightning", "lightning", "distance", _optional_float),
+    ("lightning_num", "lightning", "count", _optional_int),
+    ("lightning_time", "lightning", "time", _optional_int),
+    ("wh57batt", "lightning", "battery", _battery_level),
+    # WH45 CO2/PM combo
+    ("tf_co2", "co2", "temperature", float),
+    ("humi_co2", "co2", "humidity", int),
+    ("pm25_co2", "co2", "pm25", float),
+    ("pm25_24h_co2", "co2", "pm25_avg_24h", float),
+    ("pm10_co2", "co2", "pm10", float),
+    ("pm10_24h_co2", "co2", "pm10_avg_24h", float),
+    ("co2", "co2", "co2", int),
+    ("co2_24h", "co2", "co2_avg_24h", int),
+    ("co2_batt", "co2", "battery", _battery_level),
+)
+
+# Channel fields: post key pattern, channels, group, part, type
+CHANNEL_FIELDS = (
+    ("temp{}f", range(1, 9), "temperature", "temperature", float),
+    ("humidity{}", range(1, 9), "temperature", "humidity", int),
+    ("batt{}", range(1, 9), "temperature", "lowbatt", _lowbatt),
+    ("pm25_ch{}", range(1, 5), "air", "current", float),
+    ("pm25_avg_24h_ch{}", range(1, 5), "air", "avg_24h", float),
+    ("pm25batt{}", range(1, 5), "air", "battery", _battery_level),
+    ("soilmoisture{}", range(1, 9), "soil", "moisture", int),
+    ("soilbatt{}", range(1, 9), "soil", "voltage", float),
+    ("leak_ch{}", range(1, 5), "leak", "leak", int),
+    ("leakbatt{}", range(1, 5), "leak", "battery", _battery_level),
+)
+
+PLAN_CACHE_SIZE = 32
+
+def _build_index():
+    """ expand the schema into post key -> (type, targets), registering
+    every field in LAYOUT """
+
+    for group, units in GROUP_UNITS.items():
+        LAYOUT.set_group_units(group, units)
+
+    index = {}
+    for key, group, part, kind in FIELDS:
+        _, targets = index.setdefault(key, (kind, []))
+        offset = None if group is None else LAYOUT.add(group, part, field_units(group, part))
+        targets.append((group, None, part, offset))
+
+    for pattern, channels, group, part, kind in CHANNEL_FIELDS:
+        LAYOUT.add(group, part, field_units(group, part), channels)
+        for i in channels:
+            _, targets = index.setdefault(pattern.format(i), (kind, []))
+            targets.append((group, format(i), part, LAYOUT.offset(group, part, format(i))))
+
+    return {key: (kind, tuple(targets)) for key, (kind, targets) in index.items()}
+
+INDEX = _build_index()
+
+class ParsePlan(object):
+
+    """ Parse steps for one distinct set of posted keys
+
+    Each posted key is resolved once to its top level attributes and value
+    offsets. The groups (and channels) present are shared by every
+    reading parsed with the plan.
+    """
+
+    __slots__ = ("fields", "groups")
+
+    def __init__(self, keys):
+        fields = []
+        groups = {}
+        for key in keys:
+            entry = INDEX.get(key)
+            if entry is None:
+                continue
+            kind, targets = entry
+            names = tuple(part for group, _, part, _ in targets if group is None)
+            offsets = tuple(offset for group, _, _, offset in targets if group is not None)
+            fields.append((key, kind, names, offsets))
+            for group, channel, _, _ in targets:
+                if group is None:
+                    continue
+                channels = groups.setdefault(group, [])
+                if channel is not None and channel not in channels:
+                    channels.append(channel)
+
+        self.fields = tuple(fields)
+        self.groups = {group: tuple(channels) for group, channels in groups.items()}
+
+    def parse(self, post):
+        """ build a StationReading from a post mapping """
+
+        reading = StationReading(self.groups)
+        values = reading.values
+
+        for key, kind, names, offsets in self.fields:
+            try:
+                value = kind(post[key])
+            except ValueError:
+                _LOGGER.debug("Invalid value for %s: %s", key, post[key])
+                value = None
+
+            for name in names:
+                setattr(reading, name, value)
+            for offset in offsets:
+                values[offset] = value
+
+        return reading
+
+_PLANS = {}
+
+def compile_plan(model, keys):
+    """ return the cached parse plan for a model and key set """
+
+    cache_key = (model, keys)
+    plan = _PLANS.get(cache_key)
+    if plan is None:
+        if len(_PLANS) >= PLAN_CACHE_SIZE:
+            _PLANS.clear()
+        _LOGGER.debug("Compiling parse plan for %s: %s", model, keys)
+        plan = _PLANS[cache_key] = ParsePlan(keys)
+    return plan
+
+def parse_payload(post):
+    """ parse a posted form into a StationReading """
+
+    return compile_plan(post.get("model"), tuple(post)).parse(post)
+
+FORM_CONTENT_TYPE = "application/x-www-form-urlencoded"
+FORM_CHARSETS = (None, "utf-8", "us-ascii", "ascii")
+
+_WANTED = {key.encode("ascii"): key for key in INDEX}
+
+def scan_body(body: bytes):
+    """ decode only the schema fields of an urlencoded body
+
+    Equivalent to the first value per key of parse_qsl (as used by
+    aiohttp's request.post()) restricted to the schema keys. Keys are
+    matched as bytes, so no strings are built for anything else. Returns
+    None for bodies that are not plain ASCII so the caller can fall back
+    to request.post().
+    """
+
+    body = body.rstrip()
+    if not body.isascii():
+        return None
+
+    wanted = _WANTED
+    fields = {}
+    for field in body.split(b"&"):
+        raw, _, value = field.partition(b"=")
+        key = wanted.get(raw)
+        if key is None:
+            if b"%" not in raw and b"+" not in raw:
+                continue
+            key = unquote_plus(raw.decode("ascii"))
+            if key not in INDEX:
+                continue
+
+        if key in fields:
+            continue
+
+        value = value.decode("ascii")
+        if "%" in value or "+" in value:
+            value = unquote_plus(value)
+        fields[key] = value
+
+    return fields
+
+async def async_read_post(request):
+    """ schema fields of a push, scanning the raw body when possible """
+
+    if request.content_type == FORM_CONTENT_TYPE and request.charset in FORM_CHARSETS:
+        fields = scan_body(await request.read())
+        if fields is not None:
+            return fields
+
+    _LOGGER.debug("Falling back to form decoding for %s", request.content_type)
+    return await request.post()
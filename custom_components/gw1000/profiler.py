@@ -0,0 +1,236 @@
+""" On-demand profiling of push processing """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+import asyncio
+import cProfile
+import sys
+import tracemalloc
+from functools import wraps
+from time import perf_counter_ns
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+FORMAT_PSTATS = "pstats"
+FORMAT_COLLAPSED = "collapsed"
+FORMATS = (FORMAT_PSTATS, FORMAT_COLLAPSED)
+
+# Functions of the integration module that process a push, see __init__.py
+PROFILED = ("async_process_post", "async_process_results")
+
+TRACEMALLOC_FRAMES = 10
+TRACEMALLOC_TOP = 50
+
+# tracemalloc.reset_peak is new in Python 3.9
+_RESET_PEAK = hasattr(tracemalloc, "reset_peak")
+
+class StackProfiler(object):
+
+    """ Self time per call stack, for flame graphs
+
+    Installed with sys.setprofile while a push is processed; each return
+    charges the time spent in the function itself (not in its callees)
+    to the whole stack that led to it.
+    """
+
+    def __init__(self):
+        self.stacks = {}
+        self._frames = []
+
+    def _profile(self, frame, event, arg):
+        now = perf_counter_ns()
+        if event == "call" or event == "c_call":
+            if event == "call":
+                code = frame.f_code
+                name = "{} ({}:{})".format(code.co_name, code.co_filename, code.co_firstlineno)
+            else:
+                name = "{}.{}".format(getattr(arg, "__module__", None) or "builtins", arg.__name__)
+            parent = self._frames[-1][0] if self._frames else ()
+            self._frames.append([parent + (name,), now, 0])
+        elif self._frames:
+            stack, start, children = self._frames.pop()
+            total = now - start
+            self.stacks[stack] = self.stacks.get(stack, 0) + total - children
+            if self._frames:
+                self._frames[-1][2] += total
+
+    def enable(self):
+        self._frames = []
+        sys.setprofile(self._profile)
+
+    def disable(self):
+        sys.setprofile(None)
+        self._frames = []
+
+    def dump(self, path):
+        """ write 'frame;frame;frame microseconds' lines """
+        with open(path, "w") as output:
+            for stack, nanoseconds in sorted(self.stacks.items()):
+                micro = nanoseconds // 1000
+                if micro:
+                    output.write("{} {}\n".format(";".join(stack), micro))
+
+class PushProfiler(object):
+
+    """ Profile the next pushes (or seconds) processed by the integration
+
+    Starting swaps the push processing functions of the integration
+    module for profiled wrappers and stopping puts the originals back, so
+    nothing is checked per push while no profile runs. The profile
+    covers parsing, enrichment and the in-line (callback) entity
+    handlers of every push; coroutine handlers run later as tasks and
+    are not included. With trace_malloc, the memory allocated
+    and retained per push is recorded, and the allocation sites that
+    grew over the profile are written next to the profile.
+    """
+
+    def __init__(self, hass, module, prefix, fmt=FORMAT_PSTATS, pushes=0, seconds=0, trace_malloc=False):
+        self._hass = hass
+        self._module = module
+        self._prefix = prefix
+        self._format = fmt
+        self._limit = pushes
+        self._seconds = seconds
+        self._trace_malloc = trace_malloc
+        self._started_tracing = False
+        self._originals = {}
+        self._depth = 0
+        self._unsub_timer = None
+        self._stop = None
+        self._snapshot = None
+        self._retained = None
+        self._lock = asyncio.Lock()
+        self.profile = cProfile.Profile() if fmt == FORMAT_PSTATS else StackProfiler()
+        self.pushes = 0
+        self.allocations = []
+        self.files = []
+
+    @property
+    def running(self):
+        return bool(self._originals)
+
+    @callback
+    def async_start(self):
+        """ install the profiled functions """
+
+        if self._trace_malloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracing = True
+            self._snapshot = tracemalloc.take_snapshot()
+
+        for name in PROFILED:
+            original = self._originals[name] = getattr(self._module, name)
+            setattr(self._module, name, self._wrap(original))
+
+        if self._seconds:
+            self._unsub_timer = async_call_later(self._hass, self._seconds, self._async_timeout)
+        _LOGGER.info("Profiling %s", "{} pushes".format(self._limit) if self._limit else (
+            "{} seconds".format(self._seconds) if self._seconds else "until stopped"
+        ))
+
+    def _wrap(self, original):
+        profiler = self
+
+        @wraps(original)
+        def _profiled(*args, **kwargs):
+            # processing a push calls the other profiled function
+            if profiler._depth:
+                return original(*args, **kwargs)
+            profiler._depth += 1
+            try:
+                if profiler._trace_malloc:
+                    before = tracemalloc.get_traced_memory()[0]
+                    if _RESET_PEAK:
+                        tracemalloc.reset_peak()
+                profiler.profile.enable()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    profiler.profile.disable()
+                    if profiler._trace_malloc:
+                        current, peak = tracemalloc.get_traced_memory()
+                        # before 3.9 the peak cannot be reset per push
+                        peak = peak if _RESET_PEAK else max(current, before)
+                        profiler.allocations.append((current - before, peak - before))
+            finally:
+                profiler._depth -= 1
+                profiler.pushes += 1
+                if profiler._limit and profiler.pushes >= profiler._limit:
+                    profiler._async_finish()
+
+        return _profiled
+
+    @callback
+    def _async_timeout(self, now):
+        self._unsub_timer = None
+        self._async_finish()
+
+    @callback
+    def _async_finish(self):
+        """ stop profiling now, write the output in the background """
+        self._async_uninstall()
+        if self._stop is None:
+            self._stop = self._hass.async_create_task(self.async_stop())
+
+    @callback
+    def _async_uninstall(self):
+        if not self._originals:
+            return
+        for name, original in self._originals.items():
+            setattr(self._module, name, original)
+        self._originals = {}
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+
+        if self._trace_malloc:
+            # without the profiler's own bookkeeping
+            ignore = (tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__))
+            self._retained = tracemalloc.take_snapshot().filter_traces(ignore).compare_to(
+                self._snapshot.filter_traces(ignore), "lineno"
+            )
+            self._snapshot = None
+            if self._started_tracing:
+                tracemalloc.stop()
+
+    async def async_stop(self):
+        """ put the originals back and write the output files """
+
+        self._async_uninstall()
+        async with self._lock:
+            if not self.files:
+                self.files = await self._hass.async_add_executor_job(self._write, self._retained)
+                _LOGGER.info("Profiled %s pushes, wrote %s", self.pushes, ", ".join(self.files))
+        return self.files
+
+    def _write(self, retained):
+        files = []
+        if self._format == FORMAT_PSTATS:
+            path = self._prefix + ".pstats"
+            self.profile.dump_stats(path)
+        else:
+            path = self._prefix + ".collapsed"
+            self.profile.dump(path)
+        files.append(path)
+
+        if retained is not None:
+            path = self._prefix + ".tracemalloc.txt"
+            with open(path, "w") as output:
+                count = len(self.allocations)
+                if count:
+                    output.write("pushes {} allocated per push mean {} max {}, peak per push mean {} max {}\n\n".format(
+                        count,
+                        sum(net for net, _ in self.allocations) // count,
+                        max(net for net, _ in self.allocations),
+                        sum(peak for _, peak in self.allocations) // count,
+                        max(peak for _, peak in self.allocations),
+                    ))
+                for stat in retained[:TRACEMALLOC_TOP]:
+                    output.write("{}\n".format(stat))
+            files.append(path)
+        return files
@@ -0,0 +1,263 @@
+""" State write filtering and scheduling """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+from datetime import timedelta
+from math import atan2, cos, degrees, radians, sin
+from time import monotonic, perf_counter
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    DATA_SCHEDULER,
+    DATA_METRICS,
+)
+
+class PublishFilter(object):
+
+    """ Decide whether a new value is worth a state write
+
+    A value is published when it is the first one, when the heartbeat has
+    elapsed since the last write, or when it differs from the last
+    published value by more than the deadband and min_interval has passed.
+    """
+
+    __slots__ = (
+        "absolute", "relative", "min_interval", "heartbeat",
+        "published", "suppressed", "_value", "_time",
+    )
+
+    def __init__(self, absolute=None, relative=None, min_interval=0, heartbeat=0):
+        self.absolute = absolute or 0
+        self.relative = relative or 0
+        self.min_interval = min_interval or 0
+        self.heartbeat = heartbeat or 0
+        self.published = 0
+        self.suppressed = 0
+        self._value = None
+        self._time = None
+
+    def check(self, value, now=None):
+        """ return True (and remember value) if value should be written """
+
+        if now is None:
+            now = monotonic()
+
+        if self._time is not None and not self._changed(value, now):
+            self.suppressed += 1
+            return False
+
+        self._value = value
+        self._time = now
+        self.published += 1
+        return True
+
+    def _changed(self, value, now):
+        elapsed = now - self._time
+        if self.heartbeat and elapsed >= self.heartbeat:
+            return True
+
+        last = self._value
+        if value == last:
+            return False
+
+        if elapsed < self.min_interval:
+            return False
+
+        if value is None or last is None or isinstance(value, (str, tuple)):
+            return True
+
+        delta = abs(value - last)
+        if delta < self.absolute:
+            return False
+        if delta < self.relative * abs(last):
+            return False
+        return True
+
+    @property
+    def attributes(self):
+        """ counters for entity state attributes """
+        return {"published_writes": self.published, "suppressed_writes": self.suppressed}
+
+class WindowAggregate(object):
+
+    """ Mean, min and max of the values seen over a time window
+
+    add returns None while the window is open; the first value at or past
+    its end closes it, returning the aggregate, and opens the next window
+    with that value. vector aggregates bearings in degrees: the mean is
+    the direction of the summed unit vectors, min and max are not kept.
+    """
+
+    __slots__ = (
+        "window", "vector", "count", "_start", "_sum", "_min", "_max",
+        "_sin", "_cos", "last",
+    )
+
+    def __init__(self, window, vector=False):
+        self.window = window
+        self.vector = vector
+        self.count = 0
+        self._start = None
+        self.last = None
+
+    def add(self, value, now=None):
+        """ add a value, return the closed window's aggregate if any """
+
+        if now is None:
+            now = monotonic()
+
+        closed = None
+        if self._start is not None and now - self._start >= self.window:
+            closed = self.last = self._aggregate()
+            self._start = None
+
+        if self._start is None:
+            self._start = now
+            self.count = 0
+            self._sum = self._sin = self._cos = 0.0
+            self._min = self._max = value
+
+        self.count += 1
+        if self.vector:
+            angle = radians(value)
+            self._sin += sin(angle)
+            self._cos += cos(angle)
+        else:
+            self._sum += value
+            if value < self._min:
+                self._min = value
+            elif value > self._max:
+                self._max = value
+        return closed
+
+    def _aggregate(self):
+        if self.vector:
+            if not self._sin and not self._cos:
+                return {"mean": None, "count": self.count}
+            return {
+                "mean": round(degrees(atan2(self._sin, self._cos))) % 360,
+                "count": self.count,
+            }
+        return {
+            "mean": round(self._sum / self.count, 2),
+            "min": self._min,
+            "max": self._max,
+            "count": self.count,
+        }
+
+    @property
+    def attributes(self):
+        """ the last closed window for entity state attributes """
+
+        if self.last is None:
+            return {}
+        attributes = {"window": self.window, "samples": self.last["count"]}
+        for key in ("mean", "min", "max"):
+            if key in self.last:
+                attributes[key] = self.last[key]
+        return attributes
+
+@callback
+def async_publish(hass, entity):
+    """ write an entity's state, through the scheduler when enabled """
+
+    scheduler = hass.data.get(DATA_SCHEDULER)
+    if scheduler is None:
+        entity.async_schedule_update_ha_state()
+    else:
+        scheduler.async_schedule(entity)
+
+class PublishScheduler(object):
+
+    """ Coalesce entity state writes into one batch per tick
+
+    Entities marked dirty between ticks are written once, in the order
+    they were marked. With max_writes set, each tick writes at most that
+    many and carries the rest over, spreading large bursts across ticks.
+    Tick latency is measured from the oldest pending mark, so entities
+    carried over keep counting from when they were first marked.
+    """
+
+    def __init__(self, hass, interval, max_writes=0):
+        self._hass = hass
+        # entity_id: (entity, monotonic time first marked)
+        self._dirty = {}
+        self._max_writes = max_writes
+        self.ticks = 0
+        self.writes = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._unsub = async_track_time_interval(
+            hass, self._async_tick, timedelta(seconds=interval)
+        )
+
+    @callback
+    def async_schedule(self, entity):
+        """ mark an entity for the next tick """
+
+        dirty = self._dirty
+        pending = dirty.get(entity.entity_id)
+        dirty[entity.entity_id] = (entity, monotonic() if pending is None else pending[1])
+        if len(dirty) > self.max_depth:
+            self.max_depth = len(dirty)
+
+    @callback
+    def async_stop(self):
+        """ stop ticking, pending writes are flushed """
+
+        self._max_writes = 0
+        self._async_tick(None)
+        self._unsub()
+
+    @callback
+    def _async_tick(self, now):
+        dirty = self._dirty
+        if not dirty:
+            return
+
+        self.ticks += 1
+        # marks are kept in order, the first is the oldest
+        latency = self.last_latency = monotonic() - next(iter(dirty.values()))[1]
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+        if self._max_writes and len(dirty) > self._max_writes:
+            batch = [dirty.pop(entity_id)[0] for entity_id in list(dirty)[:self._max_writes]]
+        else:
+            batch = [entity for entity, _ in dirty.values()]
+            dirty.clear()
+
+        start = perf_counter()
+        for entity in batch:
+            if entity.hass is None:
+                continue
+            try:
+                entity.async_write_ha_state()
+                self.writes += 1
+            except Exception:  # pylint: disable=broad-except
+                self.errors += 1
+                _LOGGER.exception("Error writing state of %s", entity.entity_id)
+
+        metrics = self._hass.data.get(DATA_METRICS)
+        if metrics is not None:
+            metrics.observe("write", perf_counter() - start)
+
+    @property
+    def counters(self):
+        """ queue depth, tick latency and write counts """
+        return {
+            "queue_depth": len(self._dirty),
+            "max_queue_depth": self.max_depth,
+            "last_tick_latency": self.last_latency,
+            "max_tick_latency": self.max_latency,
+            "ticks": self.ticks,
+            "writes": self.writes,
+            "errors": self.errors,
+        }
@@ -0,0 +1,253 @@
+""" Fixed layout station readings """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+class FieldLayout(object):
+
+    """ Offsets of every (group, channel, part) in a reading's values
+
+    Fields are registered at import time by the modules that produce
+    them, so every reading built afterwards has room for all of them.
+    The channels of a channel field are laid out next to each other, so
+    their values form one contiguous slice. units holds the units of each
+    field; a group's units are only what its mapping view reports.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.units = []
+        self._group_units = {}
+        self._offsets = {}
+        self._channels = {}
+        self._parts = {}
+
+    def add(self, group, part, units=None, channels=None):
+        """ register a field (one per channel) in units, returns its first
+        offset """
+
+        if channels is None:
+            key = (group, None, part)
+            if key not in self._offsets:
+                self._offsets[key] = self.size
+                self._parts.setdefault((group, None), []).append(part)
+                self._grow(units)
+            return self._offsets[key]
+
+        channels = [format(channel) for channel in channels]
+        known = self._channels.get((group, part))
+        if known is not None:
+            if [channel for channel, _ in known] != channels:
+                raise ValueError("{} {} registered with other channels".format(group, part))
+            return known[0][1]
+
+        first = self.size
+        self._channels[(group, part)] = tuple(
+            (channel, first + i) for i, channel in enumerate(channels)
+        )
+        for channel in channels:
+            self._offsets[(group, channel, part)] = self.size
+            self._parts.setdefault((group, channel), []).append(part)
+            self._grow(units)
+        return first
+
+    def _grow(self, units):
+        self.units.append(units)
+        self.size += 1
+
+    def set_group_units(self, group, units):
+        """ units reported as results[group]["units"] """
+        self._group_units[group] = units
+
+    def offset(self, group, part, channel=None):
+        """ offset of a field, None if it is not registered """
+        return self._offsets.get((group, channel, part))
+
+    def channel_offsets(self, group, part):
+        """ (channel, offset) of a channel field, in channel order """
+        return self._channels.get((group, part), ())
+
+    def parts(self, group, channel=None):
+        """ registered parts of a group or one of its channels """
+        return self._parts.get((group, channel), ())
+
+    def group_units(self, group):
+        return self._group_units.get(group)
+
+LAYOUT = FieldLayout()
+
+# Top level push fields, kept as attributes
+TOP_LEVEL = ("key", "stationtype", "dateutc", "freq", "model")
+
+class StationReading(object):
+
+    """ One parsed push: top level fields and a flat list of values
+
+    values holds every registered field at its LAYOUT offset, None when
+    the push did not carry it; groups maps the groups present in the push
+    to their channels. Entities bind to offsets once and index values,
+    the mapping interface (results["outdoor"]["temperature"]) is a view
+    over the same list for code that walks groups.
+    """
+
+    __slots__ = TOP_LEVEL + ("values", "groups", "extras")
+
+    def __init__(self, groups, values=None):
+        self.key = None
+        self.stationtype = None
+        self.dateutc = None
+        self.freq = None
+        self.model = None
+        self.values = [None] * LAYOUT.size if values is None else values
+        self.groups = groups
+        self.extras = None
+
+    def value(self, offset):
+        """ value at a LAYOUT offset """
+        return self.values[offset]
+
+    def get(self, name, default=None):
+        if name in self.groups:
+            return GroupView(self, name)
+        if name in TOP_LEVEL:
+            return getattr(self, name)
+        if self.extras is not None:
+            return self.extras.get(name, default)
+        return default
+
+    def __getitem__(self, name):
+        value = self.get(name, KeyError)
+        if value is KeyError:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name):
+        return self.get(name, KeyError) is not KeyError
+
+    def __setitem__(self, name, value):
+        if name in TOP_LEVEL:
+            setattr(self, name, value)
+        elif name in self.groups:
+            raise TypeError("groups of a reading cannot be replaced")
+        else:
+            if self.extras is None:
+                self.extras = {}
+            self.extras[name] = value
+
+    def as_dict(self):
+        """ the nested dict form of this reading """
+
+        results = {name: getattr(self, name) for name in TOP_LEVEL}
+        for group in self.groups:
+            results[group] = GroupView(self, group).as_dict()
+        if self.extras:
+            results.update(self.extras)
+        return results
+
+    def __repr__(self):
+        return "StationReading({!r})".format(self.as_dict())
+
+class GroupView(object):
+
+    """ Mapping view of one group of a reading """
+
+    __slots__ = ("_reading", "_group")
+
+    def __init__(self, reading, group):
+        self._reading = reading
+        self._group = group
+
+    def get(self, part, default=None):
+        if part == "units":
+            return LAYOUT.group_units(self._group)
+        if part in self._reading.groups[self._group]:
+            return ChannelView(self._reading, self._group, part)
+        offset = LAYOUT.offset(self._group, part)
+        if offset is None:
+            return default
+        value = self._reading.values[offset]
+        return default if value is None else value
+
+    def __getitem__(self, part):
+        value = self.get(part, KeyError)
+        if value is KeyError:
+            if LAYOUT.offset(self._group, part) is not None:
+                return None
+            raise KeyError(part)
+        return value
+
+    def __contains__(self, part):
+        return self.get(part) is not None
+
+    def __setitem__(self, part, value):
+        offset = LAYOUT.offset(self._group, part)
+        if offset is None:
+            raise KeyError("{} {} has no field offset".format(self._group, part))
+        self._reading.values[offset] = value
+
+    def items(self):
+        yield "units", LAYOUT.group_units(self._group)
+        for channel in self._reading.groups[self._group]:
+            yield channel, ChannelView(self._reading, self._group, channel)
+        values = self._reading.values
+        for part in LAYOUT.parts(self._group):
+            value = values[LAYOUT.offset(self._group, part)]
+            if value is not None:
+                yield part, value
+
+    def keys(self):
+        return [key for key, _ in self.items()]
+
+    def as_dict(self):
+        return {
+            key: value.as_dict() if isinstance(value, ChannelView) else value
+            for key, value in self.items()
+        }
+
+class ChannelView(object):
+
+    """ Mapping view of one channel of a group """
+
+    __slots__ = ("_reading", "_group", "_channel")
+
+    def __init__(self, reading, group, channel):
+        self._reading = reading
+        self._group = group
+        self._channel = channel
+
+    def get(self, part, default=None):
+        if part == "id":
+            return int(self._channel)
+        offset = LAYOUT.offset(self._group, part, self._channel)
+        if offset is None:
+            return default
+        value = self._reading.values[offset]
+        return default if value is None else value
+
+    def __getitem__(self, part):
+        value = self.get(part)
+        if value is None and part != "id" and LAYOUT.offset(self._group, part, self._channel) is None:
+            raise KeyError(part)
+        return value
+
+    def __contains__(self, part):
+        return self.get(part) is not None
+
+    def __setitem__(self, part, value):
+        offset = LAYOUT.offset(self._group, part, self._channel)
+        if offset is None:
+            raise KeyError("{} {} {} has no field offset".format(self._group, self._channel, part))
+        self._reading.values[offset] = value
+
+    def items(self):
+        yield "id", int(self._channel)
+        values = self._reading.values
+        for part in LAYOUT.parts(self._group, self._channel):
+            value = values[LAYOUT.offset(self._group, part, self._channel)]
+            if value is not None:
+                yield part, value
+
+    def as_dict(self):
+        return dict(self.items())
@@ -0,0 +1,176 @@
+""" Raw push recording """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+import asyncio
+import mmap
+import os
+import struct
+from datetime import timedelta
+from time import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
+
+# File magic, then records of: arrival (unix time), body size, body
+MAGIC = b"GW1000R1"
+RECORD = struct.Struct("<dI")
+
+DEFAULT_MAX_SIZE = 64
+DEFAULT_BACKUPS = 3
+FLUSH_INTERVAL = 5
+FLUSH_SIZE = 256 * 1024
+
+class PushRecorder(object):
+
+    """ Append raw push bodies to a size capped, rotating log
+
+    Records are buffered in memory and written by an executor job every
+    FLUSH_INTERVAL seconds, or sooner once FLUSH_SIZE bytes are pending.
+    When a file would grow past max_size bytes it is rotated to .1, .2 ...
+    keeping backups old files.
+    """
+
+    def __init__(self, hass, path, max_size=DEFAULT_MAX_SIZE * 1024 * 1024, backups=DEFAULT_BACKUPS):
+        self._hass = hass
+        self._path = path
+        self._max_size = max_size
+        self._backups = backups
+        self._buffer = bytearray()
+        self._lock = asyncio.Lock()
+        self._flush = None
+        self._unsub = async_track_time_interval(
+            hass, self._async_tick, timedelta(seconds=FLUSH_INTERVAL)
+        )
+        self.records = 0
+        self.written = 0
+        self.rotations = 0
+        self.errors = 0
+
+    @callback
+    def async_record(self, body: bytes, arrival=None):
+        """ buffer one push body """
+
+        buffer = self._buffer
+        buffer += RECORD.pack(time() if arrival is None else arrival, len(body))
+        buffer += body
+        self.records += 1
+        if len(buffer) >= FLUSH_SIZE:
+            self._async_schedule_flush()
+
+    @callback
+    def _async_tick(self, now):
+        if self._buffer:
+            self._async_schedule_flush()
+
+    @callback
+    def _async_schedule_flush(self):
+        if self._flush is None:
+            self._flush = self._hass.async_create_task(self._async_flush_scheduled())
+
+    async def _async_flush_scheduled(self):
+        try:
+            await self.async_flush()
+        finally:
+            self._flush = None
+
+    async def async_flush(self):
+        """ write pending records """
+
+        async with self._lock:
+            if not self._buffer:
+                return
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            try:
+                rotated = await self._hass.async_add_executor_job(self._write, data)
+                self.written += len(data)
+                self.rotations += rotated
+            except OSError as err:
+                self.errors += 1
+                _LOGGER.error("Unable to write push recording %s: %s", self._path, err)
+
+    async def async_stop(self):
+        """ stop the flush timer and write what is pending """
+        self._unsub()
+        await self.async_flush()
+
+    def _write(self, data):
+        rotated = 0
+        try:
+            size = os.path.getsize(self._path)
+        except OSError:
+            size = 0
+        if size and size + len(data) > self._max_size:
+            self._rotate()
+            size = 0
+            rotated = 1
+
+        with open(self._path, "ab") as output:
+            if not size:
+                output.write(MAGIC)
+            output.write(data)
+        return rotated
+
+    def _rotate(self):
+        for i in range(self._backups - 1, 0, -1):
+            older = "{}.{}".format(self._path, i)
+            if os.path.exists(older):
+                os.replace(older, "{}.{}".format(self._path, i + 1))
+        if self._backups:
+            os.replace(self._path, self._path + ".1")
+        else:
+            os.remove(self._path)
+
+    @property
+    def counters(self):
+        """ record, byte and rotation counts """
+        return {
+            "records": self.records,
+            "pending_bytes": len(self._buffer),
+            "written_bytes": self.written,
+            "rotations": self.rotations,
+            "errors": self.errors,
+        }
+
+def recording_files(path):
+    """ a recording and its rotated backups, oldest first """
+
+    files = []
+    i = 1
+    while os.path.exists("{}.{}".format(path, i)):
+        files.append("{}.{}".format(path, i))
+        i += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+def read_records(path):
+    """ yield (arrival, body) from a recording file, memory mapped
+
+    A record cut short by a crash mid-write ends the file.
+    """
+
+    with open(path, "rb") as source:
+        if os.fstat(source.fileno()).st_size < len(MAGIC):
+            return
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError("{} is not a push recording".format(path))
+
+            header = RECORD.size
+            unpack = RECORD.unpack_from
+            offset = len(MAGIC)
+            end = len(data)
+            while offset + header <= end:
+                arrival, size = unpack(data, offset)
+                offset += header
+                if offset + size > end:
+                    _LOGGER.warning("Truncated record at %s in %s", offset - header, path)
+                    return
+                yield arrival, data[offset:offset + size]
+                offset += size
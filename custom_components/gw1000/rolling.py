@@ -0,0 +1,216 @@
+""" Rolling window statistics over recent pushes """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+from array import array
+from collections import deque
+from time import time
+
+from .dedupe import parse_dateutc
+
+from .payload import field_units
+
+from .reading import LAYOUT
+
+NAN = float("nan")
+
+# Window name, span in seconds
+WINDOWS = (
+    ("10m", 600),
+    ("1h", 3600),
+    ("24h", 86400),
+)
+
+# Tracked fields: group, part
+ROLLING_FIELDS = (
+    ("outdoor", "temperature"),
+    ("outdoor", "humidity"),
+    ("pressure", "relative"),
+    ("wind", "speed"),
+    ("wind", "gust"),
+    ("solar", "radiation"),
+)
+
+# 24h of pushes at the gateway's 16s minimum interval. A ring about to
+# drop a sample still inside the longest window (faster pushes, LAN
+# polls) doubles, up to HISTORY_GROWTH times its configured size
+DEFAULT_HISTORY_SIZE = 5400
+HISTORY_GROWTH = 4
+
+def _register(fields, windows):
+    """ value offsets of the min/max/mean/change outputs per field/window """
+    return [
+        [
+            tuple(
+                LAYOUT.add(group, "{}_{}_{}".format(part, stat, name), field_units(group, part))
+                for stat in ("min", "max", "mean", "change")
+            )
+            for name, _ in windows
+        ]
+        for group, part in fields
+    ]
+
+_register(ROLLING_FIELDS, WINDOWS)
+
+class _Window(object):
+
+    """ Running sum and monotonic min/max queues of one field/window """
+
+    __slots__ = ("span", "start", "total", "count", "mins", "maxs", "offsets")
+
+    def __init__(self, span, offsets):
+        self.span = span
+        self.start = 0
+        self.total = 0.0
+        self.count = 0
+        self.mins = deque()
+        self.maxs = deque()
+        self.offsets = offsets
+
+class StationHistory(object):
+
+    """ Fixed size ring buffer of one station's readings
+
+    Times and each tracked field live in their own array('d') column,
+    missing values are stored as NaN. Every window keeps the sequence
+    number of its oldest sample, a running sum and count for the mean and
+    monotonic deques for min/max, so a push costs O(1) amortized per
+    field and window. The ring grows when the pushes come faster than
+    its size allows for the longest window; past max_size the longest
+    windows are truncated, which is logged once.
+    """
+
+    def __init__(self, size=DEFAULT_HISTORY_SIZE, fields=ROLLING_FIELDS, windows=WINDOWS,
+                 max_size=None, station=None):
+        self._size = size
+        self._max_size = size * HISTORY_GROWTH if max_size is None else max_size
+        self._span = max(span for _, span in windows)
+        self._station = station
+        self._truncated = False
+        self._seq = 0
+        self._fields = [(group, LAYOUT.offset(group, part)) for group, part in fields]
+        self._times = array("d", bytes(8 * size))
+        self._columns = [array("d", bytes(8 * size)) for _ in fields]
+        self._windows = [
+            [
+                _Window(span, offsets)
+                for (_, span), offsets in zip(windows, field_offsets)
+            ]
+            for field_offsets in _register(fields, windows)
+        ]
+
+    def add(self, timestamp, reading):
+        """ record a push and store the window stats in the reading """
+
+        seq = self._seq
+        if seq >= self._size and self._times[seq % self._size] > timestamp - self._span:
+            # the sample about to be overwritten is still in the longest window
+            if self._size < self._max_size:
+                self._grow(min(self._size * 2, self._max_size))
+            elif not self._truncated:
+                self._truncated = True
+                _LOGGER.warning(
+                    "Station %s history of %s pushes covers %ss of the %ss window, increase history_size",
+                    self._station, self._size, int(timestamp - self._times[seq % self._size]), self._span,
+                )
+
+        size = self._size
+        slot = seq % size
+        times = self._times
+        oldest = max(seq - size + 1, 0)
+        groups = reading.groups
+        values = reading.values
+
+        for (group, offset), column, windows in zip(self._fields, self._columns, self._windows):
+            value = values[offset]
+            value = NAN if value is None else float(value)
+
+            for window in windows:
+                # expire samples that left the window or the ring
+                cutoff = timestamp - window.span
+                start = window.start
+                mins = window.mins
+                maxs = window.maxs
+                while start < seq and (start < oldest or times[start % size] <= cutoff):
+                    old = column[start % size]
+                    if old == old:
+                        window.total -= old
+                        window.count -= 1
+                        if mins[0] == start:
+                            mins.popleft()
+                        if maxs[0] == start:
+                            maxs.popleft()
+                    start += 1
+                window.start = start
+                if not window.count:
+                    window.total = 0.0
+
+                if value == value:
+                    window.total += value
+                    window.count += 1
+                    while mins and column[mins[-1] % size] >= value:
+                        mins.pop()
+                    mins.append(seq)
+                    while maxs and column[maxs[-1] % size] <= value:
+                        maxs.pop()
+                    maxs.append(seq)
+
+            # written after expiry, the slot may still hold the oldest sample
+            column[slot] = value
+            if group not in groups:
+                continue
+
+            for window in windows:
+                min_offset, max_offset, mean_offset, change_offset = window.offsets
+                if window.count:
+                    values[min_offset] = column[window.mins[0] % size]
+                    values[max_offset] = column[window.maxs[0] % size]
+                    values[mean_offset] = window.total / window.count
+                    first = column[window.start % size]
+                    values[change_offset] = value - first if value == value and first == first else None
+                else:
+                    values[min_offset] = values[max_offset] = values[mean_offset] = values[change_offset] = None
+
+        times[slot] = timestamp
+        self._seq = seq + 1
+
+    def _grow(self, size):
+        """ re-lay the ring out for a larger size, sequence numbers stay """
+
+        old_size = self._size
+        held = range(max(self._seq - old_size, 0), self._seq)
+        columns = []
+        for column in [self._times] + self._columns:
+            grown = array("d", bytes(8 * size))
+            for seq in held:
+                grown[seq % size] = column[seq % old_size]
+            columns.append(grown)
+        self._times = columns[0]
+        self._columns = columns[1:]
+        self._size = size
+        _LOGGER.debug("Station %s history grown to %s pushes", self._station, size)
+
+class RollingHistory(object):
+
+    """ Per station histories, keyed by PASSKEY """
+
+    def __init__(self, size=DEFAULT_HISTORY_SIZE):
+        self._size = size
+        self._stations = {}
+
+    def update(self, reading):
+        """ add a parsed push, annotating it with window stats """
+
+        station = reading.key
+        history = self._stations.get(station)
+        if history is None:
+            history = self._stations[station] = StationHistory(self._size, station=station)
+
+        timestamp = parse_dateutc(reading.dateutc)
+        if timestamp is None:
+            timestamp = time()
+
+        history.add(timestamp, reading)
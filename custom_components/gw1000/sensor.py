@@ -5,6 +5,8 @@ import logging
 _LOGGER = logging.getLogger(__name__)
 _LOGGER.debug("Loading...")
 
+from time import time
+
 import voluptuous as vol
 
 import homeassistant.helpers.config_validation as cv
@@ -24,7 +26,7 @@ from homeassistant.const import (
 )
 from homeassistant.core import callback
 
-from homeassistant.helpers.entity import Entity, generate_entity_id
+from homeassistant.helpers.entity import Entity, async_generate_entity_id
 
 from homeassistant.helpers.icon import icon_for_battery_level
 
@@ -36,10 +38,42 @@ from .const import (
     LIGHT_LUX,
     SPEED_MILES,
     SPEED_KILOMETERS,
+    DENSITY_GRAMS,
+    CONCENTRATION_MICROGRAMS,
+    CONCENTRATION_PPM,
+    CONF_DEADBAND,
+    CONF_ABSOLUTE,
+    CONF_RELATIVE,
+    CONF_MIN_INTERVAL,
+    CONF_HEARTBEAT,
+    CONF_STATION,
+    CONF_DISCOVERY,
+    CONF_RETIRE_AFTER,
+    CONF_DOWNSAMPLE,
+    DATA_SNAPSHOT,
+    DATA_WATCHDOG,
+)
+
+from . import (
+    GW1000EntityFactory
 )
 
 from .conversions import (
-    CONVERT
+    conversion
+)
+
+from .payload import (
+    GROUP_UNITS
+)
+
+from .reading import (
+    LAYOUT
+)
+
+from .publish import (
+    PublishFilter,
+    WindowAggregate,
+    async_publish,
 )
 
 DEPENDENCIES = ['gw1000']
@@ -66,76 +100,327 @@ SENSOR_TYPES = {
     "rainmonthly": ("Monthly Rain", LENGTH_INCHES, None, "weather-rainy", "rain", "monthly"),
     "rainyearly": ("Yearly Rain", LENGTH_INCHES, None, "weather-rainy", "rain", "yearly"),
     "raintotal": ("Total Rain", LENGTH_INCHES, None, "weather-rainy", "rain", "total"),
+    "dewpoint": ("Dew Point", TEMP_FAHRENHEIT, "temperature", "thermometer-water", "outdoor", "dewpoint"),
+    "dewpoint_in": ("Indoor Dew Point", TEMP_FAHRENHEIT, "temperature", "thermometer-water", "indoor", "dewpoint"),
+    "heatindex": ("Heat Index", TEMP_FAHRENHEIT, "temperature", "thermometer", "outdoor", "heatindex"),
+    "windchill": ("Wind Chill", TEMP_FAHRENHEIT, "temperature", "thermometer", "outdoor", "windchill"),
+    "feelslike": ("Feels Like", TEMP_FAHRENHEIT, "temperature", "thermometer", "outdoor", "feelslike"),
+    "abs_humidity": ("Absolute Humidity", DENSITY_GRAMS, None, "water", "outdoor", "absolute_humidity"),
 }
 
+DEFAULT_SENSOR_TYPES = list(SENSOR_TYPES)
+
+# Optional rolling window sensors, see rolling.py
+SENSOR_TYPES.update({
+    "temp_min_24h": ("Temperature Min 24h", TEMP_FAHRENHEIT, "temperature", "thermometer", "outdoor", "temperature_min_24h"),
+    "temp_max_24h": ("Temperature Max 24h", TEMP_FAHRENHEIT, "temperature", "thermometer", "outdoor", "temperature_max_24h"),
+    "temp_mean_1h": ("Temperature Mean 1h", TEMP_FAHRENHEIT, "temperature", "thermometer", "outdoor", "temperature_mean_1h"),
+    "pressure_change_1h": ("Pressure Change 1h", PRESSURE_INHG, None, "gauge", "pressure", "relative_change_1h"),
+    "windspeed_mean_10m": ("Wind Speed Mean 10m", SPEED_MILES, None, "weather-windy", "wind", "speed_mean_10m"),
+    "windgust_max_10m": ("Wind Gust Max 10m", SPEED_MILES, None, "weather-windy", "wind", "gust_max_10m"),
+    "windgust_max_1h": ("Wind Gust Max 1h", SPEED_MILES, None, "weather-windy", "wind", "gust_max_1h"),
+    "solarradiation_max_1h": ("Solar Rad Max 1h", LIGHT_LUX, "illuminance", "weather-sunny", "solar", "radiation_max_1h"),
+})
+
+# Optional pipeline diagnostics, requires metrics: true, see metrics.py
+SENSOR_TYPES.update({
+    "push_rate": ("Push Rate", "pushes/s", None, "speedometer", "metrics", "pushes_per_second"),
+    "push_interval": ("Push Interval", "s", None, "timer", "metrics", "push_interval"),
+    "parse_time": ("Parse Time", "ms", None, "timer", "metrics", "parse_time"),
+    "dispatch_time": ("Dispatch Time", "ms", None, "timer", "metrics", "dispatch_time"),
+    "handler_errors": ("Handler Errors", "errors", None, "alert-circle", "metrics", "handler_errors"),
+})
+
+# Optional WH45 sensors
+SENSOR_TYPES.update({
+    "co2": ("CO2", CONCENTRATION_PPM, None, "molecule-co2", "co2", "co2"),
+    "co2_avg_24h": ("CO2 24h Avg", CONCENTRATION_PPM, None, "molecule-co2", "co2", "co2_avg_24h"),
+    "pm10_co2": ("PM10", CONCENTRATION_MICROGRAMS, None, "blur", "co2", "pm10"),
+    "pm25_co2": ("PM2.5", CONCENTRATION_MICROGRAMS, None, "blur", "co2", "pm25"),
+    "temp_co2": ("CO2 Sensor Temperature", TEMP_FAHRENHEIT, "temperature", "thermometer", "co2", "temperature"),
+    "humidity_co2": ("CO2 Sensor Humidity", "%", "humidity", "water-percent", "co2", "humidity"),
+})
+
+# Channel sensor types: Name, units, class, icon, key, part
+# one sensor per channel present in results[key]
+CHANNEL_SENSOR_TYPES = {
+    "temp_ch": ("Temperature {}", TEMP_FAHRENHEIT, "temperature", "thermometer", "temperature", "temperature"),
+    "humidity_ch": ("Humidity {}", "%", "humidity", "water-percent", "temperature", "humidity"),
+    "pm25_ch": ("PM2.5 {}", CONCENTRATION_MICROGRAMS, None, "blur", "air", "current"),
+    "pm25_avg_24h_ch": ("PM2.5 24h Avg {}", CONCENTRATION_MICROGRAMS, None, "blur", "air", "avg_24h"),
+    "pm25_battery_ch": ("PM2.5 Battery {}", "%", "battery", "battery", "air", "battery"),
+    "soilmoisture_ch": ("Soil Moisture {}", "%", "humidity", "water-percent", "soil", "moisture"),
+}
+
+ALL_SENSOR_TYPES = dict(SENSOR_TYPES, **CHANNEL_SENSOR_TYPES)
+
+# Bearings are downsampled to a vector mean
+VECTOR_SENSOR_TYPES = ("winddir",)
+
+DEFAULT_RETIRE_AFTER = 86400
+
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
         vol.Optional(
             CONF_ENTITY_NAMESPACE, default=DEFAULT_ENTITY_NAMESPACE
         ): cv.string,
         vol.Optional(CONF_WEBHOOK_ID): cv.string,
-        vol.Required(CONF_MONITORED_CONDITIONS, default=list(SENSOR_TYPES)): vol.All(
-            cv.ensure_list, [vol.In(SENSOR_TYPES)]
+        vol.Optional(CONF_STATION): cv.string,
+        vol.Optional(CONF_MONITORED_CONDITIONS): vol.All(
+            cv.ensure_list, [vol.In(ALL_SENSOR_TYPES)]
         ),
+        vol.Optional(CONF_DISCOVERY, default=True): cv.boolean,
+        vol.Optional(CONF_RETIRE_AFTER, default=DEFAULT_RETIRE_AFTER): cv.positive_int,
+        vol.Optional(CONF_DEADBAND, default={}): {
+            vol.In(ALL_SENSOR_TYPES): vol.Schema(
+                {
+                    vol.Optional(CONF_ABSOLUTE): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                    vol.Optional(CONF_RELATIVE): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                }
+            )
+        },
+        vol.Optional(CONF_MIN_INTERVAL, default=0): cv.positive_int,
+        vol.Optional(CONF_HEARTBEAT, default=0): cv.positive_int,
+        vol.Optional(CONF_DOWNSAMPLE, default={}): {
+            vol.In(ALL_SENSOR_TYPES): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        },
     }
 )
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the sensors."""
 
     _LOGGER.debug('Start')
 
     namespace = config.get(CONF_ENTITY_NAMESPACE)
     webhook_id = config.get(CONF_WEBHOOK_ID, namespace)
+    station = config.get(CONF_STATION)
 
     _LOGGER.debug("Initializing Sensor platform: namespace=%s webhook_id=%s", namespace, webhook_id)
 
+    deadbands = config[CONF_DEADBAND]
+    downsample = config[CONF_DOWNSAMPLE]
+
+    def publish_filter(sensor_type):
+        deadband = deadbands.get(sensor_type, {})
+        return PublishFilter(
+            deadband.get(CONF_ABSOLUTE),
+            deadband.get(CONF_RELATIVE),
+            config[CONF_MIN_INTERVAL],
+            config[CONF_HEARTBEAT],
+        )
+
+    def window(sensor_type):
+        if sensor_type not in downsample:
+            return None
+        return WindowAggregate(downsample[sensor_type], sensor_type in VECTOR_SENSOR_TYPES)
+
+    if config[CONF_DISCOVERY]:
+        GW1000SensorFactory(
+            hass, async_add_entities, namespace, webhook_id, station,
+            config.get(CONF_MONITORED_CONDITIONS, DEFAULT_SENSOR_TYPES + list(CHANNEL_SENSOR_TYPES)),
+            publish_filter, config[CONF_RETIRE_AFTER], window,
+        )
+        return
+
     sensors = []    
-    for sensor_type in config[CONF_MONITORED_CONDITIONS]:
-        sensors.append(GW1000Sensor(hass, namespace, webhook_id, sensor_type))
+    for sensor_type in config.get(CONF_MONITORED_CONDITIONS, DEFAULT_SENSOR_TYPES):
+        if sensor_type in CHANNEL_SENSOR_TYPES:
+            _LOGGER.warning("Channel sensor %s requires discovery", sensor_type)
+            continue
+        sensors.append(GW1000Sensor(
+            hass, namespace, webhook_id, sensor_type, publish_filter(sensor_type), station,
+            window=window(sensor_type),
+        ))
 
     _LOGGER.debug("Initialized %s entities", len(sensors))
 
-    add_entities(sensors, True)
+    async_add_entities(sensors, True)
+
+class GW1000SensorFactory(GW1000EntityFactory):
+    """Create sensors for the fields and channels a station pushes"""
+
+    def __init__(self, hass, add_entities, namespace, webhook_id, station, sensor_types, publish_filter, retire_after, window=None):
+        self._namespace = namespace
+        self._publish_filter = publish_filter
+        self._window = window or (lambda sensor_type: None)
+        self._types = [
+            (
+                sensor_type, SENSOR_TYPES[sensor_type][4], SENSOR_TYPES[sensor_type][5],
+                LAYOUT.offset(SENSOR_TYPES[sensor_type][4], SENSOR_TYPES[sensor_type][5]),
+            )
+            for sensor_type in sensor_types if sensor_type in SENSOR_TYPES
+        ]
+        self._channel_types = [
+            (
+                sensor_type,
+                LAYOUT.channel_offsets(CHANNEL_SENSOR_TYPES[sensor_type][4], CHANNEL_SENSOR_TYPES[sensor_type][5]),
+            )
+            for sensor_type in sensor_types if sensor_type in CHANNEL_SENSOR_TYPES
+        ]
+        self._ids = {}
+        self._sensors = {}
+        super().__init__(hass, add_entities, "sensor", namespace, None, webhook_id, station, retire_after)
+
+    def async_discover(self, reading):
+        station = reading.key
+        ids = self._ids.get(station)
+        if ids is None:
+            ids = self._ids[station] = {}
+
+        values = reading.values
+        for sensor_type, key, part, offset in self._types:
+            if offset is not None:
+                present = values[offset] is not None
+            else:
+                block = reading.get(key)
+                present = block is not None and block.get(part) is not None
+            if present:
+                unique_id = ids.get((sensor_type, None))
+                if unique_id is None:
+                    unique_id = ids[(sensor_type, None)] = "{}_{}".format(station, sensor_type)
+                    self._sensors[unique_id] = (sensor_type, None)
+                yield unique_id
+
+        for sensor_type, channels in self._channel_types:
+            for channel, offset in channels:
+                if values[offset] is None:
+                    continue
+                unique_id = ids.get((sensor_type, channel))
+                if unique_id is None:
+                    unique_id = ids[(sensor_type, channel)] = "{}_{}{}".format(station, sensor_type, channel)
+                    self._sensors[unique_id] = (sensor_type, channel)
+                yield unique_id
+
+    def async_create(self, unique_id, reading, restored=False):
+        station = reading.key
+        sensor_type, channel = self._sensors[unique_id]
+        sensor = GW1000Sensor(
+            self._hass, self._namespace, self._webhook_id, sensor_type,
+            self._publish_filter(sensor_type), station, channel, unique_id,
+            self._window(sensor_type),
+        )
+        sensor._async_update(reading, restored)
+        return sensor
 
 class GW1000Sensor(Entity):
     """ GW1000 Sensor """
 
-    def __init__(self, hass, namespace, webhook_id, sensor_type):
+    def __init__(self, hass, namespace, webhook_id, sensor_type, publish=None, station=None, channel=None, unique_id=None, window=None):
         """ Initialize Sensor """
         
+        sensor = ALL_SENSOR_TYPES[sensor_type]
         self._sensor_type = sensor_type
-        self._name = SENSOR_TYPES[sensor_type][0]
-        self.entity_id = generate_entity_id(ENTITY_ID_FORMAT, '{} {}'.format(namespace, SENSOR_TYPES[sensor_type][0]), hass=hass)
-        self._icon = "mdi:{}".format(SENSOR_TYPES.get(sensor_type)[3])
-        self._key = SENSOR_TYPES[sensor_type][4]
-        self._part = SENSOR_TYPES[sensor_type][5]
-        self._device_class = SENSOR_TYPES[sensor_type][2]
-        self._units = SENSOR_TYPES[sensor_type][1]
+        self._channel = channel
+        self._name = sensor[0].format(channel)
+        self.entity_id = async_generate_entity_id(ENTITY_ID_FORMAT, '{} {}'.format(namespace, self._name), hass=hass)
+        self._unique_id = unique_id
+        self._icon = "mdi:{}".format(sensor[3])
+        self._key = sensor[4]
+        self._part = sensor[5]
+        self._device_class = sensor[2]
+        self._units = sensor[1]
+        self._offset = LAYOUT.offset(self._key, self._part, channel)
+        self._convert = conversion(
+            GROUP_UNITS.get(self._key) if self._offset is None else LAYOUT.units[self._offset], self._units
+        )
         self._ready = False
+        self._state = None
         self._webhook_id = webhook_id
+        self._station = station
+        self._publish = publish or PublishFilter()
+        self._window = window
+        self._latest = None
+        self._restored = None
+        self._stale = False
+        self._unsub_stale = None
 
     async def async_added_to_hass(self):
         self.hass.components.gw1000.async_register(
-            "sensor", self._name, self._webhook_id, self.entity_id, self._async_handle_data
+            "sensor", self._name, self._webhook_id, self.entity_id, self._async_handle_data,
+            station=self._station
         )
 
+        watchdog = self.hass.data.get(DATA_WATCHDOG)
+        if watchdog is not None:
+            self._stale = watchdog.is_stale(self._station)
+            self._unsub_stale = watchdog.async_listen(self._station, self._async_stale_changed)
+
+        snapshot = self.hass.data.get(DATA_SNAPSHOT)
+        if snapshot is not None and not self._ready:
+            restored = snapshot.async_latest(self._station)
+            if restored is not None and self._async_update(restored[0], True):
+                self.async_mark_restored(restored[1])
+
+    @callback
+    def async_mark_restored(self, timestamp):
+        """ the state is from a snapshot taken at timestamp (unix time) """
+        if self._ready:
+            self._restored = timestamp
+
     async def async_will_remove_from_hass(self):
         self.hass.components.gw1000.async_unregister(
-            self._webhook_id, self.entity_id
+            self._webhook_id, self.entity_id, self._station
         )
+        if self._unsub_stale is not None:
+            self._unsub_stale()
+            self._unsub_stale = None
+
+    @callback
+    def _async_stale_changed(self, stale):
+        """ the station stopped pushing, or pushed again """
+        self._stale = stale
+        async_publish(self.hass, self)
+
+    @callback
+    def _async_handle_data(self, hass, webhook_id, entity_id, results: dict):
+        if self._async_update(results):
+            async_publish(self.hass, self)
+
+    @callback
+    def _async_update(self, reading, restored=False):
+        """ take this sensor's value from a push, True if it should be written
+
+        A restored reading (from the snapshot) only sets the state, the
+        window is left to the live pushes.
+        """
+
+        if self._offset is not None:
+            value = reading.values[self._offset]
+        else:
+            # groups outside the layout (metrics) are plain dicts
+            block = reading.get(self._key)
+            value = block.get(self._part) if block else None
+        if value is not None and self._convert is not None:
+            value = self._convert(value)
+
+        if self._window is not None and value is not None:
+            self._latest = value
+            # the first value is written at once, then one mean per window
+            closed = None if restored else self._window.add(value)
+            if self._ready and self._restored is None:
+                if closed is None:
+                    return False
+                value = closed["mean"]
+
+        # the first live value replaces a restored one, filtered or not
+        if not self._publish.check(value) and self._restored is None:
+            return False
 
-    async def _async_handle_data(self, hass, webhook_id, entity_id, results: dict):
         self._ready = True
-
-        block = results.get(self._key, {})
-        value = block.get(self._part)
-        convert = CONVERT.get(block.get("units"), {}).get(self._units)
-        if convert is not None:
-            value = convert(value)
+        self._restored = None
         self._state = value
+        return True
 
-        self.async_schedule_update_ha_state()
+    @property
+    def latest(self):
+        """ the last pushed value, the state is the window mean when downsampling """
+        return self._state if self._window is None else self._latest
+
+    @property
+    def unique_id(self):
+        """Return the unique id of discovered sensors."""
+        return self._unique_id
 
     @property
     def should_poll(self):
@@ -145,12 +430,12 @@ class GW1000Sensor(Entity):
     @property
     def available(self):
         """ return if weather data is available. """
-        return self._ready
+        return self._ready and not self._stale
 
     @property
     def icon(self):
         """Icon to use in the frontend, if any."""
-        if self._sensor_type == "battery" and self._state is not None:
+        if self._device_class == "battery" and self._state is not None:
             return icon_for_battery_level(
                 battery_level=int(self._state), charging=False
             )
@@ -170,3 +455,14 @@ class GW1000Sensor(Entity):
     def device_class(self):
         """Return the device class."""
         return self._device_class
+
+    @property
+    def device_state_attributes(self):
+        """Return the write counters, the last window when downsampling and
+        the age of a restored state."""
+        attributes = self._publish.attributes
+        if self._window is not None:
+            attributes = dict(attributes, latest=self._latest, **self._window.attributes)
+        if self._restored is not None:
+            attributes = dict(attributes, age=round(time() - self._restored))
+        return attributes
@@ -0,0 +1,170 @@
+""" Last reading snapshot for warm starts """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+import asyncio
+import json
+import os
+from datetime import timedelta
+from time import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .reading import (
+    LAYOUT,
+    TOP_LEVEL,
+    StationReading,
+)
+
+DEFAULT_SAVE_INTERVAL = 60
+
+SNAPSHOT_VERSION = 1
+
+class ReadingSnapshot(object):
+
+    """ The last reading of every station, saved to a file
+
+    async_update only keeps a reference to the reading; the snapshot is
+    written (atomically, by an executor job) every interval seconds if a
+    reading arrived since the last write, and on stop. Fields are saved
+    by name, so a snapshot survives layout changes between versions.
+    """
+
+    def __init__(self, hass, path, interval=DEFAULT_SAVE_INTERVAL):
+        self._hass = hass
+        self._path = path
+        self._lock = asyncio.Lock()
+        self._save = None
+        self._dirty = False
+        self.readings = {}
+        self._unsub = async_track_time_interval(
+            hass, self._async_tick, timedelta(seconds=interval)
+        )
+        self.writes = 0
+        self.errors = 0
+        self.restored = 0
+
+    @callback
+    def async_update(self, reading):
+        """ remember a station's latest reading """
+
+        if reading.key is None:
+            return
+        self.readings[reading.key] = (reading, time())
+        self._dirty = True
+
+    @callback
+    def async_latest(self, station=None):
+        """ (reading, unix time) of a station, or the newest of any """
+
+        if station is not None:
+            return self.readings.get(station)
+        if not self.readings:
+            return None
+        return max(self.readings.values(), key=lambda restored: restored[1])
+
+    @callback
+    def _async_tick(self, now):
+        if self._dirty and self._save is None:
+            self._save = self._hass.async_create_task(self._async_save_scheduled())
+
+    async def _async_save_scheduled(self):
+        try:
+            await self.async_save()
+        finally:
+            self._save = None
+
+    async def async_save(self):
+        """ write the snapshot if it changed """
+
+        async with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = json.dumps({
+                "version": SNAPSHOT_VERSION,
+                "stations": {
+                    station: {"time": timestamp, "reading": _serialize(reading)}
+                    for station, (reading, timestamp) in self.readings.items()
+                },
+            }, separators=(",", ":"))
+            try:
+                await self._hass.async_add_executor_job(_write_atomic, self._path, data)
+                self.writes += 1
+            except OSError as err:
+                self.errors += 1
+                _LOGGER.error("Unable to write reading snapshot %s: %s", self._path, err)
+
+    async def async_load(self):
+        """ restore the readings of the last snapshot """
+
+        try:
+            data = await self._hass.async_add_executor_job(_read, self._path)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as err:
+            _LOGGER.warning("Ignoring unreadable reading snapshot %s: %s", self._path, err)
+            return
+
+        if data.get("version") != SNAPSHOT_VERSION:
+            return
+        for station, saved in data.get("stations", {}).items():
+            self.readings.setdefault(station, (_deserialize(saved["reading"]), saved["time"]))
+        self.restored = len(data.get("stations", {}))
+        _LOGGER.info("Restored the last readings of %s stations", self.restored)
+
+    async def async_stop(self):
+        """ stop the save timer and write what changed """
+        self._unsub()
+        await self.async_save()
+
+    @property
+    def counters(self):
+        """ station, write and restore counts """
+        return {
+            "stations": len(self.readings),
+            "writes": self.writes,
+            "errors": self.errors,
+            "restored": self.restored,
+        }
+
+def _serialize(reading):
+    fields = []
+    values = reading.values
+    for group, channels in reading.groups.items():
+        for channel in (None,) + tuple(channels):
+            for part in LAYOUT.parts(group, channel):
+                value = values[LAYOUT.offset(group, part, channel)]
+                if value is not None:
+                    fields.append((group, channel, part, value))
+    return {
+        "top": [getattr(reading, name) for name in TOP_LEVEL],
+        "groups": reading.groups,
+        "fields": fields,
+    }
+
+def _deserialize(saved):
+    groups = {group: list(channels) for group, channels in saved["groups"].items()}
+    reading = StationReading(groups)
+    for name, value in zip(TOP_LEVEL, saved["top"]):
+        setattr(reading, name, value)
+    values = reading.values
+    for group, channel, part, value in saved["fields"]:
+        offset = LAYOUT.offset(group, part, channel)
+        if offset is not None:
+            values[offset] = value
+    return reading
+
+def _write_atomic(path, data):
+    temp = path + ".tmp"
+    with open(temp, "w") as output:
+        output.write(data)
+    os.replace(temp, path)
+
+def _read(path):
+    with open(path) as source:
+        return json.load(source)
@@ -0,0 +1,220 @@
+""" Station staleness watchdog """
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+_LOGGER.debug("Loading...")
+
+from datetime import timedelta
+from math import ceil
+from time import monotonic
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
+
+DEFAULT_STALE_AFTER = 3
+
+# Assumed push interval of a station until two pushes are seen, seconds
+DEFAULT_PUSH_INTERVAL = 60
+MIN_PUSH_INTERVAL = 5
+INTERVAL_SMOOTHING = 0.3
+
+TICK_RESOLUTION = 5
+WHEEL_SLOTS = 64
+
+class TimerWheel(object):
+
+    """ Hashed timer wheel of keyed deadlines
+
+    Each key has one deadline, hashed into the slot of the first tick at
+    or after it, so a visit to that slot always finds it due. Rescheduling moves a key between slots, advancing visits only the
+    slots of the ticks that passed, so the cost of both is independent of
+    how many keys are waiting. Deadlines further out than one rotation
+    stay in their slot until a visit finds them due.
+    """
+
+    def __init__(self, resolution=TICK_RESOLUTION, slots=WHEEL_SLOTS, now=None):
+        self._resolution = resolution
+        self._slots = [set() for _ in range(slots)]
+        self._deadlines = {}
+        # key: the slot holding it
+        self._keys = {}
+        self._tick = int((monotonic() if now is None else now) // resolution)
+
+    def schedule(self, key, deadline):
+        """ set (or move) the deadline of key """
+
+        old = self._keys.get(key)
+        if old is not None:
+            old.discard(key)
+        # ticks up to _tick were visited, a past deadline goes to the next
+        tick = max(ceil(deadline / self._resolution), self._tick + 1)
+        slot = self._keys[key] = self._slots[tick % len(self._slots)]
+        slot.add(key)
+        self._deadlines[key] = deadline
+
+    def cancel(self, key):
+        """ forget key """
+
+        self._deadlines.pop(key, None)
+        slot = self._keys.pop(key, None)
+        if slot is not None:
+            slot.discard(key)
+
+    def deadline(self, key):
+        return self._deadlines.get(key)
+
+    def advance(self, now):
+        """ keys whose deadline is at or before now, removed """
+
+        current = int(now // self._resolution)
+        slots = self._slots
+        deadlines = self._deadlines
+        expired = []
+        # one rotation visits every slot, more would only repeat them
+        for tick in range(max(self._tick + 1, current - len(slots) + 1), current + 1):
+            slot = slots[tick % len(slots)]
+            for key in [key for key in slot if deadlines[key] <= now]:
+                slot.discard(key)
+                del deadlines[key]
+                del self._keys[key]
+                expired.append(key)
+        self._tick = max(self._tick, current)
+        return expired
+
+    def __len__(self):
+        return len(self._deadlines)
+
+class StalenessWatchdog(object):
+
+    """ Flip a station's entities unavailable when it stops pushing
+
+    Every push moves its station's deadline to stale_after times the
+    station's push interval, which is learned from the arrival times.
+    The None station stands for catch-all entities; any push moves its
+    deadline. A single timer ticks the wheel; the listeners (entities) of
+    a station that missed its deadline are told together, and again when
+    it pushes once more.
+    """
+
+    def __init__(self, hass, stale_after=DEFAULT_STALE_AFTER, resolution=TICK_RESOLUTION):
+        self._stale_after = stale_after
+        self._wheel = TimerWheel(resolution)
+        self._listeners = {}
+        self._stations = {}
+        self._stale = set()
+        self._unsub = async_track_time_interval(
+            hass, self._async_tick, timedelta(seconds=resolution)
+        )
+        self.stale_events = 0
+        self.live_events = 0
+        self.notified = 0
+
+    @callback
+    def async_listen(self, station, listener):
+        """ call listener(stale) when station goes stale or live again,
+        returns a function that removes it """
+
+        listeners = self._listeners.setdefault(station, {})
+        listeners[listener] = None
+
+        def _remove():
+            listeners.pop(listener, None)
+            if not listeners and self._listeners.get(station) is listeners:
+                del self._listeners[station]
+
+        return _remove
+
+    @callback
+    def async_seen(self, station, now=None):
+        """ a push from station arrived """
+
+        if now is None:
+            now = monotonic()
+
+        interval = DEFAULT_PUSH_INTERVAL
+        if station is not None:
+            seen = self._stations.get(station)
+            if seen is None:
+                self._stations[station] = [now, None]
+            else:
+                elapsed = now - seen[0]
+                if elapsed > 0:
+                    if seen[1] is None:
+                        seen[1] = elapsed
+                    else:
+                        seen[1] += INTERVAL_SMOOTHING * (elapsed - seen[1])
+                seen[0] = now
+                if seen[1] is not None:
+                    interval = max(seen[1], MIN_PUSH_INTERVAL)
+
+        deadline = now + self._stale_after * interval
+        self._wheel.schedule(station, deadline)
+        if station is not None:
+            catch_all = self._wheel.deadline(None)
+            if catch_all is None or catch_all < deadline:
+                self._wheel.schedule(None, deadline)
+            if None in self._stale:
+                self._async_flip(None, False)
+
+        if station in self._stale:
+            self._async_flip(station, False)
+
+    @callback
+    def async_expect(self, station, now=None):
+        """ expect a push from station (restored at setup, say) """
+
+        if now is None:
+            now = monotonic()
+        if self._wheel.deadline(station) is None:
+            self._wheel.schedule(station, now + self._stale_after * DEFAULT_PUSH_INTERVAL)
+
+    @callback
+    def _async_tick(self, now):
+        self.async_check()
+
+    @callback
+    def async_check(self, now=None):
+        """ flip the stations whose deadline passed """
+
+        for station in self._wheel.advance(monotonic() if now is None else now):
+            _LOGGER.info("Station %s stopped pushing", station)
+            self._async_flip(station, True)
+
+    @callback
+    def _async_flip(self, station, stale):
+        if stale:
+            self._stale.add(station)
+            self.stale_events += 1
+        else:
+            self._stale.discard(station)
+            self.live_events += 1
+
+        listeners = self._listeners.get(station)
+        if not listeners:
+            return
+        for listener in tuple(listeners):
+            try:
+                listener(stale)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Staleness listener of %s failed", station)
+        self.notified += len(listeners)
+
+    def is_stale(self, station):
+        return station in self._stale
+
+    @callback
+    def async_stop(self):
+        """ stop ticking """
+        self._unsub()
+
+    @property
+    def counters(self):
+        """ station, stale and notification counts """
+        return {
+            "tracked": len(self._wheel),
+            "stale": len(self._stale),
+            "stale_events": self.stale_events,
+            "live_events": self.live_events,
+            "notified": self.notified,
+        }
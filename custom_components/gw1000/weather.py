@@ -5,6 +5,8 @@ import logging
 _LOGGER = logging.getLogger(__name__)
 _LOGGER.debug("Loading...")
 
+from time import time
+
 from homeassistant.core import callback
 
 import voluptuous as vol
@@ -35,14 +37,52 @@ from .const import (
     DOMAIN,
     LENGTH_MILLIMETERS,
     LIGHT_WATTS,
-    LIGHT_LUX
+    LIGHT_LUX,
+    CONF_MIN_INTERVAL,
+    CONF_HEARTBEAT,
+    CONF_STATION,
+    CONF_LOCAL_CONDITIONS,
+    DATA_SNAPSHOT,
+    DATA_WATCHDOG,
 ) 
 
+from .conditions import (
+    LocalConditions
+)
+
+from .dedupe import (
+    parse_dateutc
+)
+
+from .publish import (
+    PublishFilter,
+    async_publish,
+)
+
+from .reading import (
+    LAYOUT
+)
+
+# Handler inputs: group, part
+WEATHER_FIELDS = (
+    ("outdoor", "temperature"),
+    ("outdoor", "humidity"),
+    ("pressure", "absolute"),
+    ("wind", "speed"),
+    ("wind", "bearing"),
+)
+
+_OFFSETS = tuple(LAYOUT.offset(group, part) for group, part in WEATHER_FIELDS)
+
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
         vol.Optional(CONF_NAME, default=DOMAIN): cv.string,
         vol.Optional(CONF_WEBHOOK_ID): cv.string,
+        vol.Optional(CONF_STATION): cv.string,
         vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Optional(CONF_MIN_INTERVAL, default=0): cv.positive_int,
+        vol.Optional(CONF_HEARTBEAT, default=0): cv.positive_int,
+        vol.Optional(CONF_LOCAL_CONDITIONS, default=False): cv.boolean,
     }
 )
 
@@ -52,28 +92,44 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     name = config.get(CONF_NAME)
     webhook_id = config.get(CONF_WEBHOOK_ID, name)
     entity_id = config.get(ATTR_ENTITY_ID)
+    station = config.get(CONF_STATION)
 
     _LOGGER.debug("Initializing Weather platform: name=%s webhook_id=%s entity_id=%s", name, webhook_id, entity_id)
 
-    add_entities([GW1000Weather(name, webhook_id, entity_id)], True)
+    publish = PublishFilter(
+        min_interval=config[CONF_MIN_INTERVAL], heartbeat=config[CONF_HEARTBEAT]
+    )
+
+    local = config[CONF_LOCAL_CONDITIONS]
+    if local and entity_id:
+        _LOGGER.warning("Weather %s derives its condition locally, not tracking %s", name, entity_id)
+
+    add_entities([GW1000Weather(name, webhook_id, None if local else entity_id, publish, station, local)], True)
 
 class GW1000Weather(WeatherEntity):
     """Representation of a weather condition."""
 
-    def __init__(self, name, webhook_id, weather_entity_id):
+    def __init__(self, name, webhook_id, weather_entity_id, publish=None, station=None, local=False):
         self._name = name
         if weather_entity_id:
             self._tracking = tuple(ent_id.lower() for ent_id in weather_entity_id)
         else:
             self._tracking = tuple()
         self._webhook_id = webhook_id
+        self._station = station
+        self._publish = publish or PublishFilter()
 
         self._ready = False
+        self._restored = None
+        self._stale = False
+        self._unsub_stale = None
         self._ozone = None
         self._visibility = None
         self._condition = None
         self._forecast = None
         self._attribution = None
+        self._local = local
+        self._conditions = None
 
         self._async_unsub_state_changed = None
 
@@ -85,7 +141,7 @@ class GW1000Weather(WeatherEntity):
     @property
     def available(self):
         """ return if weather data is available. """
-        return self._ready
+        return self._ready and not self._stale
 
     @property
     def attribution(self):
@@ -147,9 +203,24 @@ class GW1000Weather(WeatherEntity):
         """Return the forecast array."""
         return self._forecast
 
+    @property
+    def device_state_attributes(self):
+        """Return the write counters, the inputs of a local condition and
+        the age of a restored state."""
+        attributes = self._publish.attributes
+        if self._conditions is not None:
+            attributes = dict(attributes, **self._conditions.attributes)
+        if self._restored is not None:
+            attributes = dict(attributes, age=round(time() - self._restored))
+        return attributes
+
     async def async_added_to_hass(self):
+        if self._local and self._conditions is None:
+            self._conditions = LocalConditions(self.hass.config.latitude, self.hass.config.longitude)
+
         self.hass.components.gw1000.async_register(
-            "weather", self._name, self._webhook_id, self.entity_id, self._async_handle_data
+            "weather", self._name, self._webhook_id, self.entity_id, self._async_handle_data,
+            station=self._station
         )
 
         if self._tracking and self._async_unsub_state_changed is None:
@@ -157,13 +228,27 @@ class GW1000Weather(WeatherEntity):
                 self.hass, self._tracking, self._async_state_changed_listener
             )        
 
+        watchdog = self.hass.data.get(DATA_WATCHDOG)
+        if watchdog is not None:
+            self._stale = watchdog.is_stale(self._station)
+            self._unsub_stale = watchdog.async_listen(self._station, self._async_stale_changed)
+
+        snapshot = self.hass.data.get(DATA_SNAPSHOT)
+        if snapshot is not None and not self._ready:
+            restored = snapshot.async_latest(self._station)
+            if restored is not None and self._async_update(restored[0], True):
+                self._restored = restored[1]
+
     async def async_will_remove_from_hass(self):
         self.hass.components.gw1000.async_unregister(
-            self._webhook_id, self.entity_id
+            self._webhook_id, self.entity_id, self._station
         )
         if self._async_unsub_state_changed:
             self._async_unsub_state_changed()
             self._async_unsub_state_changed = None        
+        if self._unsub_stale is not None:
+            self._unsub_stale()
+            self._unsub_stale = None
 
     @callback
     def _async_update_weather_state(self, tr_state=None):
@@ -178,22 +263,52 @@ class GW1000Weather(WeatherEntity):
         self._forecast = tr_state.attributes['forecast']
         self._attribution = tr_state.attributes['attribution']
 
-    async def _async_handle_data(self, hass, webhook_id, entity_id, results: dict):
-        self._ready = True
+    @callback
+    def _async_stale_changed(self, stale):
+        """ the station stopped pushing, or pushed again """
+        self._stale = stale
+        async_publish(self.hass, self)
 
-        temp = results["outdoor"]
-        self._temp = temp["temperature"]
-        self._tempUnits = temp["units"]
-        self._humidity = temp["humidity"]
+    @callback
+    def _async_handle_data(self, hass, webhook_id, entity_id, reading):
+        if self._async_update(reading):
+            async_publish(self.hass, self)
+
+    @callback
+    def _async_update(self, reading, restored=False):
+        """ take the weather values from a push, True if they should be written
 
-        temp = results["pressure"]
-        self._pressure = temp["absolute"]
+        A restored reading (from the snapshot) is not added to the local
+        conditions, their pressure trend only follows live pushes.
+        """
 
-        temp = results["wind"]
-        self._windspeed = temp["speed"]
-        self._windbearing = temp["bearing"]
+        values = reading.values
+        values = tuple(values[offset] for offset in _OFFSETS)
 
-        self.async_schedule_update_ha_state()
+        conditions = self._conditions
+        if conditions is not None:
+            if not restored:
+                conditions.update(parse_dateutc(reading.dateutc) or time(), reading)
+            values += (conditions.condition, conditions.zambretti)
+
+        # the first live values replace restored ones, filtered or not
+        if not self._publish.check(values) and self._restored is None:
+            return False
+
+        self._ready = True
+        self._restored = None
+        self._tempUnits = LAYOUT.group_units("outdoor")
+        (
+            self._temp,
+            self._humidity,
+            self._pressure,
+            self._windspeed,
+            self._windbearing,
+        ) = values[:len(_OFFSETS)]
+        if conditions is not None:
+            self._condition = conditions.condition
+            self._forecast = conditions.forecast
+        return True
 
     async def _async_state_changed_listener(self, entity_id, old_state, new_state):
         # removed
@@ -201,7 +316,7 @@ class GW1000Weather(WeatherEntity):
             return
 
         self._async_update_weather_state(new_state)
-        self.async_schedule_update_ha_state()
+        async_publish(self.hass, self)
 
 #    async def async_update(self):
 #        """Get the latest data from GW1000."""